@@ -0,0 +1,81 @@
+"""Доля попаданий кэша фрагментов при нескольких воркерах.
+
+Запускает несколько процессов, как у gunicorn, и гоняет в каждом поток
+запросов к страницам ленты с распределением Ципфа: промах "рендерит"
+фрагмент и кладёт его в кэш. Для локального кэша каждый процесс греет
+свою копию, общие бэкенды переиспользуют фрагменты соседей.
+
+    python benchmarks/cache_hit_rate.py --workers 4 --requests 5000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def backends(directory):
+    return {
+        'locmem': ('django.core.cache.backends.locmem.LocMemCache', ''),
+        'file': ('django.core.cache.backends.filebased.FileBasedCache',
+                 os.path.join(directory, 'files')),
+        'sqlite': ('yatube.cache_backends.SQLiteCache',
+                   os.path.join(directory, 'cache.sqlite3')),
+    }
+
+
+def run_worker(args):
+    backend, location, seed, requests, pages, fragment_size = args
+    sys.path.insert(0, BASE_DIR)
+    from django.conf import settings
+    settings.configure(CACHES={'default': {
+        'BACKEND': backend,
+        'LOCATION': location,
+        'OPTIONS': {'MAX_ENTRIES': pages * 2},
+    }})
+    from django.core.cache import cache
+
+    rng = random.Random(seed)
+    weights = [1 / rank for rank in range(1, pages + 1)]
+    fragment = 'x' * fragment_size
+    hits = 0
+    started = time.perf_counter()
+    for page in rng.choices(range(pages), weights, k=requests):
+        key = f'index_page:{page}'
+        if cache.get(key) is None:
+            cache.set(key, fragment, 600)
+        else:
+            hits += 1
+    return hits, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--fragment-size', type=int, default=20000)
+    options = parser.parse_args()
+
+    print(f'{"backend":<8} {"hit rate":>9} {"req/s":>9}')
+    with tempfile.TemporaryDirectory() as directory:
+        for name, (backend, location) in backends(directory).items():
+            jobs = [
+                (backend, location, seed, options.requests, options.pages,
+                 options.fragment_size)
+                for seed in range(options.workers)
+            ]
+            with Pool(options.workers) as pool:
+                results = pool.map(run_worker, jobs)
+            hits = sum(hit for hit, _ in results)
+            total = options.workers * options.requests
+            elapsed = max(seconds for _, seconds in results)
+            print(f'{name:<8} {hits / total:>9.1%} {total / elapsed:>9.0f}')
+
+
+if __name__ == '__main__':
+    main()
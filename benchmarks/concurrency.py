@@ -0,0 +1,164 @@
+"""Чтение и запись из нескольких потоков в профилях development и production.
+
+Для каждого профиля (YATUBE_ENV) запускает отдельный процесс со своей
+временной базой SQLite, заполняет её generate_data и гоняет потоки,
+каждый из которых, как воркер сервера, обрабатывает "запросы": читает
+страницу ленты и комментарии записи или пишет комментарий. Вокруг
+каждого запроса посылаются request_started и request_finished, так что
+CONN_MAX_AGE работает как на сервере: в development соединение
+открывается на каждый запрос, в production переиспользуется. Печатает
+пропускную способность, перцентили чтения и записи и число ошибок
+"database is locked" для каждого числа потоков.
+
+    python benchmarks/concurrency.py --threads 1 4 8 --seconds 5
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = ('development', 'production')
+
+
+def percentile(values, share):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def prepare(options):
+    from django.core.management import call_command
+
+    from posts.synthetic import Generator
+    call_command('migrate', verbosity=0)
+    Generator(
+        users=options.users, posts=options.posts, image_share=0,
+        seed=options.seed,
+    ).run()
+
+
+def work(seed, write_share, deadline, results):
+    from django.core import signals
+    from django.db import OperationalError, connection
+
+    from posts.models import Comment, Post, User
+
+    rng = random.Random(seed)
+    post_ids = list(Post.objects.values_list('id', flat=True))
+    user_ids = list(User.objects.values_list('id', flat=True))
+    reads, writes, errors = [], [], 0
+    while time.perf_counter() < deadline:
+        signals.request_started.send(sender=None)
+        started = time.perf_counter()
+        try:
+            if rng.random() < write_share:
+                Comment.objects.create(
+                    post_id=rng.choice(post_ids),
+                    author_id=rng.choice(user_ids),
+                    text='Комментарий из замера',
+                )
+                writes.append(time.perf_counter() - started)
+            else:
+                list(Post.objects.select_related('author', 'group')
+                     .order_by('-pub_date')[rng.randrange(100):][:10])
+                list(Comment.objects.filter(
+                    post_id=rng.choice(post_ids)
+                ).select_related('author')[:50])
+                reads.append(time.perf_counter() - started)
+        except OperationalError:
+            errors += 1
+        finally:
+            signals.request_finished.send(sender=None)
+    connection.close()
+    results.append((reads, writes, errors))
+
+
+def run_worker(options):
+    sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    import django
+    django.setup()
+    from django.db import connection
+    prepare(options)
+    connection.close()
+    report = []
+    for threads in options.threads:
+        results = []
+        deadline = time.perf_counter() + options.seconds
+        workers = [
+            threading.Thread(target=work, args=(
+                seed, options.write_share, deadline, results
+            ))
+            for seed in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        reads = [value for result in results for value in result[0]]
+        writes = [value for result in results for value in result[1]]
+        report.append({
+            'threads': threads,
+            'ops_per_s': (len(reads) + len(writes)) / options.seconds,
+            'read_p50_ms': percentile(reads, 0.5) * 1000,
+            'read_p99_ms': percentile(reads, 0.99) * 1000,
+            'write_p50_ms': percentile(writes, 0.5) * 1000,
+            'write_p99_ms': percentile(writes, 0.99) * 1000,
+            'errors': sum(result[2] for result in results),
+        })
+    json.dump(report, sys.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--profiles', nargs='+', choices=PROFILES,
+                        default=PROFILES)
+    parser.add_argument('--threads', nargs='+', type=int, default=(1, 4, 8))
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--write-share', type=float, default=0.2)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--worker', action='store_true',
+                        help=argparse.SUPPRESS)
+    options = parser.parse_args()
+    if options.worker:
+        return run_worker(options)
+
+    print(f'{"profile":<12} {"threads":>7} {"ops/s":>8} {"read p50":>9} '
+          f'{"read p99":>9} {"write p50":>10} {"write p99":>10} '
+          f'{"errors":>6}')
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in options.profiles:
+            env = {
+                **os.environ,
+                'YATUBE_ENV': profile,
+                'YATUBE_SECRET_KEY': 'benchmark',
+                'YATUBE_DATABASE': 'sqlite',
+                'YATUBE_DB_NAME': os.path.join(directory, f'{profile}.db'),
+                'YATUBE_CACHE_BACKEND': 'locmem',
+                'YATUBE_THUMBNAIL_WORKERS': '0',
+            }
+            output = subprocess.run(
+                [sys.executable, __file__, '--worker', *sys.argv[1:]],
+                env=env, check=True, stdout=subprocess.PIPE,
+            ).stdout
+            for row in json.loads(output):
+                print(f'{profile:<12} {row["threads"]:>7} '
+                      f'{row["ops_per_s"]:>8.0f} '
+                      f'{row["read_p50_ms"]:>9.2f} '
+                      f'{row["read_p99_ms"]:>9.2f} '
+                      f'{row["write_p50_ms"]:>10.2f} '
+                      f'{row["write_p99_ms"]:>10.2f} {row["errors"]:>6}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Байты картинок на одну страницу ленты до и после вариантов srcset.
+
+Генерирует синтетические "фотографии" (размытые пятна с зерном), кодирует их
+так, как это делал sorl для карточки (JPEG 960x339, качество 95), и так,
+как это делает posts.images, и сравнивает объём и время декодирования
+того, что браузер скачает для страницы из --page-size записей.
+
+    python benchmarks/feed_image_bytes.py --photos 10 --size 3000x2000
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def photo(width, height, seed):
+    from PIL import Image, ImageChops, ImageDraw, ImageFilter
+    rng = random.Random(seed)
+    image = Image.new('RGB', (width, height), (rng.randrange(256),) * 3)
+    draw = ImageDraw.Draw(image)
+    for _ in range(300):
+        x, y = rng.randrange(width), rng.randrange(height)
+        radius = rng.randint(width // 100, width // 8)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), color)
+    image = image.filter(ImageFilter.GaussianBlur(width // 300))
+    # Зерно матрицы: без него синтетика сжимается лучше настоящих фото.
+    grain = Image.effect_noise((width, height), 12).convert('RGB')
+    return ImageChops.add(image, grain, scale=1, offset=-128)
+
+
+def decode_seconds(data):
+    from PIL import Image
+    started = time.perf_counter()
+    Image.open(io.BytesIO(data)).load()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--photos', type=int, default=10)
+    parser.add_argument('--page-size', type=int, default=10)
+    parser.add_argument('--size', default='3000x2000')
+    options = parser.parse_args()
+    width, height = map(int, options.size.split('x'))
+
+    sys.path.insert(0, BASE_DIR)
+    from django.conf import settings
+    settings.configure()
+    from posts import images
+
+    variants = {'original JPEG': [], 'sorl JPEG 960': []}
+    for seed in range(options.photos):
+        image = photo(width, height, seed)
+        variants['original JPEG'].append(
+            images.encode(image, 'JPEG', {'quality': 92})
+        )
+        variants['sorl JPEG 960'].append(images.encode(
+            images.card_crop(image, 960), 'JPEG', {'quality': 95}
+        ))
+        for mime, pil_format, _, params in images.variant_formats():
+            for card_width in (480, 960):
+                name = f'{pil_format} {card_width}'
+                variants.setdefault(name, []).append(images.encode(
+                    images.card_crop(image, card_width), pil_format, params
+                ))
+
+    scale = options.page_size / options.photos
+    baseline = sum(map(len, variants['sorl JPEG 960'])) * scale
+    print(f'{"variant":<14} {"KiB/page":>9} {"vs sorl":>8} {"decode ms":>10}')
+    for name, files in variants.items():
+        page = sum(map(len, files)) * scale
+        decode = sum(map(decode_seconds, files)) * scale * 1000
+        print(f'{name:<14} {page / 1024:>9.0f} {page / baseline:>8.0%} '
+              f'{decode:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""Задержка, число запросов и память страниц posts на больших данных.
+
+Гоняет через тестовый клиент Django index, group_posts, profile,
+post_view, follow_index и new_post по базе, заполненной командой
+generate_data, и печатает перцентили времени ответа, число SQL-запросов
+и пик выделенной памяти на запрос. Страницы выбираются случайно с тем же
+степенным законом, что и в данных: популярных авторов смотрят чаще.
+Результат сохраняется в JSON (--output), а с --baseline печатается
+сравнение с сохранённым ранее прогоном.
+
+    python manage.py generate_data --users 2000 --posts 20000
+    python benchmarks/views.py --requests 200 --output before.json
+    python benchmarks/views.py --requests 200 --baseline before.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VIEWS = ('index', 'group_posts', 'profile', 'post_view', 'follow_index',
+         'new_post')
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+class Targets:
+    """Случайные адреса страниц по данным из базы."""
+
+    def __init__(self, rng):
+        from posts.models import Group, Post, ProfileStats
+        self.rng = rng
+        self.slugs = list(Group.objects.values_list('slug', flat=True))
+        # Записи популярных авторов попадаются чаще, как и их страницы.
+        self.posts = list(
+            Post.objects.values_list('id', 'author__username')
+        )
+        self.groups = list(Group.objects.values_list('id', flat=True))
+        self.reader = ProfileStats.objects.order_by(
+            '-following_count'
+        ).values_list('user__username', flat=True).first()
+        if not self.posts or not self.reader:
+            sys.exit('База пуста: сначала запустите manage.py generate_data')
+
+    def post(self):
+        return self.rng.choice(self.posts)
+
+    def request(self, view):
+        """(метод, адрес, данные формы)."""
+        from django.urls import reverse
+        if view == 'index':
+            return 'get', reverse('index'), None
+        if view == 'group_posts':
+            return 'get', reverse('group', args=(
+                self.rng.choice(self.slugs),
+            )), None
+        if view == 'profile':
+            return 'get', reverse('profile', args=(self.post()[1],)), None
+        if view == 'post_view':
+            post_id, username = self.post()
+            return 'get', reverse('post', args=(username, post_id)), None
+        if view == 'follow_index':
+            return 'get', reverse('follow_index'), None
+        return 'post', reverse('new_post'), {
+            'text': 'Запись из замера',
+            'group': self.rng.choice(self.groups) if self.groups else '',
+        }
+
+
+def measure(client, targets, view, options):
+    from django.core.cache import cache
+    from django.db import connection, transaction
+    from django.test.utils import CaptureQueriesContext
+
+    def send():
+        method, url, data = targets.request(view)
+        if options.cold:
+            cache.clear()
+        if method == 'get':
+            return getattr(client, method)(url)
+        # Новая запись откатывается, чтобы замер не менял данные.
+        with transaction.atomic():
+            response = client.post(url, data)
+            transaction.set_rollback(True)
+        return response
+
+    for _ in range(options.warmup):
+        send()
+    latencies = []
+    queries = []
+    for _ in range(options.requests):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = send()
+            latencies.append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            sys.exit(f'{view}: ответ {response.status_code}')
+        queries.append(len(captured))
+    peaks = []
+    tracemalloc.start()
+    for _ in range(options.memory_samples):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        send()
+        peaks.append((tracemalloc.get_traced_memory()[1] - before) / 1024)
+    tracemalloc.stop()
+    return {
+        'p50_ms': percentile(latencies, 0.5),
+        'p90_ms': percentile(latencies, 0.9),
+        'p99_ms': percentile(latencies, 0.99),
+        'mean_ms': statistics.mean(latencies),
+        'queries': statistics.median(queries),
+        'max_queries': max(queries),
+        'peak_kib': statistics.median(peaks) if peaks else None,
+    }
+
+
+def dataset():
+    from posts.models import Comment, Follow, Post, User
+    return {
+        'users': User.objects.count(),
+        'posts': Post.objects.count(),
+        'comments': Comment.objects.count(),
+        'follows': Follow.objects.count(),
+    }
+
+
+def change(current, previous):
+    if not previous:
+        return ''
+    return f'{(current - previous) / previous:+.0%}'
+
+
+def report(results, baseline=None):
+    baseline = (baseline or {}).get('views', {})
+    print(f'{"view":<13} {"p50 ms":>8} {"p90 ms":>8} {"p99 ms":>8} '
+          f'{"queries":>8} {"KiB":>7}  {"vs baseline":>18}')
+    for view, result in results.items():
+        previous = baseline.get(view, {})
+        delta = ' '.join(filter(None, (
+            change(result['p50_ms'], previous.get('p50_ms')),
+            change(result['queries'], previous.get('queries')),
+        )))
+        print(f'{view:<13} {result["p50_ms"]:>8.1f} {result["p90_ms"]:>8.1f} '
+              f'{result["p99_ms"]:>8.1f} {result["queries"]:>8.0f} '
+              f'{result["peak_kib"] or 0:>7.0f}  {delta:>18}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--views', nargs='+', choices=VIEWS, default=VIEWS)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--memory-samples', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--anonymous', action='store_true',
+        help='Открывать ленты без входа (через кэш целых страниц).'
+    )
+    parser.add_argument(
+        '--cold', action='store_true',
+        help='Очищать кэш перед каждым запросом.'
+    )
+    parser.add_argument('--output', help='Куда сохранить результат (JSON).')
+    parser.add_argument('--baseline', help='Прогон для сравнения (JSON).')
+    options = parser.parse_args()
+
+    sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+    settings.ALLOWED_HOSTS.append('testserver')
+    # Миниатюры в фоне исказили бы замер new_post.
+    settings.THUMBNAIL_WORKERS = 0
+
+    targets = Targets(random.Random(options.seed))
+    reader = get_user_model().objects.get(username=targets.reader)
+    guest, member = Client(), Client()
+    member.force_login(reader)
+    results = {}
+    for view in options.views:
+        # Лента подписок и новая запись доступны только после входа.
+        anonymous = options.anonymous and view not in ('follow_index',
+                                                       'new_post')
+        results[view] = measure(
+            guest if anonymous else member, targets, view, options
+        )
+    baseline = None
+    if options.baseline:
+        with open(options.baseline) as file:
+            baseline = json.load(file)
+    report(results, baseline)
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump({
+                'meta': {
+                    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                    'database': settings.DATABASES['default']['ENGINE'],
+                    'dataset': dataset(),
+                    'requests': options.requests,
+                    'anonymous': options.anonymous,
+                    'cold': options.cold,
+                },
+                'views': results,
+            }, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Comment, Follow, Group, Post
 
 
@@ -8,6 +9,14 @@ class PostAdmin(admin.ModelAdmin):
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
+    search_limit = 1000
+
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо LIKE '%...%' по всей таблице - поиск по индексу.
+        if not search_term:
+            return queryset, False
+        ids = search.matching_ids(search_term, self.search_limit)
+        return queryset.filter(pk__in=ids), False
 
 
 class GroupAdmin(admin.ModelAdmin):
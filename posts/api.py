@@ -0,0 +1,225 @@
+"""JSON-API только для чтения: ленты, запись и её комментарии.
+
+Строки выбираются через values_list, без создания моделей, и
+превращаются в словари планом, который Serializer составляет один раз на
+запрос по параметру ?fields=. Страницы листаются тем же непрозрачным
+курсором, что и HTML-ленты; ответ - {"results": [...], "next_cursor": ...}.
+"""
+import functools
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+
+from . import feed_cache
+from .middleware import tag_response
+from .models import Comment, Group, Post, User
+from .paginators import (NEXT, CommentPage, KeysetSource, decode_cursor,
+                         encode_cursor)
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def media_url(name):
+    return Post.image.field.storage.url(name) if name else None
+
+
+def blank_to_none(value):
+    return value or None
+
+
+# Публичное имя поля: (колонка для values_list, преобразование или None).
+POST_FIELDS = {
+    'id': ('id', None),
+    'text': ('text', None),
+    'pub_date': ('pub_date', None),
+    'author': ('author__username', None),
+    'group': ('group__slug', None),
+    'image': ('image', media_url),
+    'thumbnail': ('thumbnail', blank_to_none),
+    'comment_count': ('comment_count', None),
+}
+COMMENT_FIELDS = {
+    'id': ('id', None),
+    'author': ('author__username', None),
+    'text': ('text', None),
+    'created': ('created', None),
+}
+
+
+class APIError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class Serializer:
+    """Превращает строки values_list в словари с выбранными полями.
+
+    Колонки и их позиции определяются в конструкторе, а в цикле по
+    строкам остаётся только доступ по индексу. key - колонки ключа
+    курсора: они выбираются всегда и идут первыми.
+    """
+
+    def __init__(self, fields, requested=None, key=('id',)):
+        if requested:
+            names = [name for name in requested.split(',') if name]
+            unknown = set(names) - set(fields)
+            if unknown:
+                raise APIError(
+                    'Неизвестные поля: ' + ', '.join(sorted(unknown))
+                )
+        else:
+            names = list(fields)
+        self.columns = list(key)
+        self.plan = []
+        for name in names:
+            column, convert = fields[name]
+            if column not in self.columns:
+                self.columns.append(column)
+            self.plan.append((name, self.columns.index(column), convert))
+
+    def rows(self, queryset):
+        return queryset.values_list(*self.columns)
+
+    def serialize(self, row):
+        return {
+            name: row[index] if convert is None else convert(row[index])
+            for name, index, convert in self.plan
+        }
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get('limit', PAGE_SIZE))
+    except ValueError:
+        raise APIError('limit должен быть числом.')
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def position(request):
+    cursor = request.GET.get('cursor')
+    if not cursor:
+        return None
+    decoded = decode_cursor(cursor)
+    if decoded is None or decoded[0] != NEXT:
+        raise APIError('Некорректный курсор.')
+    return decoded[1:]
+
+
+def respond(data, status=200):
+    return JsonResponse(
+        data,
+        status=status,
+        encoder=DjangoJSONEncoder,
+        json_dumps_params={'separators': (',', ':'), 'ensure_ascii': False},
+    )
+
+
+def api_view(view):
+    """Отдаёт APIError клиенту как {"detail": ...} с нужным статусом."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except APIError as error:
+            return respond({'detail': str(error)}, error.status)
+    return wrapper
+
+
+def keyset_response(serializer, queryset, per_page):
+    """Страница по запросу, уже упорядоченному и отфильтрованному курсором.
+
+    Ключ курсора - первые две колонки строки: id и дата.
+    """
+    rows = list(serializer.rows(queryset)[:per_page + 1])
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        pk, date = rows[-1][:2]
+        next_cursor = encode_cursor(NEXT, date, pk)
+    return respond({
+        'results': [serializer.serialize(row) for row in rows],
+        'next_cursor': next_cursor,
+    })
+
+
+def post_list(request, queryset, *scopes):
+    serializer = Serializer(
+        POST_FIELDS, request.GET.get('fields'), key=('id', 'pub_date')
+    )
+    per_page = page_size(request)
+    after = position(request)
+    source = KeysetSource(queryset)
+    queryset = (source.ordered() if after is None
+                else source.after(NEXT, *after))
+    tag_response(request, *scopes)
+    return keyset_response(serializer, queryset, per_page)
+
+
+def object_id(queryset, message, **lookup):
+    pk = queryset.filter(**lookup).values_list('id', flat=True).first()
+    if pk is None:
+        raise APIError(message, status=404)
+    return pk
+
+
+@api_view
+def posts(request):
+    return post_list(request, Post.objects.all(), feed_cache.POSTS)
+
+
+@api_view
+def group_posts(request, slug):
+    group_id = object_id(Group.objects, 'Группа не найдена.', slug=slug)
+    return post_list(
+        request, Post.objects.filter(group_id=group_id),
+        feed_cache.group_scope(group_id),
+    )
+
+
+@api_view
+def profile_posts(request, username):
+    author_id = object_id(
+        User.objects, 'Пользователь не найден.', username=username
+    )
+    return post_list(
+        request, Post.objects.filter(author_id=author_id),
+        feed_cache.author_scope(author_id),
+    )
+
+
+@api_view
+def post_detail(request, post_id):
+    serializer = Serializer(POST_FIELDS, request.GET.get('fields'))
+    author_id = Post.objects.filter(
+        pk=post_id
+    ).values_list('author_id', flat=True).first()
+    if author_id is None:
+        raise APIError('Запись не найдена.', status=404)
+    # Области связываются с ответом до чтения самой записи.
+    tag_response(
+        request, feed_cache.post_scope(post_id),
+        feed_cache.author_scope(author_id),
+    )
+    row = serializer.rows(Post.objects.filter(pk=post_id)).first()
+    if row is None:
+        raise APIError('Запись не найдена.', status=404)
+    return respond(serializer.serialize(row))
+
+
+@api_view
+def post_comments(request, post_id):
+    serializer = Serializer(
+        COMMENT_FIELDS, request.GET.get('fields'), key=('id', 'created')
+    )
+    per_page = page_size(request)
+    after = position(request)
+    object_id(Post.objects, 'Запись не найдена.', pk=post_id)
+    comments = CommentPage(
+        Comment.objects.filter(post_id=post_id), per_page
+    )
+    queryset = (comments.queryset if after is None
+                else comments.after(*after))
+    tag_response(request, feed_cache.post_scope(post_id))
+    return keyset_response(serializer, queryset, per_page)
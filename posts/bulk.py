@@ -0,0 +1,411 @@
+"""Массовый импорт и экспорт записей, комментариев и подписок.
+
+Строки читаются и пишутся потоком в NDJSON или CSV, так что файл любого
+размера не загружается в память целиком. Импорт создаёт объекты через
+bulk_create пачками по batch_size и фиксирует транзакцию каждые
+transaction_size строк; авторы, группы и записи ищутся по таблицам в
+памяти, а не запросом на строку. bulk_create не вызывает сигналы
+posts.signals, поэтому счётчики, поисковый индекс, ленты подписок,
+ссылки на картинки, миниатюры и версии кэша обновляются в конце
+(Importer.finish) - только для затронутых записей и пользователей.
+"""
+import csv
+import json
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import islice
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import counters, feed_cache, media, search, thumbnails, timeline
+from .models import Comment, Follow, Group, Post, ProfileStats, User
+
+FORMATS = ('ndjson', 'csv')
+
+# Поля строки файла для каждого вида данных, в порядке колонок CSV.
+FIELDS = {
+    'posts': ('id', 'text', 'pub_date', 'author', 'group', 'image'),
+    'comments': ('id', 'post', 'author', 'text', 'created'),
+    'follows': ('user', 'author'),
+}
+
+# Колонки values_list для экспорта, в том же порядке, что и FIELDS.
+EXPORT_COLUMNS = {
+    'posts': ('id', 'text', 'pub_date', 'author__username', 'group__slug',
+              'image'),
+    'comments': ('id', 'post_id', 'author__username', 'text', 'created'),
+    'follows': ('user__username', 'author__username'),
+}
+
+# Параметров в одном запросе IN (...), с запасом под лимит SQLite.
+LOOKUP_CHUNK = 500
+
+
+class RowError(ValueError):
+    """Строку нельзя импортировать; она пропускается."""
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def insert_batch_size(model, objects, batch_size):
+    """batch_size, урезанный до предела INSERT у бэкенда базы.
+
+    Django 2.2 не ограничивает явно переданный batch_size, а SQLite не
+    принимает больше 999 параметров и 500 строк в одном INSERT.
+    """
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key or objects[0].pk is not None
+    ]
+    limit = connection.ops.bulk_batch_size(fields, objects)
+    return max(1, min(batch_size, limit))
+
+
+def guess_format(path):
+    return 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+
+def read_records(file, file_format):
+    """Словари строк файла; пустые строки NDJSON пропускаются."""
+    if file_format == 'csv':
+        yield from csv.DictReader(file)
+        return
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield {'_error': f'строка {number}: некорректный JSON'}
+
+
+def isoformat(value):
+    # Даты пишутся с микросекундами: DjangoJSONEncoder обрезал бы их до
+    # миллисекунд, и ключ курсора после загрузки не совпал бы с исходным.
+    return value.isoformat()
+
+
+def write_records(file, file_format, kind, rows):
+    """Пишет кортежи EXPORT_COLUMNS, возвращает их число."""
+    fields = FIELDS[kind]
+    count = 0
+    if file_format == 'csv':
+        writer = csv.writer(file)
+        writer.writerow(fields)
+        for row in rows:
+            writer.writerow(
+                isoformat(value) if isinstance(value, datetime) else value
+                for value in row
+            )
+            count += 1
+        return count
+    encoder = json.JSONEncoder(
+        ensure_ascii=False, separators=(',', ':'), default=isoformat
+    )
+    for row in rows:
+        file.write(encoder.encode(dict(zip(fields, row))))
+        file.write('\n')
+        count += 1
+    return count
+
+
+def export_rows(kind, batch_size=2000):
+    """Строки для write_records, выбранные потоком без создания моделей."""
+    model = {'posts': Post, 'comments': Comment, 'follows': Follow}[kind]
+    return model.objects.order_by('pk').values_list(
+        *EXPORT_COLUMNS[kind]
+    ).iterator(chunk_size=batch_size)
+
+
+@contextmanager
+def keep_dates():
+    """Отключает auto_now_add, чтобы сохранить даты из файла.
+
+    Меняет поле модели на время импорта: команда работает в отдельном
+    процессе, и другие запросы этого не видят.
+    """
+    fields = [
+        Post._meta.get_field('pub_date'), Comment._meta.get_field('created')
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise RowError(f'некорректная дата {value!r}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def parse_id(value, name='id'):
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError(f'некорректный {name} {value!r}')
+
+
+class Importer:
+    """Импорт строк одного вида.
+
+    Итоги: rows - прочитано строк, accepted - прошли проверку и переданы
+    в bulk_create, errors - {причина: число пропущенных строк}.
+    """
+
+    def __init__(self, kind, batch_size=1000, transaction_size=10000,
+                 create_users=False):
+        self.kind = kind
+        self.batch_size = batch_size
+        self.transaction_size = max(transaction_size, batch_size)
+        self.create_users = create_users
+        self.users = dict(User.objects.values_list('username', 'id'))
+        self.groups = dict(Group.objects.values_list('slug', 'id'))
+        self.rows = 0
+        self.accepted = 0
+        self.errors = {}
+        # Что нужно обновить в finish.
+        self.author_ids = set()
+        self.group_ids = set()
+        self.user_ids = set()
+        self.post_ids = set()
+        self.images = set()
+        self.explicit_ids = False
+        self.batch_posts = set()
+        # Записи без id в файле получают id больше этого.
+        self.last_post_id = 0
+        if kind == 'posts':
+            self.last_post_id = Post.objects.aggregate(
+                last=Max('pk')
+            )['last'] or 0
+
+    def run(self, records, progress=None):
+        """Импортирует записи; progress(rows) вызывается после транзакции."""
+        with keep_dates():
+            for block in chunks(records, self.transaction_size):
+                with transaction.atomic():
+                    for batch in chunks(block, self.batch_size):
+                        self.import_batch(batch)
+                if progress is not None:
+                    progress(self.rows)
+        self.finish()
+
+    def error(self, message):
+        self.errors[message] = self.errors.get(message, 0) + 1
+
+    def import_batch(self, records):
+        self.rows += len(records)
+        if self.create_users:
+            self.add_missing_users(records)
+        if self.kind == 'comments':
+            self.batch_posts = self.existing_posts(records)
+        build = getattr(self, f'build_{self.kind[:-1]}')
+        objects = []
+        for record in records:
+            try:
+                if '_error' in record:
+                    raise RowError(record['_error'])
+                objects.append(build(record))
+            except RowError as error:
+                self.error(str(error))
+        if not objects:
+            return
+        # Строки с уже занятым id и повторные подписки пропускаются:
+        # повторный запуск того же файла ничего не дублирует.
+        model = type(objects[0])
+        model.objects.bulk_create(
+            objects,
+            batch_size=insert_batch_size(model, objects, self.batch_size),
+            ignore_conflicts=True,
+        )
+        self.accepted += len(objects)
+
+    def user_id(self, username):
+        if not username:
+            raise RowError('не указан пользователь')
+        try:
+            return self.users[username]
+        except KeyError:
+            raise RowError(f'нет пользователя {username}') from None
+
+    def add_missing_users(self, records):
+        names = {
+            record.get(field) for record in records
+            for field in ('author', 'user')
+            if record.get(field) and record.get(field) not in self.users
+        }
+        if not names:
+            return
+        new_users = []
+        for name in names:
+            user = User(username=name)
+            user.set_unusable_password()
+            new_users.append(user)
+        User.objects.bulk_create(
+            new_users,
+            batch_size=insert_batch_size(User, new_users, self.batch_size),
+            ignore_conflicts=True,
+        )
+        for part in chunks(names, LOOKUP_CHUNK):
+            self.users.update(User.objects.filter(
+                username__in=part
+            ).values_list('username', 'id'))
+
+    def existing_posts(self, records):
+        ids = set()
+        for record in records:
+            try:
+                ids.add(parse_id(record.get('post'), 'post'))
+            except RowError:
+                pass
+        ids.discard(None)
+        found = set()
+        for part in chunks(ids, LOOKUP_CHUNK):
+            found.update(Post.objects.filter(
+                pk__in=part
+            ).values_list('pk', flat=True))
+        return found
+
+    def build_post(self, record):
+        author_id = self.user_id(record.get('author'))
+        group_id = None
+        if record.get('group'):
+            try:
+                group_id = self.groups[record['group']]
+            except KeyError:
+                raise RowError(f'нет группы {record["group"]}') from None
+        if not record.get('text'):
+            raise RowError('пустой текст записи')
+        pk = parse_id(record.get('id'))
+        image = record.get('image') or ''
+        self.author_ids.add(author_id)
+        self.group_ids.add(group_id)
+        if pk is not None:
+            self.explicit_ids = True
+            self.post_ids.add(pk)
+        if image:
+            self.images.add(image)
+        return Post(
+            pk=pk,
+            text=record['text'],
+            pub_date=parse_date(record.get('pub_date')),
+            author_id=author_id,
+            group_id=group_id,
+            image=image,
+        )
+
+    def build_comment(self, record):
+        post_id = parse_id(record.get('post'), 'post')
+        if post_id not in self.batch_posts:
+            raise RowError(f'нет записи {record.get("post")}')
+        if not record.get('text'):
+            raise RowError('пустой текст комментария')
+        pk = parse_id(record.get('id'))
+        self.explicit_ids |= pk is not None
+        self.post_ids.add(post_id)
+        return Comment(
+            pk=pk,
+            post_id=post_id,
+            author_id=self.user_id(record.get('author')),
+            text=record['text'],
+            created=parse_date(record.get('created')),
+        )
+
+    def build_follow(self, record):
+        user_id = self.user_id(record.get('user'))
+        author_id = self.user_id(record.get('author'))
+        if user_id == author_id:
+            raise RowError('подписка на самого себя')
+        self.user_ids.add(user_id)
+        self.author_ids.add(author_id)
+        return Follow(user_id=user_id, author_id=author_id)
+
+    def finish(self):
+        """Обновляет то, что при обычном сохранении делают сигналы.
+
+        Пересчитываются только импортированные записи и их пользователи,
+        пачками по LOOKUP_CHUNK в отдельных транзакциях, так что база не
+        блокируется на время пересчёта всего сайта.
+        """
+        if not self.accepted:
+            return
+        if self.explicit_ids:
+            # В PostgreSQL последовательность id отстаёт от вставленных
+            # вручную значений; в SQLite список команд пуст.
+            model = Post if self.kind == 'posts' else Comment
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [model]
+                ):
+                    cursor.execute(sql)
+        if self.kind == 'posts':
+            self.post_ids.update(Post.objects.filter(
+                pk__gt=self.last_post_id
+            ).values_list('pk', flat=True))
+        # Комментарий меняет карточку записи в лентах её автора и группы.
+        scope_authors = set(self.author_ids)
+        scope_groups = set(self.group_ids)
+        for part in chunks(sorted(self.post_ids), LOOKUP_CHUNK):
+            with transaction.atomic():
+                if self.kind == 'comments':
+                    counters.recount_comment_counts(post_ids=part)
+                    for author_id, group_id in Post.objects.filter(
+                        pk__in=part
+                    ).values_list('author_id', 'group_id'):
+                        scope_authors.add(author_id)
+                        scope_groups.add(group_id)
+                else:
+                    self.index_posts(part)
+        batch_size = insert_batch_size(
+            ProfileStats, [ProfileStats(user_id=0)], self.batch_size
+        )
+        for part in chunks(self.author_ids | self.user_ids, LOOKUP_CHUNK):
+            with transaction.atomic():
+                counters.recount_profile_stats(
+                    user_ids=part, batch_size=batch_size
+                )
+        if self.kind == 'posts':
+            media.recount_references(self.images)
+        timeline.rebuild_authors(self.author_ids)
+        scopes = [feed_cache.POSTS]
+        scopes += [feed_cache.author_scope(pk) for pk in scope_authors]
+        scopes += [feed_cache.stats_scope(pk) for pk in scope_authors]
+        scopes += [
+            feed_cache.group_scope(pk) for pk in scope_groups
+            if pk is not None
+        ]
+        scopes += [feed_cache.follow_scope(pk) for pk in self.user_ids]
+        scopes += [feed_cache.stats_scope(pk) for pk in self.user_ids]
+        scopes += [feed_cache.post_scope(pk) for pk in self.post_ids]
+        feed_cache.invalidate_on_commit(*scopes)
+
+    def index_posts(self, post_ids):
+        """Индексирует записи и ставит в очередь миниатюры их картинок."""
+        posts = list(Post.objects.filter(
+            pk__in=post_ids
+        ).select_related('author', 'group'))
+        search.index_posts(posts)
+        for post in posts:
+            if post.image and not post.thumbnail:
+                thumbnails.schedule(post.pk)
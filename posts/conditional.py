@@ -0,0 +1,62 @@
+"""Валидаторы для условных GET-запросов к лентам и странице записи.
+
+ETag собирается из версий областей posts.feed_cache (они меняются при
+любой записи в Post, Comment, Follow или Group и читаются из кэша, без
+базы), адреса с курсором и пользователя, для которого отрисована
+страница.
+Last-Modified не выдаётся: дата последней записи не меняется при правке,
+удалении или отписке, и If-Modified-Since отдавал бы устаревшую страницу.
+"""
+import hashlib
+
+from . import feed_cache, writebehind
+from .models import Group, Post, User
+
+
+def _etag(request, scopes):
+    raw = '|'.join((
+        feed_cache.get_version(*scopes),
+        request.get_full_path(),
+        str(request.user.pk),
+        # Действие пользователя, ещё не записанное в базу, меняет страницу.
+        writebehind.pending_marker(request.user),
+    ))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def index_etag(request):
+    return _etag(request, (feed_cache.POSTS,))
+
+
+def group_etag(request, slug):
+    group_id = Group.objects.filter(
+        slug=slug
+    ).values_list('id', flat=True).first()
+    if group_id is None:
+        return None
+    return _etag(request, (feed_cache.group_scope(group_id),))
+
+
+def profile_etag(request, username):
+    author_id = User.objects.filter(
+        username=username
+    ).values_list('id', flat=True).first()
+    if author_id is None:
+        return None
+    return _etag(request, (
+        feed_cache.author_scope(author_id),
+        feed_cache.stats_scope(author_id),
+    ))
+
+
+def post_etag(request, username, post_id):
+    author_id = Post.objects.filter(
+        pk=post_id, author__username=username
+    ).values_list('author_id', flat=True).first()
+    if author_id is None:
+        return None
+    return _etag(request, (
+        feed_cache.post_scope(post_id),
+        feed_cache.author_scope(author_id),
+        feed_cache.stats_scope(author_id),
+    ))
@@ -0,0 +1,92 @@
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, ProfileStats, User
+
+# Поле ProfileStats -> (модель-источник, поле-ссылка на пользователя).
+PROFILE_COUNTERS = {
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+    'posts_count': (Post, 'author'),
+}
+
+
+def _increment(queryset, field, delta):
+    # Уменьшение не опускает счётчик ниже нуля даже при рассинхронизации,
+    # иначе сработает CHECK у PositiveIntegerField.
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def _count_subquery(model, field):
+    counts = model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def change_profile_stats(user_id, field, delta):
+    updated = _increment(
+        ProfileStats.objects.filter(user_id=user_id), field, delta
+    )
+    if not updated and delta > 0 and not ProfileStats.objects.filter(
+        user_id=user_id
+    ).exists():
+        # Пользователь появился в обход сигнала post_save (например, через
+        # bulk_create): заводим строку сразу с честными значениями.
+        recount_profile_stats(user_ids=[user_id])
+
+
+def change_comment_count(post_id, delta):
+    _increment(Post.objects.filter(pk=post_id), 'comment_count', delta)
+
+
+def recount_profile_stats(user_ids=None, batch_size=1000):
+    """Пересчитывает ProfileStats, возвращает число исправленных счётчиков."""
+    users = User.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    missing = users.filter(stats__isnull=True).values_list('pk', flat=True)
+    ProfileStats.objects.bulk_create(
+        (ProfileStats(user_id=pk) for pk in missing.iterator()),
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+    stats = ProfileStats.objects.all()
+    if user_ids is not None:
+        stats = stats.filter(user_id__in=user_ids)
+    actual = {
+        field: _count_subquery(model, ref)
+        for field, (model, ref) in PROFILE_COUNTERS.items()
+    }
+    drifted = stats.annotate(
+        **{f'actual_{field}': value for field, value in actual.items()}
+    )
+    drift = 0
+    for field in PROFILE_COUNTERS:
+        drift += drifted.exclude(**{field: F(f'actual_{field}')}).count()
+    stats.update(**actual)
+    return drift
+
+
+def recount_comment_counts(post_ids=None):
+    """Пересчитывает Post.comment_count, возвращает число исправленных."""
+    posts = Post.objects.all()
+    if post_ids is not None:
+        posts = posts.filter(pk__in=post_ids)
+    actual = _count_subquery(Comment, 'post')
+    drift = posts.annotate(actual=actual).exclude(
+        comment_count=F('actual')
+    ).count()
+    posts.update(comment_count=actual)
+    return drift
+
+
+@transaction.atomic
+def recount_all(batch_size=1000):
+    return {
+        'profile_stats': recount_profile_stats(batch_size=batch_size),
+        'comment_count': recount_comment_counts(),
+    }
@@ -0,0 +1,144 @@
+"""Версии для ключей кэша фрагментов лент.
+
+Ключ фрагмента включает номер версии каждой области, от которой зависит
+содержимое (все записи, группа, автор, подписки пользователя). Запись в
+Post, Comment или Follow увеличивает версии затронутых областей, и старые
+фрагменты просто перестают читаться, поэтому TTL можно держать большим.
+Те же области служат тегами страниц в posts.middleware.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'feed-version:'
+
+POSTS = 'posts'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def follow_scope(user_id):
+    return f'follow:{user_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def stats_scope(user_id):
+    """Счётчики подписчиков и подписок в карточке профиля."""
+    return f'stats:{user_id}'
+
+
+def post_scopes(author_id, *group_ids):
+    """Области, в лентах которых показывается запись."""
+    scopes = [POSTS, author_scope(author_id)]
+    scopes += [
+        group_scope(group_id)
+        for group_id in set(group_ids) if group_id is not None
+    ]
+    return scopes
+
+
+def _initial_version():
+    # Если счётчик вытеснен из кэша, новый отсчёт начинается с текущего
+    # времени и не совпадает ни с одной из уже выданных версий.
+    return time.time_ns()
+
+
+def get_version(*scopes):
+    """Общая версия для набора областей, годная для {% cache %}."""
+    keys = [KEY_PREFIX + scope for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), None)
+            versions[key] = cache.get(key)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def invalidate(*scopes):
+    for scope in scopes:
+        key = KEY_PREFIX + scope
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+
+
+def invalidate_on_commit(*scopes):
+    """Увеличивает версии после коммита текущей транзакции.
+
+    Запрос, прочитавший базу до коммита, иначе сохранил бы старые данные
+    под уже новой версией. То же с репликой, которая ещё не получила
+    коммит, поэтому при репликах версии увеличиваются второй раз, когда
+    реплики заведомо догнали основную базу (REPLICA_PIN_SECONDS).
+    """
+    def committed():
+        invalidate(*scopes)
+        if settings.DATABASE_REPLICAS:
+            _delayed.add(scopes, settings.REPLICA_PIN_SECONDS)
+    # Вне транзакции выполняется сразу.
+    transaction.on_commit(committed)
+
+
+class DelayedInvalidation:
+    """Поток, который увеличивает версии через заданное время.
+
+    Задержка у всех одна, поэтому очередь упорядочена по сроку сама.
+    """
+
+    def __init__(self):
+        self.queue = deque()
+        self.ready = threading.Condition()
+        self.thread = None
+
+    def add(self, scopes, delay):
+        with self.ready:
+            self.queue.append((time.monotonic() + delay, scopes))
+            self.ready.notify()
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name='feed-cache-rebump', daemon=True
+                )
+                self.thread.start()
+
+    def run(self):
+        while True:
+            with self.ready:
+                while not self.queue:
+                    self.ready.wait()
+                due, scopes = self.queue[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self.ready.wait(wait)
+                    continue
+                self.queue.popleft()
+            try:
+                invalidate(*scopes)
+            except Exception:
+                logger.exception('Не удалось повторно сбросить версии')
+
+
+_delayed = DelayedInvalidation()
+
+
+def context(*scopes):
+    """Переменные шаблона для кэширования фрагмента ленты."""
+    return {
+        'cache_timeout': settings.FEED_CACHE_TIMEOUT,
+        'cache_version': get_version(*scopes),
+    }
@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from .images import prepare_upload
 from .models import Comment, Post
 
 
@@ -8,6 +10,30 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Файлы, от которых отказался posts.uploads.ImageUploadHandler,
+        # в поле не передаются: вместо них форма покажет причину отказа.
+        self.upload_errors = {}
+        if self.files:
+            self.files = self.files.copy()
+            for name, upload in list(self.files.items()):
+                error = getattr(upload, 'upload_error', None)
+                if error:
+                    self.upload_errors[name] = error
+                    del self.files[name]
+
+    def clean_image(self):
+        if 'image' in self.upload_errors:
+            raise forms.ValidationError(
+                self.upload_errors['image'], code='invalid_upload'
+            )
+        image = self.cleaned_data['image']
+        # При редактировании без новой картинки здесь уже сохранённый файл.
+        if isinstance(image, UploadedFile):
+            return prepare_upload(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,190 @@
+"""Обработка картинок записей на Pillow.
+
+При загрузке картинка декодируется, проверяется на размер и число
+пикселей, поворачивается по EXIF и, если нужно, перекодируется без
+метаданных и с ограничением по длинной стороне. Для ленты из неё
+строятся кадры 960x339 нескольких ширин в WebP (и AVIF, если Pillow
+умеет его писать), которые отдаются через srcset.
+"""
+import hashlib
+import io
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+# Кадр карточки в ленте.
+CARD_SIZE = (960, 339)
+VARIANT_WIDTHS = (480, 960, 1440)
+VARIANT_DIR = 'posts/variants'
+
+# Ключи Image.info, которые описывают только кодирование картинки.
+# Любой другой ключ - EXIF, XMP, текстовые блоки PNG и прочее - может
+# нести данные о съёмке и владельце, и файл с ним перекодируется.
+ENCODING_KEYS = frozenset((
+    'jfif', 'jfif_version', 'jfif_unit', 'jfif_density', 'dpi',
+    'progressive', 'progression', 'adobe', 'adobe_transform', 'gamma',
+    'srgb', 'chromaticity', 'transparency', 'background', 'version',
+    'loop', 'duration', 'interlace', 'compression', 'resolution', 'aspect',
+))
+
+FORMATS = {
+    # MIME-тип: (формат Pillow, расширение, параметры кодирования).
+    'image/avif': ('AVIF', 'avif', {'quality': 50}),
+    'image/webp': ('WEBP', 'webp', {'quality': 80, 'method': 6}),
+}
+
+
+def variant_formats():
+    """Форматы вариантов, которые поддерживает установленный Pillow."""
+    Image.init()
+    return [
+        (mime, *params) for mime, params in FORMATS.items()
+        if params[0] in Image.SAVE
+    ]
+
+
+def prepare_upload(upload):
+    """Проверяет загруженную картинку и при необходимости перекодирует.
+
+    Файл без метаданных, не превышающий settings.POST_IMAGE_MAX_SIDE,
+    сохраняется как есть; анимации не перекодируются.
+    """
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)d МБ.',
+            code='file_too_large',
+            params={'limit': settings.POST_IMAGE_MAX_BYTES // 2 ** 20},
+        )
+    upload.seek(0)
+    image = Image.open(upload)
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Слишком большое разрешение: %(width)dx%(height)d.',
+            code='too_many_pixels',
+            params={'width': width, 'height': height},
+        )
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    oversized = max(width, height) > max_side
+    if getattr(image, 'n_frames', 1) > 1:
+        if oversized:
+            raise ValidationError(
+                'Анимация больше %(side)d пикселей по длинной стороне.',
+                code='animation_too_large',
+                params={'side': max_side},
+            )
+        upload.seek(0)
+        return upload
+    if not oversized and ENCODING_KEYS.issuperset(image.info):
+        upload.seek(0)
+        return upload
+    image_format = image.format
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    # Часть кодеров Pillow переносит в файл ключи из info.
+    image.info = {
+        key: value for key, value in image.info.items()
+        if key in ENCODING_KEYS
+    }
+    content = io.BytesIO()
+    if image_format == 'JPEG':
+        image.convert('RGB').save(
+            content, 'JPEG', quality=85, optimize=True, progressive=True
+        )
+    else:
+        image.save(content, image_format, optimize=True)
+    prepared = SimpleUploadedFile(
+        upload.name, content.getvalue(), upload.content_type
+    )
+    prepared.sha256 = hashlib.sha256(content.getvalue()).hexdigest()
+    return prepared
+
+
+def card_crop(image, width):
+    """Кадр карточки ленты заданной ширины."""
+    height = round(width * CARD_SIZE[1] / CARD_SIZE[0])
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info
+                              else 'RGB')
+    return ImageOps.fit(image, (width, height), Image.LANCZOS)
+
+
+def encode(image, pil_format, options):
+    content = io.BytesIO()
+    image.save(content, pil_format, **options)
+    return content.getvalue()
+
+
+def variant_key(name):
+    return hashlib.sha1(name.encode()).hexdigest()[:16]
+
+
+def variant_name(key, width, digest, extension):
+    # Хеш содержимого в имени: файл по адресу не меняется и отдаётся
+    # с immutable, а новые варианты не затирают те, что уже в ленте.
+    return os.path.join(VARIANT_DIR, key, f'{width}-{digest}.{extension}')
+
+
+def srcset_names(sources):
+    """Имена файлов вариантов из {MIME-тип: srcset}."""
+    return {
+        url[len(settings.MEDIA_URL):]
+        for srcset in sources.values()
+        for url in srcset.split()[::2]
+    }
+
+
+def delete_variants(name, keep=()):
+    """Удаляет варианты картинки, кроме имён из keep."""
+    key = variant_key(name)
+    directory = os.path.join(VARIANT_DIR, key)
+    try:
+        _, files = default_storage.listdir(directory)
+    except FileNotFoundError:
+        files = []
+    for filename in files:
+        path = os.path.join(directory, filename)
+        if path not in keep:
+            default_storage.delete(path)
+    # Варианты, построенные до появления хеша в имени.
+    for _, extension, _ in FORMATS.values():
+        for width in VARIANT_WIDTHS:
+            default_storage.delete(
+                os.path.join(VARIANT_DIR, f'{key}-{width}.{extension}')
+            )
+
+
+def build_variants(image_field):
+    """Сохраняет варианты картинки, возвращает {MIME-тип: srcset}.
+
+    Прежние варианты не трогаются: их удаляет delete_variants, когда
+    новые адреса уже записаны в Post.image_variants.
+    """
+    with image_field.open('rb') as file:
+        image = Image.open(file)
+        image.load()
+    key = variant_key(image_field.name)
+    # Ширины больше исходной не нужны, но 960 есть всегда: это кадр
+    # карточки для обычного экрана.
+    widths = [
+        width for width in VARIANT_WIDTHS
+        if width <= max(image.width, CARD_SIZE[0])
+    ]
+    crops = {width: card_crop(image, width) for width in widths}
+    sources = {}
+    for mime, pil_format, extension, options in variant_formats():
+        candidates = []
+        for width, crop in crops.items():
+            content = encode(crop, pil_format, options)
+            digest = hashlib.sha256(content).hexdigest()[:12]
+            name = variant_name(key, width, digest, extension)
+            if not default_storage.exists(name):
+                name = default_storage.save(name, io.BytesIO(content))
+            candidates.append(f'{default_storage.url(name)} {width}w')
+        sources[mime] = ', '.join(candidates)
+    return sources
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts import media
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки записей, на которые больше никто не '
+            'ссылается, вместе с их миниатюрами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=None,
+            help='Сколько секунд файл должен пробыть без ссылок '
+                 '(по умолчанию MEDIA_GC_GRACE).'
+        )
+
+    def handle(self, *args, **options):
+        collected = media.collect(grace=options['grace'])
+        for name in collected:
+            self.stdout.write(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено файлов: {len(collected)}'
+        ))
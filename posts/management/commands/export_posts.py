@@ -0,0 +1,48 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = 'Выгружает записи, комментарии или подписки в NDJSON или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл для записи или - для stdout.')
+        parser.add_argument(
+            '--kind', choices=tuple(bulk.FIELDS), default='posts',
+            help='Что выгружать.'
+        )
+        parser.add_argument(
+            '--format', choices=bulk.FORMATS,
+            help='Формат файла; по умолчанию по расширению, иначе NDJSON.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Сколько строк выбирать из базы за раз.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or bulk.guess_format(path)
+        started = time.monotonic()
+        rows = bulk.export_rows(options['kind'], options['batch_size'])
+        if path == '-':
+            count = bulk.write_records(
+                sys.stdout, file_format, options['kind'], rows
+            )
+            # Итог не должен попасть в выгрузку.
+            report = self.stderr
+        else:
+            with open(path, 'w', encoding='utf-8', newline='') as file:
+                count = bulk.write_records(
+                    file, file_format, options['kind'], rows
+                )
+            report = self.stdout
+        elapsed = time.monotonic() - started
+        report.write(self.style.SUCCESS(
+            f'Выгружено строк: {count} за {elapsed:.1f} с '
+            f'({count / max(elapsed, 1e-6):.0f} строк/с)'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import writebehind
+
+
+class Command(BaseCommand):
+    help = ('Записывает в базу действия, оставшиеся в журнале отложенной '
+            'записи, например после падения процесса.')
+
+    def handle(self, *args, **options):
+        count = writebehind.flush_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Записано действий из журнала: {count}'
+        ))
@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.synthetic import Generator
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, группами, '
+            'подписками, записями и комментариями для замеров.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument(
+            '--comments-per-post', type=float, default=3.0,
+            help='Среднее число комментариев к записи.'
+        )
+        parser.add_argument(
+            '--follows-per-user', type=int, default=20,
+            help='Типичное число подписок; распределение с тяжёлым хвостом.'
+        )
+        parser.add_argument(
+            '--image-share', type=float, default=0.2,
+            help='Доля записей с картинкой.'
+        )
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель степенного закона популярности авторов.'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней распределить записи.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        generator = Generator(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments_per_post=options['comments_per_post'],
+            follows_per_user=options['follows_per_user'],
+            image_share=options['image_share'],
+            exponent=options['exponent'],
+            days=options['days'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+        )
+        started = time.monotonic()
+        created = generator.run(
+            progress=lambda rows: self.stdout.write(f'... {rows} строк')
+        )
+        for kind, count in created.items():
+            self.stdout.write(f'{kind}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с'
+        ))
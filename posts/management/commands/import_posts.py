@@ -0,0 +1,67 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = ('Загружает записи, комментарии или подписки из NDJSON или CSV '
+            'пачками через bulk_create.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл для чтения или - для stdin.')
+        parser.add_argument(
+            '--kind', choices=tuple(bulk.FIELDS), default='posts',
+            help='Что загружать.'
+        )
+        parser.add_argument(
+            '--format', choices=bulk.FORMATS,
+            help='Формат файла; по умолчанию по расширению, иначе NDJSON.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько объектов вставлять одним bulk_create.'
+        )
+        parser.add_argument(
+            '--transaction-size', type=int, default=10000,
+            help='Через сколько строк фиксировать транзакцию.'
+        )
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Создавать неизвестных пользователей без пароля.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or bulk.guess_format(path)
+        importer = bulk.Importer(
+            options['kind'],
+            batch_size=options['batch_size'],
+            transaction_size=options['transaction_size'],
+            create_users=options['create_users'],
+        )
+        started = time.monotonic()
+
+        def progress(rows):
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'Прочитано строк: {rows} '
+                f'({rows / max(elapsed, 1e-6):.0f} строк/с)'
+            )
+
+        if path == '-':
+            file = sys.stdin
+        else:
+            file = open(path, encoding='utf-8', newline='')
+        with file:
+            importer.run(bulk.read_records(file, file_format), progress)
+        elapsed = time.monotonic() - started
+        for message, count in sorted(importer.errors.items()):
+            self.stderr.write(f'Пропущено {count}: {message}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено строк: {importer.accepted} из {importer.rows} '
+            f'за {elapsed:.1f} с ({importer.rows / max(elapsed, 1e-6):.0f} '
+            f'строк/с)'
+        ))
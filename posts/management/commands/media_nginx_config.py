@@ -0,0 +1,30 @@
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import media
+
+TEMPLATE = '''\
+# Создано командой media_nginx_config: заголовки те же, что у serve_media.
+location ~ "^{url}(?<media_path>{paths})$" {{
+    alias {root}/$media_path;
+    add_header Cache-Control "{cache_control}";
+}}
+location {url} {{
+    alias {root}/;
+}}
+'''
+
+
+class Command(BaseCommand):
+    help = ('Выводит блоки location для nginx, раздающего MEDIA_ROOT: '
+            'файлы с неизменным содержимым получают долгий кэш.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(TEMPLATE.format(
+            url=re.escape(settings.MEDIA_URL),
+            paths=media.IMMUTABLE_PATHS.pattern[1:-1],
+            root=settings.MEDIA_ROOT.rstrip('/'),
+            cache_control=media.IMMUTABLE_CACHE_CONTROL,
+        ), ending='')
@@ -0,0 +1,53 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import profiling
+
+
+class Command(BaseCommand):
+    help = 'Самые горячие функции по снимкам медленных запросов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir', default=None,
+            help='Каталог снимков; по умолчанию settings.PROFILER_DIR.'
+        )
+        parser.add_argument(
+            '--view', help='Только снимки этого представления (имя URL).'
+        )
+        parser.add_argument(
+            '--top', type=int, default=20, help='Сколько функций показать.'
+        )
+        parser.add_argument(
+            '--project-only', action='store_true',
+            help='Только функции из кода проекта, без Django и библиотек.'
+        )
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or settings.PROFILER_DIR
+        if not os.path.isdir(directory):
+            raise CommandError(f'Нет каталога снимков {directory}')
+        captures = list(profiling.read_captures(directory, options['view']))
+        if not captures:
+            raise CommandError(f'В {directory} нет снимков')
+        own, total, samples = profiling.hot_frames(captures)
+        if options['project_only']:
+            apps = tuple(f'({app}{os.sep}' for app in ('posts', 'users',
+                                                       'about', 'yatube'))
+            own = {frame: count for frame, count in own.items()
+                   if any(app in frame for app in apps)}
+            total = {frame: count for frame, count in total.items()
+                     if any(app in frame for app in apps)}
+        self.stdout.write(
+            f'Снимков: {len(captures)}, выборок: {samples}\n'
+        )
+        for title, counter in (('Своё время', own),
+                               ('Вместе с вызванными', total)):
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            ranked = sorted(counter.items(), key=lambda item: -item[1])
+            for frame, count in ranked[:options['top']]:
+                self.stdout.write(
+                    f'{count / samples:>7.1%} {count:>7}  {frame}'
+                )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс записей с нуля.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько записей индексировать за один проход.'
+        )
+
+    def handle(self, *args, **options):
+        count = search.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано записей: {count} '
+            f'(бэкенд {search.get_backend().name})'
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount_all
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики подписчиков, подписок, записей '
+            'и комментариев, исправляя рассинхронизацию.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Размер пачки при создании недостающих ProfileStats.'
+        )
+
+    def handle(self, *args, **options):
+        drift = recount_all(batch_size=options['batch_size'])
+        for name, fixed in drift.items():
+            self.stdout.write(f'{name}: исправлено {fixed}')
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
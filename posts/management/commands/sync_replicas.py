@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from posts.replicas import copy_sqlite
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в файлы реплик: замена '
+            'репликации для локальной проверки чтения с реплик.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять каждые N секунд; 0 - скопировать один раз.'
+        )
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('Реплики копируются только для SQLite.')
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не заданы: YATUBE_DB_REPLICAS.')
+        source = settings.DATABASES['default']['NAME']
+        while True:
+            started = time.monotonic()
+            for alias in settings.DATABASE_REPLICAS:
+                copy_sqlite(source, settings.DATABASES[alias]['NAME'])
+            self.stdout.write(
+                f'Реплик обновлено: {len(settings.DATABASE_REPLICAS)} '
+                f'за {time.monotonic() - started:.2f} с'
+            )
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
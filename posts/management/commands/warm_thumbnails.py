@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры для записей с картинками, у которых их нет.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Сколько миниатюр строить параллельно.'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Перестроить и уже готовые миниатюры.'
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['force']:
+            posts = posts.filter(thumbnail='')
+        post_ids = list(posts.order_by('-pub_date').values_list(
+            'pk', flat=True
+        ))
+        ready = thumbnails.warm(post_ids, options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюр готово: {ready} из {len(post_ids)}'
+        ))
@@ -0,0 +1,120 @@
+"""Счётчики ссылок на картинки и сборка мусора.
+
+Картинки лежат в posts.storage.ContentAddressedStorage, и один файл может
+принадлежать нескольким записям. Сигналы posts.signals увеличивают
+StoredImage.refcount при появлении картинки у записи и уменьшают при
+замене или удалении. Файл, на который никто не ссылается дольше
+settings.MEDIA_GC_GRACE секунд, удаляется вместе с миниатюрами: пауза
+нужна, чтобы не удалить файл, который в этот момент загружают повторно.
+"""
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from . import images
+from .models import Post, StoredImage
+
+# Файлы, содержимое которых по этому адресу никогда не меняется:
+# оригиналы с именем из хеша, миниатюры sorl и варианты для srcset.
+IMMUTABLE_PATHS = re.compile(
+    r'^(posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+'
+    r'|posts/variants/.+|cache/.+)$'
+)
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def acquire(name):
+    with transaction.atomic():
+        StoredImage.objects.get_or_create(name=name)
+        StoredImage.objects.filter(name=name).update(
+            refcount=F('refcount') + 1, orphaned_at=None
+        )
+
+
+def reserve(name):
+    """Откладывает сборку файла без ссылок, который загружают повторно.
+
+    Хранилище вызывает её до проверки, есть ли уже такой файл: между
+    сохранением файла и acquire() при сохранении записи collect его не
+    удалит.
+    """
+    StoredImage.objects.filter(name=name, refcount=0).update(
+        orphaned_at=timezone.now()
+    )
+
+
+def release(name):
+    StoredImage.objects.filter(name=name, refcount__gt=0).update(
+        refcount=F('refcount') - 1
+    )
+    StoredImage.objects.filter(
+        name=name, refcount=0, orphaned_at__isnull=True
+    ).update(orphaned_at=timezone.now())
+
+
+def recount_references(names, batch_size=500):
+    """Выставляет refcount картинок по числу записей, которые на них
+    ссылаются; нужен после вставки записей в обход сигналов.
+    """
+    names = list(names)
+    for start in range(0, len(names), batch_size):
+        part = names[start:start + batch_size]
+        StoredImage.objects.bulk_create(
+            (StoredImage(name=name) for name in part), ignore_conflicts=True
+        )
+        references = dict(Post.objects.filter(image__in=part).values(
+            'image'
+        ).annotate(total=Count('pk')).order_by().values_list(
+            'image', 'total'
+        ))
+        for name in part:
+            total = references.get(name, 0)
+            StoredImage.objects.filter(name=name).update(
+                refcount=total,
+                orphaned_at=None if total else timezone.now(),
+            )
+
+
+def storage():
+    return Post._meta.get_field('image').storage
+
+
+def delete_file(name):
+    """Удаляет картинку, её миниатюру sorl и варианты для srcset."""
+    delete_thumbnails(ImageFile(name, storage()))
+    images.delete_variants(name)
+
+
+def collect(grace=None):
+    """Удаляет картинки без ссылок, возвращает их имена."""
+    if grace is None:
+        grace = settings.MEDIA_GC_GRACE
+    cutoff = timezone.now() - timedelta(seconds=grace)
+    names = list(StoredImage.objects.filter(
+        refcount=0, orphaned_at__lte=cutoff
+    ).values_list('name', flat=True))
+    collected = []
+    for name in names:
+        with transaction.atomic():
+            # Пока шёл обход, на картинку могла появиться ссылка или
+            # повторная загрузка. Условие проверяется тем же DELETE, и
+            # файл удаляется до коммита: acquire() и reserve() ждут
+            # блокировку записи и видят либо строку, либо пропавший файл.
+            deleted, _ = StoredImage.objects.filter(
+                name=name, refcount=0, orphaned_at__lte=cutoff
+            ).delete()
+            if deleted:
+                delete_file(name)
+        if deleted:
+            collected.append(name)
+    return collected
+
+
+def is_immutable(path):
+    return IMMUTABLE_PATHS.match(path) is not None
@@ -0,0 +1,255 @@
+"""Метрики запросов в формате Prometheus.
+
+MetricsMiddleware меряет для каждого запроса время ответа, время и число
+SQL-запросов (через execute_wrapper всех баз), время отрисовки шаблона
+(TimedDjangoTemplates) и состояние кэша страниц из заголовка
+X-Page-Cache, с меткой - именем URL (index, group, profile, post...).
+Значения копятся в гистограммах процесса и раз в
+settings.METRICS_FLUSH_INTERVAL секунд прибавляются к общему файлу
+SQLite settings.METRICS_DB, так что /metrics показывает сумму по всем
+воркерам, а не только по тому, кому достался запрос.
+"""
+import bisect
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+from django.urls import Resolver404, resolve
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+# Имя: (тип, описание, границы корзин для гистограмм).
+METRICS = {
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время ответа', SECONDS_BUCKETS),
+    'yatube_db_duration_seconds': (
+        'histogram', 'Время SQL-запросов за запрос', SECONDS_BUCKETS),
+    'yatube_db_queries': (
+        'histogram', 'Число SQL-запросов за запрос', QUERY_BUCKETS),
+    'yatube_template_duration_seconds': (
+        'histogram', 'Время отрисовки шаблона', SECONDS_BUCKETS),
+    'yatube_requests_total': ('counter', 'Ответы по статусу', None),
+    'yatube_page_cache_total': (
+        'counter', 'Ответы кэша страниц для анонимов', None),
+}
+
+_local = threading.local()
+
+
+class Registry:
+    """Накопленные в процессе значения: {(метрика, метки, поле): число}.
+
+    Поле - граница корзины гистограммы, 'sum', 'count' или 'value' для
+    счётчика; корзины хранятся не накопленными, их складывает render.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = defaultdict(float)
+        self.flushed = time.monotonic()
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        index = bisect.bisect_left(buckets, value)
+        bucket = str(buckets[index]) if index < len(buckets) else '+Inf'
+        with self.lock:
+            self.values[name, labels, bucket] += 1
+            self.values[name, labels, 'sum'] += value
+            self.values[name, labels, 'count'] += 1
+
+    def inc(self, name, labels):
+        with self.lock:
+            self.values[name, labels, 'value'] += 1
+
+    def take(self):
+        with self.lock:
+            values, self.values = self.values, defaultdict(float)
+            self.flushed = time.monotonic()
+        return values
+
+
+registry = Registry()
+
+
+def _sink():
+    path = settings.METRICS_DB
+    connection = getattr(_local, 'sinks', {}).get(path)
+    if connection is None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS metrics ('
+            'name TEXT, labels TEXT, field TEXT, value REAL NOT NULL, '
+            'PRIMARY KEY (name, labels, field))'
+        )
+        _local.sinks = {**getattr(_local, 'sinks', {}), path: connection}
+    return connection
+
+
+def flush():
+    """Прибавляет значения процесса к общему файлу."""
+    values = registry.take()
+    if not values:
+        return
+    sink = _sink()
+    sink.execute('BEGIN IMMEDIATE')
+    try:
+        sink.executemany(
+            'INSERT INTO metrics (name, labels, field, value) '
+            'VALUES (?, ?, ?, ?) ON CONFLICT (name, labels, field) '
+            'DO UPDATE SET value = value + excluded.value',
+            [(name, labels, field, value)
+             for (name, labels, field), value in values.items()]
+        )
+    finally:
+        sink.execute('COMMIT')
+
+
+def maybe_flush():
+    elapsed = time.monotonic() - registry.flushed
+    if elapsed >= settings.METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def labels(**values):
+    return ','.join(
+        f'{key}="{value}"' for key, value in sorted(values.items())
+    )
+
+
+def render():
+    """Все метрики из общего файла в текстовом формате Prometheus."""
+    flush()
+    rows = defaultdict(dict)
+    for name, label_text, field, value in _sink().execute(
+        'SELECT name, labels, field, value FROM metrics '
+        'ORDER BY name, labels'
+    ):
+        rows[name, label_text][field] = value
+    lines = []
+    described = set()
+    for (name, label_text), fields in rows.items():
+        kind, description, buckets = METRICS.get(name, ('untyped', '', None))
+        if name not in described:
+            described.add(name)
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+        if kind != 'histogram':
+            lines.append(f'{name}{{{label_text}}} {fields["value"]:g}')
+            continue
+        prefix = f'{label_text},' if label_text else ''
+        cumulative = 0
+        for bound in (*map(str, buckets), '+Inf'):
+            cumulative += fields.get(bound, 0)
+            lines.append(
+                f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative:g}'
+            )
+        lines.append(f'{name}_sum{{{label_text}}} {fields["sum"]:g}')
+        lines.append(f'{name}_count{{{label_text}}} {fields["count"]:g}')
+    return '\n'.join(lines) + '\n'
+
+
+def record_template(seconds):
+    sample = getattr(_local, 'sample', None)
+    if sample is not None:
+        sample['template'] += seconds
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            record_template(time.perf_counter() - started)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Бэкенд шаблонов Django, который меряет время отрисовки.
+
+    Меряется только шаблон верхнего уровня: include и extends рисуются
+    внутри него и отдельно не считаются.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+def execute_wrapper(wrapper):
+    """execute_wrapper на всех базах: чтения идут и на реплики."""
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+    return stack
+
+
+def view_name(request):
+    match = request.resolver_match
+    if match is None:
+        # Ответ из кэша страниц отдаётся до разбора URL.
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return 'unmatched'
+    return match.url_name or match.view_name
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample = {'db': 0.0, 'queries': 0, 'template': 0.0}
+        _local.sample = sample
+
+        def timer(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                sample['db'] += time.perf_counter() - started
+                sample['queries'] += 1
+
+        started = time.perf_counter()
+        try:
+            with execute_wrapper(timer):
+                response = self.get_response(request)
+        finally:
+            _local.sample = None
+        elapsed = time.perf_counter() - started
+        name = view_name(request)
+        view = labels(view=name)
+        registry.observe('yatube_request_duration_seconds', view, elapsed)
+        registry.observe('yatube_db_duration_seconds', view, sample['db'])
+        registry.observe('yatube_db_queries', view, sample['queries'])
+        if sample['template']:
+            registry.observe(
+                'yatube_template_duration_seconds', view, sample['template']
+            )
+        registry.inc('yatube_requests_total', labels(
+            view=name, status=response.status_code
+        ))
+        if response.has_header('X-Page-Cache'):
+            registry.inc('yatube_page_cache_total', labels(
+                view=name,
+                state=response['X-Page-Cache'].lower(),
+            ))
+        maybe_flush()
+        return response
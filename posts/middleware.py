@@ -0,0 +1,111 @@
+"""Кэш целых страниц для анонимных посетителей.
+
+Представление помечает ответ областями posts.feed_cache, от которых он
+зависит (tag_response), и middleware кладёт готовый HTML в кэш по пути
+и строке запроса вместе с версиями этих областей. Пока версии не
+менялись и не истёк RESPONSE_CACHE_TIMEOUT, страница отдаётся без
+представления и шаблонов. Устаревшую страницу перестраивает один
+запрос, взявший блокировку, а остальные в это время ещё
+RESPONSE_CACHE_STALE секунд получают прежнюю копию.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from . import feed_cache
+
+KEY_PREFIX = 'page:'
+LOCK_PREFIX = 'page-lock:'
+# Заголовки, которые нельзя отдавать другим посетителям.
+PRIVATE_HEADERS = ('set-cookie',)
+
+
+def tag_response(request, *scopes):
+    """Разрешает кэшировать ответ и связывает его с областями.
+
+    Вызывается до выборки данных. Версии меняются только после коммита
+    записи (feed_cache.invalidate_on_commit), поэтому прочитанные потом
+    данные не старше версии. Запись, закоммиченная во время рендера,
+    увеличит версию уже после неё, и следующий запрос перестроит страницу.
+    """
+    if request.user.is_authenticated:
+        return
+    request.response_cache_scopes = scopes
+    request.response_cache_version = feed_cache.get_version(*scopes)
+
+
+def cache_key(request):
+    digest = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return KEY_PREFIX + digest
+
+
+class AnonymousPageCacheMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method not in ('GET', 'HEAD') or (
+            request.user.is_authenticated
+        ):
+            return self.get_response(request)
+        key = cache_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            fresh = (
+                entry['expires'] > time.time()
+                and entry['version'] == feed_cache.get_version(
+                    *entry['scopes']
+                )
+            )
+            if fresh:
+                return self.build(entry, 'HIT')
+            # Страницу перестраивает только тот, кто взял блокировку.
+            if not cache.add(
+                LOCK_PREFIX + key, True, settings.RESPONSE_CACHE_LOCK_TIMEOUT
+            ):
+                return self.build(entry, 'STALE')
+        try:
+            response = self.get_response(request)
+            self.store(request, response, key)
+        finally:
+            if entry is not None:
+                cache.delete(LOCK_PREFIX + key)
+        return response
+
+    @staticmethod
+    def build(entry, state):
+        response = HttpResponse(entry['content'], status=entry['status'])
+        for header, value in entry['headers']:
+            response[header] = value
+        response['X-Page-Cache'] = state
+        return response
+
+    def store(self, request, response, key):
+        scopes = getattr(request, 'response_cache_scopes', None)
+        if (
+            scopes is None
+            or response.status_code != 200
+            or response.streaming
+            or response.cookies
+            or request.META.get('CSRF_COOKIE_USED')
+        ):
+            return
+        entry = {
+            'content': response.content,
+            'status': response.status_code,
+            'headers': [
+                (header, value) for header, value in response.items()
+                if header.lower() not in PRIVATE_HEADERS
+            ],
+            'scopes': scopes,
+            'version': request.response_cache_version,
+            'expires': time.time() + settings.RESPONSE_CACHE_TIMEOUT,
+        }
+        cache.set(
+            key, entry,
+            settings.RESPONSE_CACHE_TIMEOUT + settings.RESPONSE_CACHE_STALE
+        )
+        response['X-Page-Cache'] = 'MISS'
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.20 on 2026-10-18 12:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_follow'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='post',
+            options={'ordering': ('-pub_date', '-id')},
+        ),
+    ]
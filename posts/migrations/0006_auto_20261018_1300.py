@@ -0,0 +1,58 @@
+# Generated by Django 2.2.20 on 2026-10-18 13:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, field):
+    counts = model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    ProfileStats = apps.get_model('posts', 'ProfileStats')
+    Post.objects.update(comment_count=count_subquery(Comment, 'post'))
+    ProfileStats.objects.bulk_create(
+        ProfileStats(user_id=pk)
+        for pk in User.objects.values_list('pk', flat=True).iterator()
+    )
+    ProfileStats.objects.update(
+        followers_count=count_subquery(Follow, 'author'),
+        following_count=count_subquery(Follow, 'user'),
+        posts_count=count_subquery(Post, 'author'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0005_auto_20261018_1200'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число комментариев'),
+        ),
+        migrations.CreateModel(
+            name='ProfileStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Записей')),
+            ],
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
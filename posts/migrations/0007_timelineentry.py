@@ -0,0 +1,52 @@
+# Generated by Django 2.2.20 on 2026-10-18 14:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_timeline(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    threshold = settings.FEED_FANOUT_THRESHOLD
+    for follow in Follow.objects.filter(
+        author__stats__followers_count__lte=threshold
+    ).iterator():
+        TimelineEntry.objects.bulk_create(
+            (TimelineEntry(user_id=follow.user_id, post_id=pk, pub_date=date)
+             for pk, date in Post.objects.filter(
+                 author_id=follow.author_id
+             ).values_list('pk', 'pub_date').iterator()),
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0006_auto_20261018_1300'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date'], name='timeline_user_pub_date'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='timeline_user_post'),
+        ),
+        migrations.RunPython(fill_timeline, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 2.2.20 on 2026-10-18 16:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, field):
+    counts = model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    ProfileStats = apps.get_model('posts', 'ProfileStats')
+    Follow.objects.filter(user__isnull=True).delete()
+    duplicates = Follow.objects.values('user', 'author').annotate(
+        keep=Min('pk'), total=Count('pk')
+    ).filter(total__gt=1)
+    for duplicate in duplicates.iterator():
+        Follow.objects.filter(
+            user=duplicate['user'],
+            author=duplicate['author'],
+        ).exclude(pk=duplicate['keep']).delete()
+    ProfileStats.objects.update(
+        followers_count=count_subquery(Follow, 'author'),
+        following_count=count_subquery(Follow, 'user'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0008_auto_20261018_1500'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_follows, migrations.RunPython.noop
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='follower', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
@@ -0,0 +1,233 @@
+# Generated by Django 2.2.20 on 2026-10-18 17:00
+
+import re
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import OperationalError, migrations, models
+
+# Копия posts.stemmer на момент миграции: индекс должен строиться так
+# же, даже если стеммер приложения потом изменится или переедет.
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (
+    ('ившись', 'ывшись', 'ивши', 'ывши', 'ив', 'ыв'),
+    ('вшись', 'вши', 'в'),
+)
+ADJECTIVE = (
+    'ими', 'ыми', 'его', 'ого', 'ему', 'ому', 'ее', 'ие', 'ые', 'ое',
+    'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом', 'их', 'ых', 'ую',
+    'юю', 'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE = (
+    ('ивш', 'ывш', 'ующ'),
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+)
+REFLEXIVE = ('ся', 'сь')
+VERB = (
+    ('ейте', 'уйте', 'ила', 'ыла', 'ена', 'ите', 'или', 'ыли', 'ило',
+     'ыло', 'ено', 'ует', 'уют', 'ены', 'ить', 'ыть', 'ишь', 'ей', 'уй',
+     'ил', 'ыл', 'им', 'ым', 'ен', 'ят', 'ит', 'ыт', 'ую', 'ю'),
+    ('ете', 'йте', 'ешь', 'нно', 'ла', 'на', 'ли', 'ем', 'ло', 'но', 'ет',
+     'ют', 'ны', 'ть', 'й', 'л', 'н'),
+)
+NOUN = (
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ев', 'ов', 'ие',
+    'ье', 'еи', 'ии', 'ей', 'ой', 'ий', 'ям', 'ем', 'ам', 'ом', 'ах', 'ях',
+    'ию', 'ью', 'ия', 'ья', 'а', 'е', 'и', 'й', 'о', 'у', 'ы', 'ь', 'ю',
+    'я',
+)
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+CYRILLIC = re.compile('^[а-я]+$')
+
+
+def _regions(word):
+    """Начала областей RV и R2."""
+    rv = r1 = r2 = len(word)
+    for i, letter in enumerate(word):
+        if letter in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _strip(word, start, endings, preceded=False):
+    """Отрезает самое длинное окончание, целиком лежащее после start.
+
+    preceded=True требует, чтобы перед окончанием стояла «а» или «я»
+    (первые группы окончаний в описании алгоритма).
+    """
+    for ending in sorted(endings, key=len, reverse=True):
+        if not word.endswith(ending):
+            continue
+        position = len(word) - len(ending)
+        if preceded:
+            if position - 1 < start or word[position - 1] not in 'ая':
+                continue
+        elif position < start:
+            continue
+        return word[:position]
+    return None
+
+
+def _strip_grouped(word, start, groups):
+    # Окончания первой группы не требуют предшествующей «а»/«я».
+    candidates = [
+        result for result in (
+            _strip(word, start, groups[0]),
+            _strip(word, start, groups[1], preceded=True),
+        ) if result is not None
+    ]
+    return min(candidates, key=len) if candidates else None
+
+
+def _adjectival(word, start):
+    stripped = _strip(word, start, ADJECTIVE)
+    if stripped is None:
+        return None
+    participle = _strip_grouped(stripped, start, PARTICIPLE)
+    return stripped if participle is None else participle
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC.match(word):
+        return word
+    rv, r2 = _regions(word)
+
+    # Шаг 1.
+    stripped = _strip_grouped(word, rv, PERFECTIVE_GERUND)
+    if stripped is not None:
+        word = stripped
+    else:
+        word = _strip(word, rv, REFLEXIVE) or word
+        for step in (
+            lambda w: _adjectival(w, rv),
+            lambda w: _strip_grouped(w, rv, VERB),
+            lambda w: _strip(w, rv, NOUN),
+        ):
+            stripped = step(word)
+            if stripped is not None:
+                word = stripped
+                break
+
+    # Шаг 2.
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    # Шаг 3.
+    word = _strip(word, r2, DERIVATIONAL) or word
+
+    # Шаг 4.
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    stripped = _strip(word, rv, SUPERLATIVE)
+    if stripped is not None:
+        word = stripped
+        if word.endswith('нн') and len(word) - 2 >= rv:
+            word = word[:-1]
+        return word
+    if word.endswith('ь') and len(word) - 1 >= rv:
+        word = word[:-1]
+    return word
+
+
+FIELD_WEIGHTS = {'text': 1.0, 'group_title': 2.0, 'username': 2.0}
+
+
+def terms(text):
+    return [stem(word) for word in re.findall(r'\w+', text or '')]
+
+
+def documents(apps):
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.select_related('author', 'group').order_by('pk')
+    for post in posts.iterator():
+        yield post.pk, {
+            'text': post.text,
+            'group_title': post.group.title if post.group_id else '',
+            'username': post.author.username,
+        }
+
+
+def create_search_index(apps, schema_editor):
+    # Русского стеммера в FTS5 нет, поэтому в таблицу пишутся уже
+    # приведённые к основе слова, а токенизатор только делит их по пробелам.
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'CREATE VIRTUAL TABLE posts_search USING fts5('
+                    'text, group_title, username, '
+                    "tokenize = 'unicode61 remove_diacritics 0')"
+                )
+        except OperationalError:
+            # SQLite собран без FTS5: работает индекс в SearchTerm.
+            pass
+        else:
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    'INSERT INTO posts_search '
+                    '(rowid, text, group_title, username) '
+                    'VALUES (%s, %s, %s, %s)',
+                    [
+                        (pk, *(' '.join(terms(fields[field]))
+                               for field in FIELD_WEIGHTS))
+                        for pk, fields in documents(apps)
+                    ]
+                )
+            return
+    SearchTerm = apps.get_model('posts', 'SearchTerm')
+    entries = []
+    for pk, fields in documents(apps):
+        weights = Counter()
+        for field, text in fields.items():
+            for term in terms(text):
+                weights[term[:64]] += FIELD_WEIGHTS[field]
+        entries += [
+            SearchTerm(term=term, post_id=pk, weight=weight)
+            for term, weight in weights.items()
+        ]
+    SearchTerm.objects.bulk_create(entries, batch_size=500)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_auto_20261018_1600'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.FloatField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchterm',
+            constraint=models.UniqueConstraint(fields=('term', 'post'), name='search_term_post'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
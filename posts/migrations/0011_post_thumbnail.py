@@ -0,0 +1,18 @@
+# Generated by Django 2.2.20 on 2026-10-18 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_searchterm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnail',
+            field=models.CharField(blank=True, editable=False, help_text='Адрес миниатюры, её строит posts.thumbnails', max_length=255, verbose_name='Миниатюра'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.20 on 2026-10-18 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_variants',
+            field=models.TextField(blank=True, editable=False, help_text='JSON {MIME-тип: srcset}, его строит posts.thumbnails', verbose_name='Варианты картинки'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 2.2.20 on 2026-10-18 20:00
+
+from django.db import migrations, models
+from django.db.models import Count
+
+import posts.storage
+
+
+def count_references(apps, schema_editor):
+    # Картинки, загруженные до хранилища по содержимому, остаются под
+    # прежними именами; для них просто заводятся счётчики ссылок.
+    Post = apps.get_model('posts', 'Post')
+    StoredImage = apps.get_model('posts', 'StoredImage')
+    references = Post.objects.exclude(image='').exclude(
+        image__isnull=True
+    ).values('image').annotate(total=Count('pk')).order_by()
+    StoredImage.objects.bulk_create(
+        (StoredImage(name=row['image'], refcount=row['total'])
+         for row in references.iterator()),
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredImage',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('orphaned_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Загрузите изображение', null=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Изображение'),
+        ),
+        migrations.AddIndex(
+            model_name='storedimage',
+            index=models.Index(fields=['orphaned_at'], name='stored_image_orphaned'),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
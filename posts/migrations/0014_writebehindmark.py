@@ -0,0 +1,20 @@
+# Generated by Django 2.2.20 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_storedimage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WriteBehindMark',
+            fields=[
+                ('journal', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('applied_id', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
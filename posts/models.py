@@ -1,8 +1,12 @@
+import json
+
 from django.contrib.auth import get_user_model
 from django.db import models
 from django.db.models.deletion import CASCADE
 from django.db.models.fields.related import ForeignKey
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -27,6 +31,17 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        """Записи со всем, что нужно карточке includes/post_item.html.
+
+        Автор и группа подтягиваются JOIN-ом, а число комментариев хранится
+        в самой записи (Post.comment_count), так что страница ленты
+        выбирается одним запросом.
+        """
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст',
@@ -53,17 +68,56 @@ class Post(models.Model):
     image = models.ImageField(
         verbose_name='Изображение',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
         null=True,
         help_text='Загрузите изображение'
     )
+    thumbnail = models.CharField(
+        verbose_name='Миниатюра',
+        max_length=255,
+        blank=True,
+        editable=False,
+        help_text='Адрес миниатюры, её строит posts.thumbnails'
+    )
+    image_variants = models.TextField(
+        verbose_name='Варианты картинки',
+        blank=True,
+        editable=False,
+        help_text='JSON {MIME-тип: srcset}, его строит posts.thumbnails'
+    )
+    comment_count = models.PositiveIntegerField(
+        verbose_name='Число комментариев',
+        default=0,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = [
+            models.Index(fields=['-pub_date'], name='post_pub_date'),
+            models.Index(
+                fields=['group', '-pub_date'],
+                name='post_group_pub_date'
+            ),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='post_author_pub_date'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def image_sources(self):
+        """Пары (MIME-тип, srcset) для <picture>, AVIF раньше WebP."""
+        if not self.image_variants:
+            return []
+        return sorted(json.loads(self.image_variants).items())
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -83,12 +137,24 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    class Meta:
+        ordering = ('created', 'id')
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created'
+            ),
+        ]
+
 
 class Follow(models.Model):
+    # Отдельный индекс по user не нужен: его покрывает уникальный индекс
+    # (user, author), которым пользуются и проверки подписки.
     user = ForeignKey(
         User,
         on_delete=CASCADE,
         related_name='follower',
+        db_index=False,
     )
     author = ForeignKey(
         User,
@@ -97,7 +163,123 @@ class Follow(models.Model):
     )
 
     class Meta:
-        constraints = models.UniqueConstraint(
-            fields=['user', 'author'],
-            name='ua'
-        )
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow'
+            ),
+        ]
+
+
+class ProfileStats(models.Model):
+    """Счётчики профиля, которые поддерживаются сигналами posts.signals.
+
+    Хранятся отдельно от пользователя, чтобы mini_profile.html не считал
+    подписчиков, подписки и записи через COUNT(*) на каждой странице.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков',
+        default=0
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name='Подписок',
+        default=0
+    )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Записей',
+        default=0
+    )
+
+    def __str__(self):
+        return f'{self.user}: {self.posts_count}'
+
+
+class TimelineEntry(models.Model):
+    """Запись в материализованной ленте подписок пользователя.
+
+    Заполняется при публикации (fan-out on write), см. posts.timeline.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='timeline_user_post'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_post'
+            ),
+        ]
+
+
+class SearchTerm(models.Model):
+    """Строка инвертированного индекса: основа слова и запись, где она есть.
+
+    Запасной бэкенд поиска для баз без FTS5, см. posts.search.
+    """
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms'
+    )
+    weight = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['term', 'post'],
+                name='search_term_post'
+            ),
+        ]
+
+
+class StoredImage(models.Model):
+    """Файл картинки в хранилище и число записей, которые на него ссылаются.
+
+    Файл без ссылок удаляет команда collect_media, см. posts.media.
+    """
+    name = models.CharField(max_length=255, primary_key=True)
+    refcount = models.PositiveIntegerField(default=0)
+    orphaned_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['orphaned_at'], name='stored_image_orphaned'),
+        ]
+
+    def __str__(self):
+        return f'{self.name}: {self.refcount}'
+
+
+class WriteBehindMark(models.Model):
+    """Последняя строка журнала posts.writebehind, уже записанная в базу.
+
+    Обновляется в той же транзакции, что и пачка записей: после сбоя
+    между коммитом и очисткой журнала эти строки не применяются дважды.
+    """
+    journal = models.CharField(max_length=32, primary_key=True)
+    applied_id = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.journal}: {self.applied_id}'
@@ -0,0 +1,314 @@
+import base64
+import binascii
+import heapq
+from datetime import datetime
+
+from django.db.models import Q
+from django.http import HttpResponseRedirect
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, key, pk):
+    """Упаковывает позицию в ленте в непрозрачную строку для URL.
+
+    key - значение, по которому вместе с pk упорядочена выборка: pub_date
+    в лентах, релевантность в поиске.
+    """
+    key = key.isoformat() if isinstance(key, datetime) else repr(key)
+    raw = f'{direction}|{key}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, parse_key=parse_datetime):
+    """Возвращает (direction, key, pk) или None для битого курсора.
+
+    parse_key разбирает ключ и возвращает None, если он некорректен.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, key, pk = raw.decode().split('|')
+        key = parse_key(key)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or key is None:
+        return None
+    return direction, key, pk
+
+
+class KeysetSource:
+    """Источник записей ленты для CursorPaginator.
+
+    queryset упорядочивается по (pub_date, id_field); item превращает
+    строку выборки в запись ленты. Так, например, материализованная
+    лента отдаёт Post из TimelineEntry, не теряя порядка по её индексу.
+    """
+
+    def __init__(self, queryset, id_field='pk', item=None):
+        self.queryset = queryset
+        self.id_field = id_field
+        self.item = item
+
+    def ordered(self, direction=NEXT):
+        prefix = '' if direction == PREVIOUS else '-'
+        return self.queryset.order_by(
+            f'{prefix}pub_date', f'{prefix}{self.id_field}'
+        )
+
+    def after(self, direction, pub_date, pk):
+        # Условие записано как диапазон по pub_date с исключением, а не
+        # как OR двух условий: так SQLite идёт по индексу в нужном порядке
+        # вместо MULTI-INDEX OR с сортировкой во временном B-дереве.
+        if direction == NEXT:
+            condition = Q(pub_date__lte=pub_date) & ~Q(
+                pub_date=pub_date, **{f'{self.id_field}__gte': pk}
+            )
+        else:
+            condition = Q(pub_date__gte=pub_date) & ~Q(
+                pub_date=pub_date, **{f'{self.id_field}__lte': pk}
+            )
+        return self.ordered(direction).filter(condition)
+
+    def items(self, rows):
+        if self.item is None:
+            return rows
+        return [self.item(row) for row in rows]
+
+
+class KeysetPage:
+    """Страница, листаемая курсорами по (key, pk).
+
+    Повторяет ту часть интерфейса django.core.paginator.Page, которую
+    используют шаблоны, но не знает ни номера страницы, ни их количества.
+    key - имя атрибута записи, по которому вместе с pk упорядочена выборка.
+    """
+
+    key = 'pub_date'
+
+    def __init__(self, object_list, has_next, has_previous, key='pub_date'):
+        self._object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.key = key
+
+    @property
+    def object_list(self):
+        return self._object_list
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if not self.object_list or not self._has_next:
+            return None
+        last = self.object_list[-1]
+        return encode_cursor(NEXT, getattr(last, self.key), last.pk)
+
+    @property
+    def previous_cursor(self):
+        if not self.object_list or not self._has_previous:
+            return None
+        first = self.object_list[0]
+        return encode_cursor(PREVIOUS, getattr(first, self.key), first.pk)
+
+
+class CursorPage(KeysetPage):
+    """Страница ленты, полученная по курсору.
+
+    Запросы выполняются при первом обращении к записям, поэтому страница,
+    отрисованная из кэша фрагментов, не обращается к базе.
+    """
+
+    def __init__(self, querysets, paginator, direction=None):
+        self.paginator = paginator
+        self.querysets = querysets
+        self._direction = direction
+        self._object_list = None
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self)} items>'
+
+    def _fetch(self):
+        per_page = self.paginator.per_page
+        descending = self._direction != PREVIOUS
+        parts = [
+            source.items(list(queryset[:per_page + 1]))
+            for source, queryset in zip(self.paginator.sources, self.querysets)
+        ]
+        rows = []
+        seen = set()
+        for row in heapq.merge(
+            *parts, key=lambda row: (row.pub_date, row.pk), reverse=descending
+        ):
+            # Одна запись может прийти из нескольких источников.
+            if row.pk not in seen:
+                seen.add(row.pk)
+                rows.append(row)
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if self._direction == PREVIOUS:
+            rows.reverse()
+            self._has_next, self._has_previous = True, has_more
+        else:
+            self._has_next = has_more
+            self._has_previous = self._direction == NEXT
+        self._object_list = rows
+
+    @property
+    def object_list(self):
+        if self._object_list is None:
+            self._fetch()
+        return self._object_list
+
+
+class CursorPaginator:
+    """Keyset-паджинатор по (pub_date, id) в порядке убывания.
+
+    Каждая страница выбирается одним запросом на источник с условием по
+    ключу последней показанной записи, поэтому не нужны ни COUNT(*), ни
+    OFFSET, и глубина страницы не влияет на время выборки. object_list -
+    QuerySet записей или список KeysetSource, которые сливаются по ключу.
+    """
+
+    def __init__(self, object_list, per_page):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        if isinstance(object_list, (list, tuple)):
+            self.sources = list(object_list)
+        else:
+            self.sources = [KeysetSource(object_list)]
+
+    def get_page(self, cursor=None):
+        position = decode_cursor(cursor)
+        if position is None:
+            return CursorPage(
+                [source.ordered() for source in self.sources], self
+            )
+        return CursorPage(
+            [source.after(*position) for source in self.sources],
+            self,
+            position[0],
+        )
+
+    def cursor_for_page(self, number):
+        """Курсор, с которого начинается страница number старой нумерации.
+
+        Нужен только для перенаправления ссылок вида ?page=N, поэтому здесь
+        допустим запрос с OFFSET. Номер за концом ленты, как в
+        Paginator.get_page, означает последнюю страницу; для первой или
+        некорректной страницы возвращается None, то есть начало ленты.
+        """
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            return None
+        if number <= 1:
+            return None
+        offset = (number - 1) * self.per_page
+        if len(self.sources) == 1:
+            source = self.sources[0]
+            keys = source.ordered().values_list('pub_date', source.id_field)
+            key = next(iter(keys[offset - 1:offset]), None)
+            if key is None:
+                offset = self._last_page_offset(keys.count())
+                if not offset:
+                    return None
+                key = keys[offset - 1]
+            return encode_cursor(NEXT, *key)
+        merged = []
+        seen = set()
+        for pub_date, pk in heapq.merge(
+            *(source.ordered().values_list('pub_date', source.id_field)[
+                :offset] for source in self.sources),
+            reverse=True,
+        ):
+            if pk not in seen:
+                seen.add(pk)
+                merged.append((pub_date, pk))
+                if len(merged) == offset:
+                    break
+        if len(merged) < offset:
+            offset = self._last_page_offset(len(merged))
+            if not offset:
+                return None
+        return encode_cursor(NEXT, *merged[offset - 1])
+
+    def _last_page_offset(self, count):
+        """Число записей перед последней страницей ленты из count записей."""
+        return max(count - 1, 0) // self.per_page * self.per_page
+
+
+class CommentPage:
+    """Порция комментариев записи по возрастанию (created, id).
+
+    object_list - ленивый QuerySet, как у обычной страницы Django.
+    Следующая порция выбирается по ключу последнего показанного
+    комментария тем же индексом (post, created), что и первая; есть ли
+    она, проверяется одним EXISTS только для заполненной порции.
+    """
+
+    def __init__(self, queryset, per_page, cursor=None):
+        self.base = queryset.order_by('created', 'id')
+        self.queryset = self.base
+        position = decode_cursor(cursor)
+        if position is not None:
+            self.queryset = self.after(*position[1:])
+        self.per_page = per_page
+        self.object_list = self.queryset[:per_page]
+
+    def after(self, created, pk):
+        return self.base.filter(
+            Q(created__gte=created) & ~Q(created=created, id__lte=pk)
+        )
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @cached_property
+    def next_cursor(self):
+        if len(self.object_list) < self.per_page:
+            return None
+        last = self.object_list[self.per_page - 1]
+        if not self.after(last.created, last.pk).exists():
+            return None
+        return encode_cursor(NEXT, last.created, last.pk)
+
+
+def legacy_page_redirect(request, paginator):
+    """Перенаправляет ссылку ?page=N на эквивалентный ?cursor=..."""
+    query = request.GET.copy()
+    cursor = paginator.cursor_for_page(query.pop('page', [None])[-1])
+    if cursor:
+        query['cursor'] = cursor
+    url = request.path
+    if query:
+        url = f'{url}?{query.urlencode()}'
+    return HttpResponseRedirect(url)
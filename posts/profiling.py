@@ -0,0 +1,204 @@
+"""Выборочный профилировщик медленных запросов.
+
+Пока идёт запрос, фоновый поток раз в settings.PROFILER_INTERVAL секунд
+снимает стек его потока (sys._current_frames), а execute_wrapper
+записывает SQL. Если запрос шёл дольше settings.PROFILER_THRESHOLD
+секунд или сотрудник прислал заголовок X-Profile, стеки сохраняются в
+settings.PROFILER_DIR в свёрнутом виде для flamegraph.pl и speedscope
+(<имя>.collapsed), а запросы - рядом (<имя>.sql). Хранятся последние
+settings.PROFILER_KEEP снимков; сводку по ним печатает команда
+profile_summary.
+
+Профилировщик включается settings.PROFILER_ENABLED; по заголовку
+сотрудника снимок делается и при выключенном.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from .metrics import execute_wrapper, view_name
+
+HEADER = 'HTTP_X_PROFILE'
+SUFFIXES = ('.collapsed', '.sql')
+
+
+def frame_name(code):
+    path = code.co_filename
+    if path.startswith(settings.BASE_DIR):
+        path = os.path.relpath(path, settings.BASE_DIR)
+    else:
+        # Пакеты из site-packages, без пути до них.
+        for prefix in sorted(sys.path, key=len, reverse=True):
+            if prefix and path.startswith(prefix + os.sep):
+                path = path[len(prefix) + 1:]
+                break
+    return f'{code.co_name} ({path}:{code.co_firstlineno})'
+
+
+def collapse(frame):
+    """Стек от корня к листу через ';', как ждёт flamegraph.pl."""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler:
+    """Один поток снимает стеки всех профилируемых запросов процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.targets = {}
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def start(self, thread_id):
+        samples = Counter()
+        with self.lock:
+            self.targets[thread_id] = samples
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name='yatube-profiler', daemon=True
+                )
+                self.thread.start()
+        self.wakeup.set()
+        return samples
+
+    def stop(self, thread_id):
+        with self.lock:
+            self.targets.pop(thread_id, None)
+            if not self.targets:
+                self.wakeup.clear()
+
+    def run(self):
+        while True:
+            self.wakeup.wait()
+            time.sleep(settings.PROFILER_INTERVAL)
+            frames = sys._current_frames()
+            with self.lock:
+                for thread_id, samples in self.targets.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[collapse(frame)] += 1
+            del frames
+
+
+sampler = Sampler()
+
+
+def rotate(directory, keep):
+    """Удаляет старые снимки, оставляя keep последних."""
+    stems = {}
+    for entry in os.scandir(directory):
+        stem, suffix = os.path.splitext(entry.name)
+        if suffix in SUFFIXES:
+            stems[stem] = max(stems.get(stem, 0), entry.stat().st_mtime)
+    for stem in sorted(stems, key=stems.get)[:max(len(stems) - keep, 0)]:
+        for suffix in SUFFIXES:
+            try:
+                os.remove(os.path.join(directory, stem + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def save(request, view, elapsed, samples, queries):
+    """Пишет снимок запроса, возвращает путь к .collapsed."""
+    directory = settings.PROFILER_DIR
+    os.makedirs(directory, exist_ok=True)
+    stem = '{}-{:06d}-{}ms-{}-{}'.format(
+        time.strftime('%Y%m%d-%H%M%S'), int(time.time() * 1e6) % 10 ** 6,
+        round(elapsed * 1000), view, os.getpid(),
+    )
+    path = os.path.join(directory, stem)
+    with open(path + '.collapsed', 'w', encoding='utf-8') as file:
+        for stack, count in samples.most_common():
+            file.write(f'{stack} {count}\n')
+    with open(path + '.sql', 'w', encoding='utf-8') as file:
+        file.write(
+            f'-- {request.method} {request.get_full_path()}\n'
+            f'-- view {view}, {elapsed * 1000:.0f} ms, '
+            f'{len(queries)} queries, '
+            f'{sum(seconds for _, seconds in queries) * 1000:.0f} ms in SQL\n'
+        )
+        for sql, seconds in queries:
+            file.write(f'\n-- {seconds * 1000:.1f} ms\n{sql};\n')
+    rotate(directory, settings.PROFILER_KEEP)
+    return path + '.collapsed'
+
+
+def requested(request):
+    return HEADER in request.META and request.user.is_staff
+
+
+class ProfilerMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        forced = requested(request)
+        if not (settings.PROFILER_ENABLED or forced):
+            return self.get_response(request)
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                if not many:
+                    sql = context['connection'].ops.last_executed_query(
+                        context['cursor'], sql, params
+                    )
+                queries.append((sql, time.perf_counter() - started))
+
+        thread_id = threading.get_ident()
+        samples = sampler.start(thread_id)
+        started = time.perf_counter()
+        try:
+            with execute_wrapper(record):
+                response = self.get_response(request)
+        finally:
+            sampler.stop(thread_id)
+        elapsed = time.perf_counter() - started
+        if forced or elapsed >= settings.PROFILER_THRESHOLD:
+            path = save(request, view_name(request), elapsed, samples, queries)
+            if forced:
+                response['X-Profile'] = os.path.basename(path)
+        return response
+
+
+def read_captures(directory, view=None):
+    """(имя снимка, Counter стеков) для файлов .collapsed каталога."""
+    for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+        if not entry.name.endswith('.collapsed'):
+            continue
+        if view and f'ms-{view}-' not in entry.name:
+            continue
+        samples = Counter()
+        with open(entry.path, encoding='utf-8') as file:
+            for line in file:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack:
+                    samples[stack] += int(count)
+        yield entry.name[:-len('.collapsed')], samples
+
+
+def hot_frames(captures):
+    """Число выборок на функции: (в самой функции, вместе с вызванными)."""
+    own = Counter()
+    total = Counter()
+    samples = 0
+    for _, stacks in captures:
+        for stack, count in stacks.items():
+            frames = stack.split(';')
+            samples += count
+            own[frames[-1]] += count
+            # Рекурсивная функция считается один раз на стек.
+            for frame in set(frames):
+                total[frame] += count
+    return own, total, samples
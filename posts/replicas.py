@@ -0,0 +1,112 @@
+"""Чтение лент и профилей с реплик базы.
+
+Представления, которые только читают (index, group_posts, profile,
+post_view, post_comments, follow_index), помечены read_from_replica:
+их SELECT уходят на случайную реплику из settings.DATABASE_REPLICAS,
+а все записи - на default. Реплика отстаёт от основной базы, поэтому
+после записи посетитель REPLICA_PIN_SECONDS секунд читает с default:
+ReplicaMiddleware ставит ему cookie, и свежий комментарий или запись
+видны сразу. Запрос, который сам что-то записал, тоже до конца читает
+с default.
+
+Локально реплики - копии файла SQLite, которые обновляет команда
+sync_replicas (copy_sqlite), как поток репликации с задержкой.
+"""
+import random
+import sqlite3
+import threading
+from functools import wraps
+
+from django.conf import settings
+
+PIN_COOKIE = 'yatube_primary'
+
+_local = threading.local()
+
+
+def choose():
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+def pinned():
+    return getattr(_local, 'pinned', False) or getattr(_local, 'wrote', False)
+
+
+def pin():
+    """Читать с default до конца запроса и REPLICA_PIN_SECONDS после."""
+    _local.wrote = True
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (settings.DATABASE_REPLICAS and not pinned()
+                and getattr(_local, 'replica', False)):
+            return choose()
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Явно: иначе Django записал бы объект, прочитанный с реплики,
+        # обратно в неё (instance._state.db).
+        pin()
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же строки, что и default.
+        databases = {'default', *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+
+def read_from_replica(view):
+    """Направляет чтение представления на реплику."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+        # Сессия и пользователь читаются с default: только что вошедший
+        # посетитель мог ещё не попасть на реплику.
+        request.user.is_authenticated
+        _local.replica = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _local.replica = False
+    return wrapper
+
+
+class ReplicaMiddleware:
+    """Закрепляет посетителя за default на время после его записи."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _local.pinned = PIN_COOKIE in request.COOKIES
+        _local.wrote = False
+        try:
+            response = self.get_response(request)
+            wrote = _local.wrote
+        finally:
+            _local.pinned = _local.wrote = False
+        if wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+
+def copy_sqlite(source, target):
+    """Переносит текущее состояние базы source в файл target.
+
+    Online backup SQLite копирует согласованный снимок, не останавливая
+    запись в source; читатели target ждут окончания копирования.
+    """
+    source_connection = sqlite3.connect(source, timeout=30)
+    target_connection = sqlite3.connect(target, timeout=30)
+    try:
+        source_connection.backup(target_connection)
+    finally:
+        target_connection.close()
+        source_connection.close()
@@ -0,0 +1,264 @@
+"""Полнотекстовый поиск по записям.
+
+Индексируются текст записи, название группы и имя автора, все слова
+приводятся к основе стеммером posts.stemmer. Основной бэкенд - таблица
+SQLite FTS5 posts_search (создаётся миграцией, если FTS5 доступен),
+запасной - инвертированный индекс в модели SearchTerm, который работает
+на любой базе. Результаты упорядочены по релевантности и листаются
+курсором по (score, id), как ленты - по (pub_date, id).
+"""
+import math
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, When
+
+from .models import Post, SearchTerm
+from .paginators import NEXT, PREVIOUS, KeysetPage, decode_cursor
+from .stemmer import stem
+
+FTS_TABLE = 'posts_search'
+
+# Вес совпадения в поле документа: имя автора и группа важнее текста.
+FIELD_WEIGHTS = {'text': 1.0, 'group_title': 2.0, 'username': 2.0}
+
+WORD = re.compile(r'\w+')
+
+# Длиннее SearchTerm.term не сохраняется; слова запроса обрезаются так же,
+# иначе длинное слово не нашло бы само себя.
+MAX_TERM_LENGTH = SearchTerm._meta.get_field('term').max_length
+
+
+def terms(text):
+    return [
+        stem(word)[:MAX_TERM_LENGTH] for word in WORD.findall(text or '')
+    ]
+
+
+def parse_score(value):
+    """Релевантность из курсора, None для нечисла и бесконечности."""
+    score = float(value)
+    return score if math.isfinite(score) else None
+
+
+def document(post):
+    """Поля записи для индексации."""
+    return {
+        'text': post.text,
+        'group_title': post.group.title if post.group_id else '',
+        'username': post.author.username,
+    }
+
+
+class FTS5Backend:
+    name = 'fts5'
+
+    def index(self, posts):
+        rows = []
+        for post in posts:
+            fields = document(post)
+            rows.append((
+                post.pk,
+                *(' '.join(terms(fields[field])) for field in FIELD_WEIGHTS)
+            ))
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [(row[0],) for row in rows]
+            )
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} '
+                '(rowid, text, group_title, username) '
+                'VALUES (%s, %s, %s, %s)',
+                rows
+            )
+
+    def remove(self, post_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [(pk,) for pk in post_ids]
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def scores(self, query_terms, position, limit):
+        # Каждое слово в кавычках: пользовательский ввод не разбирается
+        # как синтаксис запроса FTS5. bm25() тем лучше, чем меньше, поэтому
+        # score - это -bm25, и больше значит релевантнее.
+        match = ' '.join(f'"{term}"' for term in query_terms)
+        weights = ', '.join(str(weight) for weight in FIELD_WEIGHTS.values())
+        sql = (
+            'SELECT id, score FROM ('
+            f'SELECT rowid AS id, -bm25({FTS_TABLE}, {weights}) AS score '
+            f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)'
+        )
+        params = [match]
+        if position is None or position[0] == NEXT:
+            order = 'score DESC, id DESC'
+            if position is not None:
+                sql += ' WHERE score < %s OR (score = %s AND id < %s)'
+        else:
+            order = 'score ASC, id ASC'
+            sql += ' WHERE score > %s OR (score = %s AND id > %s)'
+        if position is not None:
+            params += [position[1], position[1], position[2]]
+        sql += f' ORDER BY {order} LIMIT %s'
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+class InvertedIndexBackend:
+    name = 'python'
+
+    def index(self, posts):
+        posts = list(posts)
+        entries = []
+        for post in posts:
+            weights = Counter()
+            for field, text in document(post).items():
+                for term in terms(text):
+                    weights[term] += FIELD_WEIGHTS[field]
+            entries += [
+                SearchTerm(term=term, post_id=post.pk, weight=weight)
+                for term, weight in weights.items()
+            ]
+        SearchTerm.objects.filter(post__in=posts).delete()
+        SearchTerm.objects.bulk_create(entries, batch_size=500)
+
+    def remove(self, post_ids):
+        SearchTerm.objects.filter(post_id__in=post_ids).delete()
+
+    def clear(self):
+        SearchTerm.objects.all().delete()
+
+    def scores(self, query_terms, position, limit):
+        unique_terms = sorted(set(query_terms))
+        total = Post.objects.count() or 1
+        frequencies = dict(SearchTerm.objects.filter(
+            term__in=unique_terms
+        ).values('term').annotate(
+            documents=Count('post')
+        ).values_list('term', 'documents'))
+        if len(frequencies) < len(unique_terms):
+            return []
+        # Взвешенная частота слова, умноженная на его idf.
+        score = Sum(Case(
+            *(When(term=term, then=F('weight') * math.log(
+                1 + total / frequencies[term]
+            )) for term in unique_terms),
+            output_field=FloatField(),
+        ))
+        matches = SearchTerm.objects.filter(
+            term__in=unique_terms
+        ).values('post_id').annotate(
+            score=score,
+            matched=Count('term'),
+        ).filter(matched=len(unique_terms))
+        if position is None or position[0] == NEXT:
+            if position is not None:
+                matches = matches.filter(
+                    Q(score__lt=position[1])
+                    | Q(score=position[1], post_id__lt=position[2])
+                )
+            matches = matches.order_by('-score', '-post_id')
+        else:
+            matches = matches.filter(
+                Q(score__gt=position[1])
+                | Q(score=position[1], post_id__gt=position[2])
+            ).order_by('score', 'post_id')
+        return list(matches.values_list('post_id', 'score')[:limit])
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (FTS5Backend(), InvertedIndexBackend())
+}
+
+_fts5 = {}
+
+
+def fts5_available():
+    # Таблицу создаёт миграция, поэтому список таблиц читается один раз за
+    # процесс для каждой базы, а не при каждом сохранении записи.
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _fts5:
+        _fts5[name] = FTS_TABLE in connection.introspection.table_names()
+    return _fts5[name]
+
+
+def get_backend():
+    name = settings.SEARCH_BACKEND
+    if name == 'auto':
+        name = 'fts5' if fts5_available() else 'python'
+    return BACKENDS.get(name, BACKENDS['python'])
+
+
+def index_posts(posts):
+    get_backend().index(posts)
+
+
+def remove_posts(post_ids):
+    get_backend().remove(post_ids)
+
+
+@transaction.atomic
+def rebuild(batch_size=500):
+    """Полностью перестраивает индекс, возвращает число записей.
+
+    Одна транзакция: поиск не видит пустой индекс на время перестройки,
+    а SQLite не фиксирует на диск каждую вставленную строку.
+    """
+    backend = get_backend()
+    backend.clear()
+    posts = Post.objects.select_related('author', 'group').order_by('pk')
+    count = 0
+    batch = []
+    for post in posts.iterator(chunk_size=batch_size):
+        batch.append(post)
+        if len(batch) == batch_size:
+            backend.index(batch)
+            count += len(batch)
+            batch = []
+    backend.index(batch)
+    return count + len(batch)
+
+
+def matching_ids(query, limit):
+    """id самых релевантных записей без выборки самих записей."""
+    query_terms = terms(query)
+    if not query_terms:
+        return []
+    return [pk for pk, _ in get_backend().scores(query_terms, None, limit)]
+
+
+def search(query, cursor=None, per_page=10):
+    query_terms = terms(query)
+    if not query_terms:
+        return KeysetPage([], False, False, key='search_score')
+    position = decode_cursor(cursor, parse_key=parse_score)
+    rows = get_backend().scores(query_terms, position, per_page + 1)
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    posts = Post.objects.feed().in_bulk([pk for pk, _ in rows])
+    results = []
+    for pk, score in rows:
+        if pk in posts:
+            posts[pk].search_score = score
+            results.append(posts[pk])
+    if position is not None and position[0] == PREVIOUS:
+        results.reverse()
+        return KeysetPage(results, True, has_more, key='search_score')
+    return KeysetPage(
+        results, has_more, position is not None, key='search_score'
+    )
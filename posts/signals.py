@@ -0,0 +1,209 @@
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import counters, feed_cache, media, search, thumbnails, timeline
+from .models import Comment, Follow, Group, Post, ProfileStats, User
+
+
+@receiver(post_save, sender=User)
+def create_profile_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ProfileStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_profile_stats(instance.author_id, 'posts_count', 1)
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change_profile_stats(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_comment_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_comment_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_profile_stats(
+            instance.author_id, 'followers_count', 1
+        )
+        counters.change_profile_stats(instance.user_id, 'following_count', 1)
+        timeline.prune_if_promoted(instance.author_id)
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.change_profile_stats(instance.author_id, 'followers_count', -1)
+    counters.change_profile_stats(instance.user_id, 'following_count', -1)
+    timeline.prune(instance.user_id, instance.author_id)
+    timeline.refill_if_demoted(instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_state(sender, instance, raw=False, **kwargs):
+    # При редактировании запись может уйти из одной группы в другую:
+    # устаревают фрагменты обеих групп. Новая картинка требует новой
+    # миниатюры и переноса ссылки со старого файла на новый.
+    instance._previous_group_id = None
+    instance._previous_image = ''
+    instance._image_changed = bool(instance.image) and not raw
+    if instance.pk and not raw:
+        previous = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', 'image').first()
+        if previous is not None:
+            instance._previous_group_id = previous[0]
+            instance._previous_image = previous[1] or ''
+            instance._image_changed = (
+                instance._previous_image != (instance.image.name or '')
+            )
+    if instance._image_changed:
+        instance.thumbnail = ''
+        instance.image_variants = ''
+
+
+@receiver(post_save, sender=Post)
+def post_image_changed(sender, instance, raw=False, **kwargs):
+    if raw or not instance._image_changed:
+        return
+    # Сначала новая ссылка, потом снятие старой: при повторной загрузке
+    # той же картинки счётчик файла не проходит через ноль.
+    if instance.image:
+        media.acquire(instance.image.name)
+        thumbnails.schedule(instance.pk)
+    if instance._previous_image:
+        media.release(instance._previous_image)
+
+
+@receiver(post_delete, sender=Post)
+def release_post_image(sender, instance, **kwargs):
+    if instance.image:
+        media.release(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    feed_cache.invalidate_on_commit(
+        feed_cache.post_scope(instance.pk),
+        *feed_cache.post_scopes(
+            instance.author_id,
+            instance.group_id,
+            getattr(instance, '_previous_group_id', None),
+        )
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_feeds(sender, instance, **kwargs):
+    # Карточка записи в ленте показывает число комментариев.
+    post = Post.objects.filter(
+        pk=instance.post_id
+    ).values_list('author_id', 'group_id').first()
+    if post is not None:
+        feed_cache.invalidate_on_commit(
+            feed_cache.post_scope(instance.post_id),
+            *feed_cache.post_scopes(*post)
+        )
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_group_feeds(sender, instance, **kwargs):
+    # Название группы есть в карточке каждой её записи во всех лентах, в
+    # профилях их авторов и на страницах самих записей. При удалении
+    # записи теряют группу через UPDATE без сигналов, поэтому они
+    # выбираются до него, в pre_delete.
+    posts = Post.objects.filter(
+        group_id=instance.pk
+    ).values_list('author_id', 'id')
+    author_ids, post_ids = set(), set()
+    for author_id, post_id in posts.iterator():
+        author_ids.add(author_id)
+        post_ids.add(post_id)
+    feed_cache.invalidate_on_commit(
+        feed_cache.POSTS,
+        feed_cache.group_scope(instance.pk),
+        *map(feed_cache.author_scope, sorted(author_ids)),
+        *map(feed_cache.post_scope, sorted(post_ids)),
+    )
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_feed(sender, instance, **kwargs):
+    feed_cache.invalidate_on_commit(
+        feed_cache.follow_scope(instance.user_id),
+        feed_cache.stats_scope(instance.user_id),
+        feed_cache.stats_scope(instance.author_id),
+    )
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_posts([instance])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.remove_posts([instance.pk])
+
+
+def _reindex(posts):
+    search.index_posts(posts.select_related('author', 'group'))
+
+
+@receiver(post_save, sender=Group)
+def index_group_posts(sender, instance, created, raw=False, **kwargs):
+    # Название группы входит в документ каждой её записи.
+    if not created and not raw:
+        _reindex(instance.posts.all())
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_posts(sender, instance, **kwargs):
+    instance._post_ids = list(instance.posts.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Group)
+def unindex_group_title(sender, instance, **kwargs):
+    _reindex(Post.objects.filter(pk__in=instance._post_ids))
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, raw=False, update_fields=None,
+                      **kwargs):
+    # Вход пользователя сохраняет только last_login: лишний запрос
+    # за старым именем не нужен.
+    instance._username_changed = False
+    if raw or not instance.pk:
+        return
+    if update_fields is not None and 'username' not in update_fields:
+        return
+    previous = User.objects.filter(
+        pk=instance.pk
+    ).values_list('username', flat=True).first()
+    instance._username_changed = previous not in (None, instance.username)
+
+
+@receiver(post_save, sender=User)
+def index_author_posts(sender, instance, raw=False, **kwargs):
+    if not raw and getattr(instance, '_username_changed', False):
+        _reindex(instance.posts.all())
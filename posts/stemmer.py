@@ -0,0 +1,140 @@
+"""Стеммер Snowball для русского языка.
+
+Реализация алгоритма https://snowballstem.org/algorithms/russian/stemmer.html
+без внешних зависимостей: его используют оба бэкенда поиска, чтобы
+«записи», «запись» и «записей» находились одним запросом.
+"""
+import re
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (
+    ('ившись', 'ывшись', 'ивши', 'ывши', 'ив', 'ыв'),
+    ('вшись', 'вши', 'в'),
+)
+ADJECTIVE = (
+    'ими', 'ыми', 'его', 'ого', 'ему', 'ому', 'ее', 'ие', 'ые', 'ое',
+    'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом', 'их', 'ых', 'ую',
+    'юю', 'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE = (
+    ('ивш', 'ывш', 'ующ'),
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+)
+REFLEXIVE = ('ся', 'сь')
+VERB = (
+    ('ейте', 'уйте', 'ила', 'ыла', 'ена', 'ите', 'или', 'ыли', 'ило',
+     'ыло', 'ено', 'ует', 'уют', 'ены', 'ить', 'ыть', 'ишь', 'ей', 'уй',
+     'ил', 'ыл', 'им', 'ым', 'ен', 'ят', 'ит', 'ыт', 'ую', 'ю'),
+    ('ете', 'йте', 'ешь', 'нно', 'ла', 'на', 'ли', 'ем', 'ло', 'но', 'ет',
+     'ют', 'ны', 'ть', 'й', 'л', 'н'),
+)
+NOUN = (
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ев', 'ов', 'ие',
+    'ье', 'еи', 'ии', 'ей', 'ой', 'ий', 'ям', 'ем', 'ам', 'ом', 'ах', 'ях',
+    'ию', 'ью', 'ия', 'ья', 'а', 'е', 'и', 'й', 'о', 'у', 'ы', 'ь', 'ю',
+    'я',
+)
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+CYRILLIC = re.compile('^[а-я]+$')
+
+
+def _regions(word):
+    """Начала областей RV и R2."""
+    rv = r1 = r2 = len(word)
+    for i, letter in enumerate(word):
+        if letter in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _strip(word, start, endings, preceded=False):
+    """Отрезает самое длинное окончание, целиком лежащее после start.
+
+    preceded=True требует, чтобы перед окончанием стояла «а» или «я»
+    (первые группы окончаний в описании алгоритма).
+    """
+    for ending in sorted(endings, key=len, reverse=True):
+        if not word.endswith(ending):
+            continue
+        position = len(word) - len(ending)
+        if preceded:
+            if position - 1 < start or word[position - 1] not in 'ая':
+                continue
+        elif position < start:
+            continue
+        return word[:position]
+    return None
+
+
+def _strip_grouped(word, start, groups):
+    # Окончания первой группы не требуют предшествующей «а»/«я».
+    candidates = [
+        result for result in (
+            _strip(word, start, groups[0]),
+            _strip(word, start, groups[1], preceded=True),
+        ) if result is not None
+    ]
+    return min(candidates, key=len) if candidates else None
+
+
+def _adjectival(word, start):
+    stripped = _strip(word, start, ADJECTIVE)
+    if stripped is None:
+        return None
+    participle = _strip_grouped(stripped, start, PARTICIPLE)
+    return stripped if participle is None else participle
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC.match(word):
+        return word
+    rv, r2 = _regions(word)
+
+    # Шаг 1.
+    stripped = _strip_grouped(word, rv, PERFECTIVE_GERUND)
+    if stripped is not None:
+        word = stripped
+    else:
+        word = _strip(word, rv, REFLEXIVE) or word
+        for step in (
+            lambda w: _adjectival(w, rv),
+            lambda w: _strip_grouped(w, rv, VERB),
+            lambda w: _strip(w, rv, NOUN),
+        ):
+            stripped = step(word)
+            if stripped is not None:
+                word = stripped
+                break
+
+    # Шаг 2.
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    # Шаг 3.
+    word = _strip(word, r2, DERIVATIONAL) or word
+
+    # Шаг 4.
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    stripped = _strip(word, rv, SUPERLATIVE)
+    if stripped is not None:
+        word = stripped
+        if word.endswith('нн') and len(word) - 2 >= rv:
+            word = word[:-1]
+        return word
+    if word.endswith('ь') and len(word) - 1 >= rv:
+        word = word[:-1]
+    return word
@@ -0,0 +1,63 @@
+"""Хранилище картинок записей с адресацией по содержимому.
+
+Файл сохраняется под именем из SHA-256 содержимого:
+posts/ab/cd/abcd...ef.jpg. Одинаковые картинки, загруженные разными
+пользователями, занимают место один раз, а sorl и posts.images строят
+для них одни и те же миниатюры, потому что ключ у них - имя файла.
+Сколько записей ссылается на файл, считает posts.media.
+"""
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_CHUNK = 2 ** 20
+
+
+def content_hash(content):
+    """SHA-256 содержимого; posts.uploads считает его ещё при загрузке."""
+    sha256 = getattr(content, 'sha256', None)
+    if sha256:
+        return sha256
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks(HASH_CHUNK):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def hashed_name(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        sha256 = content_hash(content)
+        return os.path.join(
+            directory, sha256[:2], sha256[2:4], sha256 + extension
+        )
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым: совпадение имён означает совпадение
+        # файлов, подбирать свободное имя не нужно.
+        return name
+
+    def _save(self, name, content):
+        # posts.media импортирует модели, а они - это хранилище.
+        from .media import reserve
+
+        name = self.hashed_name(name, content)
+        reserve(name)
+        if self.exists(name):
+            return name
+        # Сначала файл пишется под случайным именем и затем атомарно
+        # переименовывается: параллельная загрузка той же картинки не
+        # увидит недописанный файл.
+        temporary = os.path.join(
+            os.path.dirname(name), f'.{uuid.uuid4().hex}.tmp'
+        )
+        temporary = super()._save(temporary, content)
+        os.replace(self.path(temporary), self.path(name))
+        return name
@@ -0,0 +1,174 @@
+"""Синтетические данные для нагрузочных замеров.
+
+Популярность авторов распределена по степенному закону: автор ранга r
+получает подписчиков и пишет записи с весом 1 / r ** exponent, так что
+несколько авторов собирают большую часть подписок, как в настоящих
+соцсетях, и в данных есть авторы по обе стороны
+settings.FEED_FANOUT_THRESHOLD. Записи, комментарии и подписки
+загружаются через posts.bulk, который после вставки пересчитывает
+счётчики, индекс поиска и ленты.
+"""
+import io
+import random
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from . import bulk
+from .models import Group, Post, User
+
+USERNAME = 'user{:06d}'
+GROUP_SLUG = 'group-{:04d}'
+WORDS = (
+    'лента запись друг город утро вечер музыка книга фото дорога море '
+    'работа проект идея кофе погода выходные кино спорт код поезд'
+).split()
+
+
+class Generator:
+    def __init__(self, users=1000, groups=20, posts=10000,
+                 comments_per_post=3.0, follows_per_user=20,
+                 image_share=0.2, exponent=1.1, days=365, seed=0,
+                 batch_size=1000):
+        self.rng = random.Random(seed)
+        self.users = users
+        self.groups = groups
+        self.posts = posts
+        self.comments_per_post = comments_per_post
+        self.follows_per_user = follows_per_user
+        self.image_share = image_share
+        self.days = days
+        self.batch_size = batch_size
+        self.weights = [
+            1 / rank ** exponent for rank in range(1, users + 1)
+        ]
+        self.usernames = [USERNAME.format(i) for i in range(users)]
+
+    def text(self, words):
+        return ' '.join(self.rng.choices(WORDS, k=words)).capitalize()
+
+    def popular_users(self, count):
+        return self.rng.choices(self.usernames, self.weights, k=count)
+
+    def images(self, count=8):
+        """Небольшой набор картинок, которые делят записи с фото."""
+        storage = Post._meta.get_field('image').storage
+        names = []
+        for seed in range(count):
+            image = Image.new('RGB', (1200, 800), (seed * 30 % 256,) * 3)
+            draw = ImageDraw.Draw(image)
+            for _ in range(40):
+                x, y = self.rng.randrange(1200), self.rng.randrange(800)
+                color = tuple(self.rng.randrange(256) for _ in range(3))
+                draw.ellipse((x, y, x + 200, y + 200), color)
+            content = io.BytesIO()
+            image.save(content, 'JPEG', quality=85)
+            names.append(storage.save(
+                f'posts/synthetic-{seed}.jpg', ContentFile(content.getvalue())
+            ))
+        return names
+
+    def create_users(self):
+        existing = set(User.objects.values_list('username', flat=True))
+        users = []
+        for username in self.usernames:
+            if username not in existing:
+                user = User(username=username)
+                user.set_unusable_password()
+                users.append(user)
+        if users:
+            User.objects.bulk_create(
+                users,
+                batch_size=bulk.insert_batch_size(
+                    User, users, self.batch_size
+                ),
+            )
+
+    def create_groups(self):
+        existing = set(Group.objects.values_list('slug', flat=True))
+        groups = [
+            Group(
+                title=f'Группа {i}',
+                slug=GROUP_SLUG.format(i),
+                description=f'Описание группы {i}',
+            )
+            for i in range(self.groups)
+            if GROUP_SLUG.format(i) not in existing
+        ]
+        if groups:
+            Group.objects.bulk_create(
+                groups,
+                batch_size=bulk.insert_batch_size(
+                    Group, groups, self.batch_size
+                ),
+            )
+
+    def post_records(self, first_id, images):
+        now = timezone.now()
+        start = now - timedelta(days=self.days)
+        step = (now - start) / max(self.posts, 1)
+        authors = self.popular_users(self.posts)
+        for number, author in enumerate(authors):
+            group = None
+            if self.groups and self.rng.random() < 0.6:
+                group = GROUP_SLUG.format(self.rng.randrange(self.groups))
+            image = ''
+            if images and self.rng.random() < self.image_share:
+                image = self.rng.choice(images)
+            yield {
+                'id': first_id + number,
+                'text': self.text(self.rng.randint(5, 80)),
+                'pub_date': (start + step * number).isoformat(),
+                'author': author,
+                'group': group,
+                'image': image,
+            }
+
+    def comment_records(self, first_id):
+        for post_id in range(first_id, first_id + self.posts):
+            count = 0
+            if self.comments_per_post:
+                count = int(self.rng.expovariate(1 / self.comments_per_post))
+            for author in self.popular_users(count):
+                yield {
+                    'post': post_id,
+                    'author': author,
+                    'text': self.text(self.rng.randint(3, 30)),
+                }
+
+    def follow_records(self):
+        for username in self.usernames:
+            # Число подписок тоже с тяжёлым хвостом.
+            count = min(
+                int(self.rng.paretovariate(1.5) * self.follows_per_user / 3),
+                self.users - 1,
+            )
+            for author in set(self.popular_users(count)):
+                if author != username:
+                    yield {'user': username, 'author': author}
+
+    def load(self, kind, records, progress=None):
+        importer = bulk.Importer(kind, batch_size=self.batch_size)
+        importer.run(records, progress)
+        return importer.accepted
+
+    def run(self, progress=None):
+        """Создаёт данные, возвращает {вид: число строк}."""
+        self.create_users()
+        self.create_groups()
+        images = self.images() if self.image_share else []
+        first_id = (Post.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        # Подписки раньше записей: ленты заполняются один раз в конце
+        # загрузки записей, а не повторно для каждого автора.
+        return {
+            'follows': self.load('follows', self.follow_records(), progress),
+            'posts': self.load(
+                'posts', self.post_records(first_id, images), progress
+            ),
+            'comments': self.load(
+                'comments', self.comment_records(first_id), progress
+            ),
+        }
@@ -0,0 +1,134 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import api
+from posts.models import Comment, Group, Post
+from posts.tests.utils import run_on_commit
+
+POSTS_URL = reverse('api_posts')
+
+
+class APITests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = get_user_model().objects.create(username='Author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Запись {i}', author=cls.author, group=cls.group)
+            for i in range(25)
+        )
+        Post.objects.create(text='Без группы', author=cls.author)
+        cls.post = Post.objects.filter(group=cls.group).first()
+        for i in range(5):
+            Comment.objects.create(
+                post=cls.post, author=cls.author, text=f'Ответ {i}'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def walk(self, url, **params):
+        ids = []
+        cursor = None
+        while True:
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get(url, params).json()
+            ids += [item['id'] for item in data['results']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                return ids
+
+    def test_feeds_match_html_order(self):
+        """Ленты API отдают те же записи в том же порядке без повторов."""
+        feeds = {
+            POSTS_URL: Post.objects.all(),
+            reverse('api_group_posts', args=('group',)):
+                Post.objects.filter(group=self.group),
+            reverse('api_profile_posts', args=('Author',)):
+                Post.objects.filter(author=self.author),
+        }
+        for url, expected in feeds.items():
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.walk(url, limit=7),
+                    list(expected.values_list('id', flat=True)),
+                )
+
+    def test_page_is_one_query(self):
+        """Страница ленты - один запрос, без создания моделей."""
+        with self.assertNumQueries(1):
+            data = self.client.get(POSTS_URL).json()
+        post = Post.objects.get(pk=data['results'][0]['id'])
+        self.assertEqual(data['results'][0], {
+            'id': post.id,
+            'text': post.text,
+            'pub_date': DjangoJSONEncoder().default(post.pub_date),
+            'author': 'Author',
+            'group': None,
+            'image': None,
+            'thumbnail': None,
+            'comment_count': 0,
+        })
+
+    def test_sparse_fields(self):
+        data = self.client.get(POSTS_URL, {'fields': 'text,author'}).json()
+        self.assertEqual(set(data['results'][0]), {'text', 'author'})
+        self.assertIsNotNone(data['next_cursor'])
+
+    def test_post_and_comments(self):
+        post_url = reverse('api_post', args=(self.post.id,))
+        data = self.client.get(post_url, {'fields': 'id,comment_count'})
+        self.assertEqual(data.json(),
+                         {'id': self.post.id, 'comment_count': 5})
+        comments_url = reverse('api_post_comments', args=(self.post.id,))
+        self.assertEqual(
+            self.walk(comments_url, limit=2),
+            list(self.post.comments.values_list('id', flat=True)),
+        )
+
+    def test_commit_before_tagging(self):
+        """Запись, закоммиченная до tag_response, не остаётся в кэше
+        в старом виде под новой версией."""
+        post_url = reverse('api_post', args=(self.post.id,))
+        tag_response = api.tag_response
+
+        def commit_then_tag(request, *scopes):
+            with run_on_commit():
+                post = Post.objects.get(pk=self.post.pk)
+                post.text = 'Исправленная'
+                post.save()
+            tag_response(request, *scopes)
+
+        with mock.patch.object(api, 'tag_response', commit_then_tag):
+            self.client.get(post_url, {'fields': 'text'})
+        self.assertEqual(
+            self.client.get(post_url, {'fields': 'text'}).json(),
+            {'text': 'Исправленная'},
+        )
+
+    def test_errors(self):
+        """Ошибки приходят в JSON с подходящим статусом."""
+        responses = {
+            POSTS_URL + '?fields=text,password': 400,
+            POSTS_URL + '?cursor=broken': 400,
+            POSTS_URL + '?limit=many': 400,
+            reverse('api_group_posts', args=('missing',)): 404,
+            reverse('api_profile_posts', args=('missing',)): 404,
+            reverse('api_post', args=(0,)): 404,
+            reverse('api_post_comments', args=(0,)): 404,
+        }
+        for url, status in responses.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status)
+                self.assertIn('detail', response.json())
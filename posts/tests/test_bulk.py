@@ -0,0 +1,192 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from posts import feed_cache, search, thumbnails
+from posts.models import (Comment, Follow, Group, Post, ProfileStats,
+                          TimelineEntry)
+from posts.tests.utils import run_on_commit
+
+TEMP_DIR = tempfile.mkdtemp()
+KINDS = ('posts', 'comments', 'follows')
+
+
+@override_settings(FEED_FANOUT_THRESHOLD=10)
+class BulkCommandsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        User = get_user_model()
+        cls.author = User.objects.create(username='Author')
+        cls.reader = User.objects.create(username='Reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def path(self, name):
+        return os.path.join(TEMP_DIR, name)
+
+    def create_data(self):
+        for i in range(5):
+            post = Post.objects.create(
+                text=f'Заметка номер {i}', author=self.author,
+                group=self.group if i % 2 else None
+            )
+        Comment.objects.create(post=post, author=self.reader, text='Ответ')
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def export(self, file_format):
+        for kind in KINDS:
+            call_command(
+                'export_posts', self.path(f'{kind}.{file_format}'),
+                kind=kind, stdout=StringIO()
+            )
+
+    def import_all(self, file_format, **options):
+        for kind in KINDS:
+            call_command(
+                'import_posts', self.path(f'{kind}.{file_format}'),
+                kind=kind, batch_size=2, transaction_size=3,
+                stdout=StringIO(), stderr=StringIO(), **options
+            )
+
+    def snapshot(self):
+        return (
+            list(Post.objects.values_list(
+                'id', 'text', 'pub_date', 'author_id', 'group_id',
+                'comment_count'
+            )),
+            list(Comment.objects.values_list(
+                'id', 'post_id', 'author_id', 'text', 'created'
+            )),
+            list(Follow.objects.values_list('user_id', 'author_id')),
+        )
+
+    def test_round_trip(self):
+        """Выгрузка и повторная загрузка восстанавливают данные и даты."""
+        self.create_data()
+        for file_format in ('ndjson', 'csv'):
+            with self.subTest(format=file_format):
+                expected = self.snapshot()
+                self.export(file_format)
+                Post.objects.all().delete()
+                Follow.objects.all().delete()
+                self.import_all(file_format)
+                self.assertEqual(self.snapshot(), expected)
+
+    def test_import_updates_derived_data(self):
+        """После загрузки верны счётчики, поиск и лента подписок."""
+        self.create_data()
+        self.export('ndjson')
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        self.import_all('ndjson')
+        stats = ProfileStats.objects.get(user=self.author)
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count), (5, 1)
+        )
+        self.assertEqual(
+            Post.objects.get(comments__isnull=False).comment_count, 1
+        )
+        self.assertEqual(len(search.matching_ids('заметка', 10)), 5)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 5
+        )
+
+    def test_reimport_skips_duplicates(self):
+        self.create_data()
+        self.export('ndjson')
+        expected = self.snapshot()
+        self.import_all('ndjson')
+        self.assertEqual(self.snapshot(), expected)
+
+    def test_invalid_rows_skipped(self):
+        """Плохие строки пропускаются с причиной, остальные загружаются."""
+        rows = [
+            {'text': 'Хорошая', 'author': 'Author', 'group': 'group'},
+            {'text': 'Чужой автор', 'author': 'Nobody'},
+            {'text': 'Нет группы', 'author': 'Author', 'group': 'missing'},
+            {'text': 'Плохая дата', 'author': 'Author', 'pub_date': 'вчера'},
+        ]
+        with open(self.path('bad.ndjson'), 'w') as file:
+            file.write('\n'.join(json.dumps(row) for row in rows))
+            file.write('\n{broken\n')
+        stderr = StringIO()
+        call_command('import_posts', self.path('bad.ndjson'),
+                     stdout=StringIO(), stderr=stderr)
+        self.assertEqual(
+            list(Post.objects.values_list('text', flat=True)), ['Хорошая']
+        )
+        self.assertEqual(stderr.getvalue().count('Пропущено'), 4)
+
+    def test_create_users(self):
+        with open(self.path('new.csv'), 'w') as file:
+            file.write('user,author\nNewcomer,Author\n')
+        call_command('import_posts', self.path('new.csv'), kind='follows',
+                     create_users=True, stdout=StringIO())
+        newcomer = get_user_model().objects.get(username='Newcomer')
+        self.assertFalse(newcomer.has_usable_password())
+        self.assertEqual(newcomer.stats.following_count, 1)
+
+    def test_only_imported_rows_recounted(self):
+        """Счётчики пользователей вне файла не пересчитываются."""
+        other = get_user_model().objects.create(username='Other')
+        ProfileStats.objects.filter(user=other).update(posts_count=7)
+        with open(self.path('one.ndjson'), 'w') as file:
+            file.write(json.dumps({'text': 'Текст', 'author': 'Author'}))
+        call_command('import_posts', self.path('one.ndjson'),
+                     stdout=StringIO())
+        self.assertEqual(
+            ProfileStats.objects.get(user=self.author).posts_count, 1
+        )
+        self.assertEqual(ProfileStats.objects.get(user=other).posts_count, 7)
+
+    def test_comments_invalidate_post_feeds(self):
+        """Импорт одних комментариев сбрасывает ленты автора и группы."""
+        post = Post.objects.create(
+            text='Запись', author=self.author, group=self.group
+        )
+        scopes = (feed_cache.author_scope(self.author.id),
+                  feed_cache.group_scope(self.group.id))
+        versions = [feed_cache.get_version(scope) for scope in scopes]
+        with open(self.path('comments.csv'), 'w') as file:
+            file.write(f'post,author,text\n{post.id},Reader,Ответ\n')
+        with run_on_commit():
+            call_command('import_posts', self.path('comments.csv'),
+                         kind='comments', stdout=StringIO())
+        self.assertEqual(Post.objects.get(pk=post.pk).comment_count, 1)
+        for scope, version in zip(scopes, versions):
+            with self.subTest(scope=scope):
+                self.assertNotEqual(feed_cache.get_version(scope), version)
+
+    def test_thumbnails_scheduled(self):
+        """Для загруженных записей с картинками строятся миниатюры."""
+        rows = [
+            {'text': 'С картинкой', 'author': 'Author',
+             'image': 'posts/photo.jpg'},
+            {'text': 'Без картинки', 'author': 'Author'},
+        ]
+        with open(self.path('images.ndjson'), 'w') as file:
+            file.write('\n'.join(json.dumps(row) for row in rows))
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            call_command('import_posts', self.path('images.ndjson'),
+                         stdout=StringIO())
+        schedule.assert_called_once_with(
+            Post.objects.get(text='С картинкой').pk
+        )
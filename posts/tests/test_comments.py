@@ -0,0 +1,95 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Post
+from posts.views import COMMENTS_PER_PAGE
+
+COMMENTS = COMMENTS_PER_PAGE * 2 + 5
+
+
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        User = get_user_model()
+        cls.author = User.objects.create(username='Author')
+        User.objects.bulk_create(
+            User(username=f'reader{i}') for i in range(COMMENTS)
+        )
+        cls.post = Post.objects.create(text='Запись', author=cls.author)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=reader, text=f'Комментарий {i}')
+            for i, reader in enumerate(
+                User.objects.filter(username__startswith='reader')
+            )
+        )
+        cls.post_url = reverse('post', args=('Author', cls.post.id))
+        cls.comments_url = reverse('post_comments', args=('Author',
+                                                          cls.post.id))
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def load_all(self):
+        comments = []
+        response = self.client.get(self.post_url)
+        page = response.context['comment_page']
+        comments += page
+        cursor = page.next_cursor
+        while cursor:
+            response = self.client.get(
+                self.comments_url, {'cursor': cursor, 'format': 'json'}
+            )
+            data = response.json()
+            comments += data['comments']
+            cursor = data['next_cursor']
+        return comments
+
+    def test_post_page_query_count(self):
+        """Страница записи со множеством комментариев - четыре запроса.
+
+        Автор записи для ETag, запись с автором, порция комментариев вместе
+        с их авторами и проверка следующей порции: отдельного запроса на
+        каждый комментарий нет.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.post_url)
+        self.assertEqual(len(response.context['comments']), COMMENTS_PER_PAGE)
+        self.assertLessEqual(len(queries), 4,
+                             '\n'.join(q['sql'] for q in queries))
+
+    def test_all_comments_once_in_order(self):
+        """Порции вместе дают все комментарии по порядку без повторов."""
+        comments = self.load_all()
+        ids = [
+            item.id if isinstance(item, Comment) else item['id']
+            for item in comments
+        ]
+        self.assertEqual(
+            ids, list(self.post.comments.values_list('id', flat=True))
+        )
+
+    def test_fragment(self):
+        """Фрагмент содержит комментарии и кнопку следующей порции."""
+        page = self.client.get(self.post_url).context['comment_page']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                self.comments_url, {'cursor': page.next_cursor}
+            )
+        self.assertTemplateUsed(response, 'includes/comment_list.html')
+        self.assertNotContains(response, '<html')
+        self.assertContains(response, 'js-more-comments')
+        self.assertEqual(len(response.context['comments']),
+                         COMMENTS_PER_PAGE)
+        self.assertLessEqual(len(queries), 4)
+
+    def test_missing_post(self):
+        response = self.client.get(
+            reverse('post_comments', args=('Author', self.post.id + 1))
+        )
+        self.assertEqual(response.status_code, 404)
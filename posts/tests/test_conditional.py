@@ -0,0 +1,125 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post
+from posts.tests.utils import run_on_commit
+
+INDEX_URL = reverse('index')
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = get_user_model().objects.create(username='Author')
+        cls.reader = get_user_model().objects.create(username='Reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Запись', author=cls.author, group=cls.group
+        )
+        cls.urls = (
+            INDEX_URL,
+            reverse('group', args=(cls.group.slug,)),
+            reverse('profile', args=(cls.author.username,)),
+            reverse('post', args=(cls.author.username, cls.post.id)),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def revalidate(self, url, response, client=None):
+        return (client or self.client).get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+
+    def test_not_modified_without_rendering(self):
+        """Повторный запрос с ETag получает 304 без шаблонов."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response.has_header('ETag'))
+                self.assertFalse(response.has_header('Last-Modified'))
+                response = self.revalidate(url, response)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.templates, [])
+
+    def test_deletion_invalidates(self):
+        """Удаление записи меняет ETag, хотя новых записей не было."""
+        post = Post.objects.create(text='Удалённая', author=self.author)
+        response = self.client.get(INDEX_URL)
+        with run_on_commit():
+            post.delete()
+        self.assertEqual(self.revalidate(INDEX_URL, response).status_code,
+                         200)
+
+    def test_changes_invalidate(self):
+        """Новая запись, комментарий и правка меняют валидаторы."""
+        first = [self.client.get(url) for url in self.urls]
+        with run_on_commit():
+            Post.objects.create(
+                text='Новая', author=self.author, group=self.group
+            )
+        for url, response in zip(self.urls[:3], first):
+            with self.subTest(url=url):
+                self.assertEqual(self.revalidate(url, response).status_code,
+                                 200)
+        post_url = self.urls[3]
+        response = self.client.get(post_url)
+        with run_on_commit():
+            Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий'
+            )
+        changed = self.revalidate(post_url, response)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+        with run_on_commit():
+            self.post.text = 'Исправленная запись'
+            self.post.save()
+        self.assertEqual(self.revalidate(post_url, changed).status_code, 200)
+
+    def test_group_rename_invalidates(self):
+        """Переименование группы меняет ETag профиля и записи."""
+        urls = self.urls[2:]
+        first = [self.client.get(url) for url in urls]
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        with run_on_commit():
+            group.save()
+        for url, response in zip(urls, first):
+            with self.subTest(url=url):
+                changed = self.revalidate(url, response)
+                self.assertEqual(changed.status_code, 200)
+                self.assertContains(changed, 'Новое название')
+
+    def test_etag_per_user_and_cursor(self):
+        """ETag зависит от пользователя и курсора страницы."""
+        response = self.client.get(INDEX_URL)
+        other = Client()
+        other.force_login(self.author)
+        self.assertEqual(
+            self.revalidate(INDEX_URL, response, other).status_code, 200
+        )
+        self.assertEqual(
+            self.client.get(INDEX_URL + '?cursor=x',
+                            HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+            200
+        )
+
+    def test_cached_page_revalidated(self):
+        """Страница из кэша для анонимов тоже отвечает 304."""
+        guest = Client()
+        response = guest.get(INDEX_URL)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertEqual(
+            self.revalidate(INDEX_URL, response, guest).status_code, 304
+        )
+
+    def test_missing_page(self):
+        response = self.client.get(reverse('group', args=('missing',)))
+        self.assertEqual(response.status_code, 404)
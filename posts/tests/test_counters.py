@@ -0,0 +1,113 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.forms import PostForm
+from posts.models import Comment, Follow, Post, ProfileStats
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = get_user_model().objects.create(username='Author')
+        cls.reader = get_user_model().objects.create(username='Reader')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def stats(self, user):
+        return ProfileStats.objects.get(user=user)
+
+    def test_post_and_comment_counters(self):
+        """Создание и удаление записей и комментариев меняет счётчики."""
+        self.author_client.post(reverse('new_post'), {'text': 'Текст'})
+        post = Post.objects.get()
+        self.reader_client.post(
+            reverse('add_comment', args=(self.author.username, post.id)),
+            {'text': 'Комментарий'},
+        )
+        post.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(post.comment_count, 1)
+        Comment.objects.all().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_edit_keeps_concurrent_comment_count(self):
+        """Правка записи не затирает комментарий, пришедший во время неё."""
+        post = Post.objects.create(text='Текст', author=self.author)
+        is_valid = PostForm.is_valid
+
+        def racing(form):
+            # Запись уже прочитана представлением, счётчик ещё 0.
+            Comment.objects.create(post=post, author=self.reader, text='К')
+            return is_valid(form)
+
+        with mock.patch.object(PostForm, 'is_valid', racing):
+            self.author_client.post(
+                reverse('post_edit', args=(self.author.username, post.id)),
+                {'text': 'Новый текст'},
+            )
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Новый текст')
+        self.assertEqual(post.comment_count, 1)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счётчики обоих пользователей."""
+        follow_url = reverse('profile_follow', args=(self.author.username,))
+        self.reader_client.get(follow_url)
+        self.reader_client.get(follow_url)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.reader_client.get(
+            reverse('profile_unfollow', args=(self.author.username,))
+        )
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_follow_is_unique_in_database(self):
+        """База не даёт создать повторную подписку."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+
+    def test_cascade_delete_updates_counters(self):
+        """Удаление пользователя каскадно уменьшает чужие счётчики."""
+        user = get_user_model().objects.create(username='Temporary')
+        Follow.objects.create(user=user, author=self.author)
+        post = Post.objects.create(text='Текст', author=self.author)
+        Comment.objects.create(post=post, author=user, text='Комментарий')
+        user.delete()
+        post.refresh_from_db()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(post.comment_count, 0)
+
+    def test_recount_stats_repairs_drift(self):
+        """Команда recount_stats исправляет рассинхронизацию."""
+        post = Post.objects.create(text='Текст', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        ProfileStats.objects.update(
+            posts_count=7, followers_count=7, following_count=7
+        )
+        Post.objects.update(comment_count=7)
+        ProfileStats.objects.filter(user=self.reader).delete()
+        call_command('recount_stats', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+        author_stats = self.stats(self.author)
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
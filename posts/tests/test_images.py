@@ -0,0 +1,145 @@
+import io
+import json
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image, PngImagePlugin
+
+from posts import images, thumbnails
+from posts.models import Post
+from posts.tests.utils import run_on_commit
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def image_upload(size=(1200, 800), image_format='JPEG', exif=False,
+                 name='photo.jpg'):
+    image = Image.new('RGB', size, color=(200, 40, 40))
+    options = {}
+    if exif:
+        data = Image.Exif()
+        data[0x010F] = 'Camera'
+        options['exif'] = data.tobytes()
+    content = io.BytesIO()
+    image.save(content, image_format, **options)
+    return SimpleUploadedFile(name, content.getvalue(), 'image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ImageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = get_user_model().objects.create(username='Author')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_clean_upload_kept(self):
+        """Картинка без метаданных в пределах лимитов не перекодируется."""
+        upload = image_upload()
+        original = upload.read()
+        self.assertEqual(images.prepare_upload(upload).read(), original)
+
+    def test_metadata_stripped(self):
+        """EXIF удаляется при загрузке."""
+        upload = images.prepare_upload(image_upload(exif=True))
+        self.assertNotIn('exif', Image.open(upload).info)
+
+    def test_png_text_stripped(self):
+        """Текстовые блоки PNG удаляются так же, как EXIF."""
+        text = PngImagePlugin.PngInfo()
+        text.add_text('Author', 'Иван Петров')
+        text.add_text('Comment', 'Дача, 2020')
+        content = io.BytesIO()
+        Image.new('RGB', (100, 100)).save(content, 'PNG', pnginfo=text)
+        upload = images.prepare_upload(SimpleUploadedFile(
+            'photo.png', content.getvalue(), 'image/png'
+        ))
+        info = Image.open(upload).info
+        self.assertNotIn('Author', info)
+        self.assertNotIn('Comment', info)
+
+    @override_settings(POST_IMAGE_MAX_SIDE=600)
+    def test_downscaled(self):
+        """Длинная сторона ограничивается POST_IMAGE_MAX_SIDE."""
+        upload = images.prepare_upload(image_upload())
+        self.assertEqual(Image.open(upload).size, (600, 400))
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1000)
+    def test_too_many_pixels(self):
+        with self.assertRaises(ValidationError):
+            images.prepare_upload(image_upload())
+
+    @override_settings(POST_IMAGE_MAX_BYTES=100)
+    def test_too_large_file_rejected_by_form(self):
+        """Форма не принимает слишком большой файл."""
+        client = Client()
+        client.force_login(self.author)
+        response = client.post(
+            reverse('new_post'), {'text': 'Текст', 'image': image_upload()}
+        )
+        self.assertFormError(
+            response, 'form', 'image', 'Файл больше 0 МБ.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    def test_old_variants_deleted_after_update(self):
+        """Прежние варианты живут, пока страницы не ссылаются на новые."""
+        post = Post.objects.create(
+            text='Текст', author=self.author, image=image_upload()
+        )
+        old = images.variant_name(
+            images.variant_key(post.image.name), 960, 'old', 'webp'
+        )
+        default_storage.save(old, io.BytesIO(b'old'))
+        build_variants = images.build_variants
+
+        def build_and_check(image_field):
+            sources = build_variants(image_field)
+            self.assertTrue(default_storage.exists(old))
+            return sources
+
+        with mock.patch.object(images, 'build_variants', build_and_check):
+            with run_on_commit():
+                thumbnails.generate(post.pk)
+                self.assertTrue(default_storage.exists(old))
+        self.assertFalse(default_storage.exists(old))
+        post.refresh_from_db()
+        for name in images.srcset_names(json.loads(post.image_variants)):
+            with self.subTest(name=name):
+                self.assertTrue(default_storage.exists(name))
+
+    def test_variants_in_srcset(self):
+        """Варианты строятся нужных ширин и попадают в srcset ленты."""
+        post = Post.objects.create(
+            text='Текст', author=self.author, image=image_upload()
+        )
+        thumbnails.generate(post.pk)
+        post.refresh_from_db()
+        variants = json.loads(post.image_variants)
+        self.assertIn('image/webp', variants)
+        srcset = variants['image/webp']
+        self.assertIn(' 480w', srcset)
+        self.assertIn(' 960w', srcset)
+        self.assertNotIn(' 1440w', srcset)
+        response = Client().get(reverse('index'))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, srcset)
+        url = srcset.split()[0][len(settings.MEDIA_URL):]
+        with open(f'{MEDIA_ROOT}/{url}', 'rb') as file:
+            self.assertEqual(Image.open(file).size, (480, 170))
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from posts import media, thumbnails
+from posts.models import Post, StoredImage
+from posts.views import serve_media
+
+MEDIA_ROOT = tempfile.mkdtemp()
+SMALL_GIF = (b'\x47\x49\x46\x38\x39\x61\x02\x00'
+             b'\x01\x00\x80\x00\x00\x00\x00\x00'
+             b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+             b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+             b'\x0A\x00\x3B')
+OTHER_GIF = SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\x00\xFF\x00')
+
+
+def uploaded(content=SMALL_GIF, name='small.gif'):
+    return SimpleUploadedFile(name, content, 'image/gif')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ContentAddressedMediaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = get_user_model().objects.create(username='Author')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def create(self, content=SMALL_GIF, name='small.gif'):
+        return Post.objects.create(
+            text='Текст', author=self.author, image=uploaded(content, name)
+        )
+
+    def refcount(self, name):
+        return StoredImage.objects.get(name=name).refcount
+
+    def test_duplicates_share_file(self):
+        """Одинаковые картинки хранятся одним файлом под именем из хеша."""
+        first = self.create(name='one.gif')
+        second = self.create(name='two.GIF')
+        sha256 = hashlib.sha256(SMALL_GIF).hexdigest()
+        self.assertEqual(
+            first.image.name, f'posts/{sha256[:2]}/{sha256[2:4]}/{sha256}.gif'
+        )
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(self.refcount(first.image.name), 2)
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(os.listdir(directory), [f'{sha256}.gif'])
+
+    def test_garbage_collected(self):
+        """Файл удаляется, когда на него не осталось ссылок."""
+        first = self.create()
+        second = self.create()
+        path = first.image.path
+        first.delete()
+        self.assertEqual(media.collect(grace=0), [])
+        second.image = uploaded(OTHER_GIF)
+        second.save()
+        stored = StoredImage.objects.get(name=first.image.name)
+        self.assertEqual(stored.refcount, 0)
+        self.assertIsNotNone(stored.orphaned_at)
+        self.assertEqual(media.collect(), [])
+        self.assertTrue(os.path.exists(path))
+        out = StringIO()
+        call_command('collect_media', grace=0, stdout=out)
+        self.assertIn(first.image.name, out.getvalue())
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(StoredImage.objects.filter(
+            name=first.image.name
+        ).exists())
+        self.assertTrue(os.path.exists(second.image.path))
+
+    def test_reupload_keeps_file(self):
+        """Повторная загрузка той же картинки не делает файл сиротой."""
+        post = self.create()
+        post.image = uploaded()
+        post.save()
+        self.assertEqual(self.refcount(post.image.name), 1)
+        self.assertIsNone(
+            StoredImage.objects.get(name=post.image.name).orphaned_at
+        )
+
+    def test_reupload_during_collect(self):
+        """Файл, который загружают повторно, не удаляется до acquire()."""
+        post = self.create()
+        name = post.image.name
+        post.delete()
+        StoredImage.objects.filter(name=name).update(
+            orphaned_at=timezone.now() - timedelta(hours=2)
+        )
+        # Файл уже сохранён формой, запись ещё нет.
+        self.assertEqual(media.storage().save('posts/small.gif', uploaded()),
+                         name)
+        self.assertEqual(media.collect(grace=3600), [])
+        self.assertTrue(media.storage().exists(name))
+
+    def test_thumbnails_shared(self):
+        """Миниатюра дубликата берётся у записи с тем же файлом."""
+        first = self.create()
+        second = self.create()
+        url = thumbnails.generate(first.pk)
+        with mock.patch.object(thumbnails, 'get_thumbnail') as get_thumbnail:
+            self.assertEqual(thumbnails.generate(second.pk), url)
+        get_thumbnail.assert_not_called()
+        second.refresh_from_db()
+        first.refresh_from_db()
+        self.assertEqual(second.image_variants, first.image_variants)
+
+    def test_immutable_headers(self):
+        """Файлы с неизменным содержимым отдаются с долгим кэшем."""
+        post = self.create()
+        request = RequestFactory().get('/')
+        response = serve_media(request, post.image.name, MEDIA_ROOT)
+        self.assertEqual(
+            response['Cache-Control'], media.IMMUTABLE_CACHE_CONTROL
+        )
+        os.makedirs(os.path.join(MEDIA_ROOT, 'other'), exist_ok=True)
+        with open(os.path.join(MEDIA_ROOT, 'other', 'file.txt'), 'w') as f:
+            f.write('text')
+        response = serve_media(request, 'other/file.txt', MEDIA_ROOT)
+        self.assertNotIn('Cache-Control', response)
+
+    def test_nginx_config(self):
+        """Конфигурация nginx даёт долгий кэш тем же файлам, что и
+        serve_media."""
+        post = self.create()
+        out = StringIO()
+        call_command('media_nginx_config', stdout=out)
+        config = out.getvalue()
+        self.assertIn(
+            f'add_header Cache-Control "{media.IMMUTABLE_CACHE_CONTROL}";',
+            config
+        )
+        self.assertIn(f'alias {MEDIA_ROOT}/$media_path;', config)
+        # Именованная группа nginx (PCRE) в синтаксисе Python.
+        location = re.compile(re.search(
+            r'location ~ "(.+)" \{', config
+        ).group(1).replace('(?<', '(?P<'))
+        match = location.match(f'/media/{post.image.name}')
+        self.assertEqual(match.group('media_path'), post.image.name)
+        self.assertIsNone(location.match('/media/other/file.txt'))
@@ -0,0 +1,128 @@
+import os
+import re
+import tempfile
+from contextlib import nullcontext
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import metrics
+from posts.models import Post
+
+INDEX_URL = reverse('index')
+METRICS_URL = reverse('metrics')
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.settings = override_settings(
+            METRICS_DB=os.path.join(cls.directory.name, 'metrics.sqlite3'),
+            METRICS_FLUSH_INTERVAL=3600,
+        )
+        cls.settings.enable()
+        cls.author = get_user_model().objects.create(username='Author')
+        cls.staff = get_user_model().objects.create(
+            username='Staff', is_staff=True
+        )
+        Post.objects.create(text='Запись', author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        # Значения от других тестов и прошлых тестов этого класса.
+        metrics.render()
+        metrics._sink().execute('DELETE FROM metrics')
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def scrape(self):
+        return self.staff_client.get(METRICS_URL).content.decode()
+
+    def value(self, text, line):
+        match = re.search(rf'^{re.escape(line)} (\S+)$', text, re.M)
+        self.assertIsNotNone(match, f'нет {line} в\n{text}')
+        return float(match.group(1))
+
+    def test_staff_only(self):
+        """/metrics/ закрыт для гостей и обычных пользователей."""
+        user = Client()
+        user.force_login(self.author)
+        for client in (Client(), user):
+            with self.subTest(client=client):
+                self.assertEqual(client.get(METRICS_URL).status_code, 403)
+        response = self.staff_client.get(METRICS_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    def test_request_metrics(self):
+        """Время, SQL и шаблон считаются по имени URL."""
+        client = Client()
+        client.force_login(self.author)
+        client.get(INDEX_URL)
+        client.get(INDEX_URL)
+        text = self.scrape()
+        self.assertEqual(self.value(
+            text, 'yatube_requests_total{status="200",view="index"}'
+        ), 2)
+        for name in ('yatube_request_duration_seconds',
+                     'yatube_db_duration_seconds',
+                     'yatube_template_duration_seconds'):
+            with self.subTest(name=name):
+                self.assertEqual(
+                    self.value(text, f'{name}_count{{view="index"}}'), 2
+                )
+                self.assertEqual(self.value(
+                    text, f'{name}_bucket{{view="index",le="+Inf"}}'
+                ), 2)
+        self.assertGreater(
+            self.value(text, 'yatube_db_queries_sum{view="index"}'), 0
+        )
+        self.assertIn('# TYPE yatube_db_queries histogram', text)
+
+    def test_page_cache_states(self):
+        """Ответы кэша страниц для гостей считаются по состоянию."""
+        guest = Client()
+        guest.get(INDEX_URL)
+        guest.get(INDEX_URL)
+        text = self.scrape()
+        for state in ('miss', 'hit'):
+            with self.subTest(state=state):
+                self.assertEqual(self.value(
+                    text,
+                    f'yatube_page_cache_total{{state="{state}",view="index"}}'
+                ), 1)
+
+    def test_flushes_add_up(self):
+        """Сброс прибавляет значения к файлу: так суммируются воркеры."""
+        for _ in range(3):
+            metrics.registry.inc('yatube_requests_total', metrics.labels(
+                view='test', status=200
+            ))
+            metrics.flush()
+        self.assertEqual(self.value(
+            self.scrape(), 'yatube_requests_total{status="200",view="test"}'
+        ), 3)
+
+    def test_wrapper_on_every_database(self):
+        """SQL на репликах тоже попадает в метрики."""
+        replica = mock.Mock(
+            execute_wrapper=mock.Mock(return_value=nullcontext())
+        )
+        timer = mock.Mock()
+        databases = [metrics.connections['default'], replica]
+        with mock.patch.object(metrics.connections, 'all',
+                               return_value=databases):
+            with metrics.execute_wrapper(timer):
+                pass
+        replica.execute_wrapper.assert_called_once_with(timer)
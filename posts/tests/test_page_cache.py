@@ -0,0 +1,177 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from posts import feed_cache, views
+from posts.middleware import LOCK_PREFIX, cache_key
+from posts.models import Comment, Follow, Group, Post
+from posts.tests.utils import run_on_commit
+
+INDEX_URL = reverse('index')
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = get_user_model().objects.create(username='Author')
+        cls.reader = get_user_model().objects.create(username='Reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            text='Первая запись', author=cls.author, group=cls.group
+        )
+        cls.post_url = reverse('post', args=(cls.author.username, cls.post.id))
+        cls.profile_url = reverse('profile', args=(cls.author.username,))
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def get(self, url):
+        response = self.guest_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_hit_without_queries(self):
+        """Повторный анонимный запрос отдаётся из кэша без базы."""
+        urls = (
+            INDEX_URL,
+            reverse('group', args=(self.group.slug,)),
+            self.profile_url,
+            self.post_url,
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.get(url)
+                self.assertEqual(first['X-Page-Cache'], 'MISS')
+                with self.assertNumQueries(0):
+                    second = self.get(url)
+                self.assertEqual(second['X-Page-Cache'], 'HIT')
+                self.assertEqual(second.content, first.content)
+
+    def test_vary_kept(self):
+        """Vary представления отдаётся и из кэша: иначе кэши по пути
+        смешают разные варианты страницы."""
+        render = views.render
+
+        def render_with_vary(*args, **kwargs):
+            response = render(*args, **kwargs)
+            response['Vary'] = 'Accept-Language'
+            return response
+
+        with mock.patch.object(views, 'render', render_with_vary):
+            self.get(INDEX_URL)
+        response = self.get(INDEX_URL)
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertIn('Accept-Language', response['Vary'])
+
+    def test_group_rename(self):
+        """Переименование группы сбрасывает профили и записи с ней."""
+        for url in (self.profile_url, self.post_url):
+            self.get(url)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        with run_on_commit():
+            group.save()
+        for url in (self.profile_url, self.post_url):
+            with self.subTest(url=url):
+                response = self.get(url)
+                self.assertEqual(response['X-Page-Cache'], 'MISS')
+                self.assertContains(response, 'Новое название')
+
+    def test_authenticated_not_cached(self):
+        client = Client()
+        client.force_login(self.reader)
+        client.get(INDEX_URL)
+        self.assertFalse(client.get(INDEX_URL).has_header('X-Page-Cache'))
+        key = cache_key(RequestFactory().get(INDEX_URL))
+        self.assertIsNone(cache.get(key))
+
+    def test_query_is_part_of_key(self):
+        self.get(INDEX_URL)
+        response = self.get(INDEX_URL + '?cursor=bad')
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+
+    def test_invalidated_by_tags(self):
+        """Запись, комментарий и подписка сбрасывают только свои страницы."""
+        group_url = reverse('group', args=(self.group.slug,))
+        reader_url = reverse('profile', args=(self.reader.username,))
+        for url in (INDEX_URL, group_url, self.post_url, reader_url):
+            self.get(url)
+        with run_on_commit():
+            Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий'
+            )
+        response = self.get(self.post_url)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'Комментарий')
+        self.assertEqual(self.get(reader_url)['X-Page-Cache'], 'HIT')
+
+        self.get(self.profile_url)
+        self.get(group_url)
+        with run_on_commit():
+            Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.get(self.profile_url)['X-Page-Cache'], 'MISS')
+        self.assertEqual(self.get(reader_url)['X-Page-Cache'], 'MISS')
+        self.assertEqual(self.get(group_url)['X-Page-Cache'], 'HIT')
+
+        with run_on_commit():
+            Post.objects.create(text='Вторая запись', author=self.reader)
+        self.assertContains(self.get(INDEX_URL), 'Вторая запись')
+        self.assertEqual(self.get(group_url)['X-Page-Cache'], 'HIT')
+
+    def test_read_before_commit_not_kept(self):
+        """Страница, собранная между записью и коммитом, не переживает
+        коммит: версии меняются только после него."""
+        version = feed_cache.get_version(feed_cache.POSTS)
+        with run_on_commit():
+            Post.objects.create(text='Вторая запись', author=self.author)
+            self.assertEqual(
+                feed_cache.get_version(feed_cache.POSTS), version
+            )
+            self.assertEqual(self.get(INDEX_URL)['X-Page-Cache'], 'MISS')
+        self.assertNotEqual(feed_cache.get_version(feed_cache.POSTS), version)
+        self.assertEqual(self.get(INDEX_URL)['X-Page-Cache'], 'MISS')
+
+    def test_commit_during_render(self):
+        """Запись, закоммиченная во время рендера, не оставляет
+        сохранённую страницу свежей."""
+        render = views.render
+
+        def render_with_commit(*args, **kwargs):
+            with run_on_commit():
+                Post.objects.create(text='Во время рендера',
+                                    author=self.author)
+            return render(*args, **kwargs)
+
+        with mock.patch.object(views, 'render', render_with_commit):
+            self.get(INDEX_URL)
+        response = self.get(INDEX_URL)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'Во время рендера')
+
+    def test_stale_while_revalidate(self):
+        """Пока страницу перестраивает другой запрос, отдаётся старая."""
+        self.get(INDEX_URL)
+        with run_on_commit():
+            Post.objects.create(text='Вторая запись', author=self.author)
+        lock = LOCK_PREFIX + cache_key(RequestFactory().get(INDEX_URL))
+        cache.add(lock, True)
+        response = self.get(INDEX_URL)
+        self.assertEqual(response['X-Page-Cache'], 'STALE')
+        self.assertNotContains(response, 'Вторая запись')
+        cache.delete(lock)
+        response = self.get(INDEX_URL)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'Вторая запись')
+        self.assertIsNone(cache.get(lock))
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_expired_rebuilt(self):
+        self.get(INDEX_URL)
+        self.assertEqual(self.get(INDEX_URL)['X-Page-Cache'], 'MISS')
@@ -0,0 +1,80 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post
+from posts.paginators import CursorPaginator
+
+INDEX_URL = reverse('index')
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = get_user_model().objects.create(username='TestUser')
+        Post.objects.bulk_create(
+            Post(text=f'Тестовый текст {i}', author=cls.user)
+            for i in range(25)
+        )
+        # Одинаковая дата у всех записей: порядок держится на id.
+        Post.objects.update(pub_date=Post.objects.first().pub_date)
+        cls.expected = list(Post.objects.all())
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.paginator = CursorPaginator(Post.objects.all(), 10)
+
+    def test_pages_cover_feed_without_gaps(self):
+        """Курсоры вперёд проходят ленту целиком без пропусков и повторов."""
+        page = self.paginator.get_page()
+        seen = list(page)
+        while page.has_next():
+            page = self.paginator.get_page(page.next_cursor)
+            seen.extend(page)
+        self.assertEqual(seen, self.expected)
+
+    def test_previous_cursor_returns_previous_page(self):
+        """Курсор назад возвращает предыдущую страницу."""
+        first = self.paginator.get_page()
+        second = self.paginator.get_page(first.next_cursor)
+        back = self.paginator.get_page(second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_page_fetch_has_no_count(self):
+        """Страница выбирается одним запросом без COUNT и OFFSET."""
+        cursor = self.paginator.get_page().next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            list(self.paginator.get_page(cursor))
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]['sql'].upper()
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_broken_cursor_returns_first_page(self):
+        """Некорректный курсор открывает начало ленты."""
+        response = self.guest_client.get(INDEX_URL, {'cursor': '!!!'})
+        self.assertEqual(list(response.context['page']), self.expected[:10])
+
+    def test_legacy_page_redirects_to_cursor(self):
+        """Ссылка ?page=N перенаправляет на ту же страницу по курсору."""
+        response = self.guest_client.get(INDEX_URL, {'page': 3}, follow=True)
+        self.assertEqual(list(response.context['page']), self.expected[20:])
+        redirect_url, status = response.redirect_chain[0]
+        self.assertEqual(status, 302)
+        self.assertIn('cursor=', redirect_url)
+
+    def test_legacy_page_past_end_redirects_to_last_page(self):
+        """Номер за концом ленты открывает последнюю страницу."""
+        response = self.guest_client.get(INDEX_URL, {'page': 99}, follow=True)
+        self.assertEqual(list(response.context['page']), self.expected[20:])
+
+    def test_legacy_first_page_redirects_to_feed(self):
+        """Ссылка ?page=1 перенаправляет на ленту без параметров."""
+        response = self.guest_client.get(INDEX_URL, {'page': 1})
+        self.assertRedirects(response, INDEX_URL)
@@ -0,0 +1,123 @@
+import os
+import tempfile
+import threading
+import time
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import profiling
+from posts.models import Post
+
+INDEX_URL = reverse('index')
+
+
+class ProfilerTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = get_user_model().objects.create(username='Author')
+        cls.staff = get_user_model().objects.create(
+            username='Staff', is_staff=True
+        )
+        Post.objects.create(text='Запись', author=cls.author)
+
+    def setUp(self):
+        # Страница из кэша фрагментов не выполняет SQL.
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.settings = override_settings(
+            PROFILER_DIR=self.directory, PROFILER_ENABLED=False
+        )
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def captures(self, suffix='.collapsed'):
+        return sorted(
+            name for name in os.listdir(self.directory)
+            if name.endswith(suffix)
+        )
+
+    def settings_override(self, **values):
+        return override_settings(PROFILER_ENABLED=True, **values)
+
+    def test_sampler_collects_stacks(self):
+        """Поток профилировщика снимает стеки чужого потока."""
+        thread_id = threading.get_ident()
+        samples = profiling.sampler.start(thread_id)
+        try:
+            deadline = time.perf_counter() + 0.1
+            while time.perf_counter() < deadline:
+                pass
+        finally:
+            profiling.sampler.stop(thread_id)
+        self.assertTrue(samples)
+        stack = samples.most_common(1)[0][0]
+        self.assertIn('test_sampler_collects_stacks (posts/tests/', stack)
+
+    def test_staff_header(self):
+        """Заголовок X-Profile сотрудника сохраняет стеки и SQL."""
+        response = self.staff_client.get(INDEX_URL, HTTP_X_PROFILE='1')
+        self.assertEqual(self.captures(), [response['X-Profile']])
+        self.assertIn('ms-index-', response['X-Profile'])
+        with open(os.path.join(
+            self.directory, self.captures('.sql')[0]
+        ), encoding='utf-8') as file:
+            sql = file.read()
+        self.assertIn(f'-- GET {INDEX_URL}', sql)
+        self.assertIn('SELECT', sql)
+
+    def test_header_needs_staff(self):
+        user = Client()
+        user.force_login(self.author)
+        for client in (Client(), user):
+            response = client.get(INDEX_URL, HTTP_X_PROFILE='1')
+            self.assertFalse(response.has_header('X-Profile'))
+        self.assertEqual(self.captures(), [])
+
+    def test_threshold(self):
+        """Сохраняются только запросы дольше порога."""
+        with self.settings_override(PROFILER_THRESHOLD=60):
+            self.client.get(INDEX_URL)
+        self.assertEqual(self.captures(), [])
+        with self.settings_override(PROFILER_THRESHOLD=0):
+            self.client.get(INDEX_URL)
+        self.assertEqual(len(self.captures()), 1)
+
+    def test_rotation(self):
+        with self.settings_override(PROFILER_THRESHOLD=0, PROFILER_KEEP=2):
+            for _ in range(4):
+                self.client.get(INDEX_URL)
+        self.assertEqual(len(self.captures()), 2)
+        self.assertEqual(len(self.captures('.sql')), 2)
+
+    def test_summary(self):
+        """profile_summary складывает выборки всех снимков."""
+        for name, lines in (
+            ('1-100ms-index-1', ['main;view;render 3', 'main;view;sql 1']),
+            ('2-100ms-group-1', ['main;view;render 2', 'main;view 4']),
+        ):
+            path = os.path.join(self.directory, name + '.collapsed')
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write('\n'.join(lines) + '\n')
+        own, total, samples = profiling.hot_frames(
+            profiling.read_captures(self.directory)
+        )
+        self.assertEqual(samples, 10)
+        self.assertEqual(own['render'], 5)
+        self.assertEqual(own['view'], 4)
+        self.assertEqual(total['view'], 10)
+        out = StringIO()
+        call_command(
+            'profile_summary', dir=self.directory, view='index', stdout=out
+        )
+        self.assertIn('Снимков: 1, выборок: 4', out.getvalue())
+        self.assertIn('75.0%       3  render', out.getvalue())
@@ -0,0 +1,92 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from posts import timeline
+from posts.models import Comment, Follow, Group, Post
+from posts.paginators import NEXT, CommentPage, CursorPaginator, encode_cursor
+
+# Полный просмотр таблицы без индекса: "SCAN posts_post" или, в старых
+# версиях SQLite, "SCAN TABLE posts_post".
+FULL_SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)(?! USING)\s*$')
+
+
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = get_user_model().objects.create(username='TestUser')
+        cls.reader = get_user_model().objects.create(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Тестовое описание',
+            slug='test-slug',
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Тестовый текст {i}', author=cls.user, group=cls.group)
+            for i in range(20)
+        )
+        cls.post = Post.objects.first()
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Текст')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def feed_querysets(self, post_list):
+        paginator = CursorPaginator(post_list, 10)
+        first = paginator.get_page()
+        pages = {
+            'first page': first,
+            'next page': paginator.get_page(first.next_cursor),
+        }
+        return [
+            (page, queryset[:11])
+            for page, cursor_page in pages.items()
+            for queryset in cursor_page.querysets
+        ]
+
+    def assertNoFullScan(self, queryset):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN есть только у SQLite')
+        plan = queryset.explain()
+        for line in plan.splitlines():
+            self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', line, plan)
+            match = FULL_SCAN.search(line)
+            if match:
+                self.fail(f'Полный просмотр {match.group(1)}:\n{plan}')
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент не сортируют всю таблицу во временном B-дереве."""
+        feeds = {
+            'index': Post.objects.feed(),
+            'group': Post.objects.feed().filter(group=self.group),
+            'profile': Post.objects.feed().filter(author=self.user),
+            'follow': timeline.followed_sources(self.reader),
+        }
+        with override_settings(FEED_FANOUT_THRESHOLD=0):
+            feeds['follow, popular author'] = timeline.followed_sources(
+                self.reader
+            )
+        for feed, post_list in feeds.items():
+            for page, queryset in self.feed_querysets(post_list):
+                with self.subTest(feed=feed, page=page):
+                    self.assertNoFullScan(queryset)
+
+    def test_lookup_queries_use_indexes(self):
+        """Комментарии и подписки выбираются по индексу."""
+        comment = self.post.comments.get()
+        lookups = {
+            'comments': self.post.comments.all(),
+            'comments, next page': CommentPage(
+                self.post.comments.all(), 50,
+                encode_cursor(NEXT, comment.created, comment.pk)
+            ).queryset,
+            'following': Follow.objects.filter(
+                user=self.reader, author=self.user
+            ),
+            'followers': Follow.objects.filter(author=self.user),
+        }
+        for lookup, queryset in lookups.items():
+            with self.subTest(lookup=lookup):
+                self.assertNoFullScan(queryset)
@@ -0,0 +1,149 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import router
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase
+from django.test import override_settings
+from django.urls import reverse
+
+from posts import feed_cache, replicas
+from posts.models import Post
+
+INDEX_URL = reverse('index')
+
+
+@override_settings(DATABASE_REPLICAS=['replica0'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        # Состояние потока от предыдущих запросов и тестов.
+        replicas._local.__dict__.clear()
+
+    def route(self, method='get'):
+        @replicas.read_from_replica
+        def view(request):
+            return router.db_for_read(Post), router.db_for_write(Post)
+
+        request = getattr(RequestFactory(), method)('/')
+        request.user = AnonymousUser()
+        return view(request)
+
+    def test_reads_from_replica(self):
+        """Чтение помеченного представления идёт на реплику."""
+        self.assertEqual(self.route(), ('replica0', 'default'))
+        self.assertEqual(router.db_for_read(Post), 'default')
+
+    def test_write_pins_to_default(self):
+        """После записи в том же запросе чтение идёт на default."""
+        @replicas.read_from_replica
+        def view(request):
+            router.db_for_write(Post)
+            return router.db_for_read(Post)
+
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        self.assertEqual(view(request), 'default')
+
+    def test_unsafe_methods_use_default(self):
+        self.assertEqual(self.route('post'), ('default', 'default'))
+
+
+class ReplicaPinTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = get_user_model().objects.create(username='Author')
+        cls.post = Post.objects.create(text='Запись', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+        # Реплика - та же тестовая база: проверяется выбор, а не данные.
+        self.settings = override_settings(DATABASE_REPLICAS=['default'])
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        choose = mock.patch.object(
+            replicas, 'choose', return_value='default'
+        )
+        self.choose = choose.start()
+        self.addCleanup(choose.stop)
+
+    def test_read_views_use_replica(self):
+        for url in (INDEX_URL,
+                    reverse('profile', args=(self.author.username,)),
+                    reverse('post', args=(self.author.username,
+                                          self.post.id)),
+                    reverse('follow_index')):
+            with self.subTest(url=url):
+                self.choose.reset_mock()
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(self.choose.called)
+                self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+    def test_write_pins_visitor(self):
+        """После комментария посетитель читает с default."""
+        response = self.client.post(
+            reverse('add_comment', args=(self.author.username,
+                                         self.post.id)),
+            {'text': 'Комментарий'},
+        )
+        cookie = response.cookies[replicas.PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 10)
+        self.choose.reset_mock()
+        self.client.get(INDEX_URL)
+        self.assertFalse(self.choose.called)
+        del self.client.cookies[replicas.PIN_COOKIE]
+        # Лента из кэша фрагментов не читает базу вовсе.
+        cache.clear()
+        self.client.get(INDEX_URL)
+        self.assertTrue(self.choose.called)
+
+
+@override_settings(DATABASE_REPLICAS=['replica0'], REPLICA_PIN_SECONDS=0.05)
+class ReplicaLagInvalidationTests(SimpleTestCase):
+    def test_versions_bumped_again(self):
+        """Через REPLICA_PIN_SECONDS после коммита версии меняются ещё
+        раз: страница, собранная по отстающей реплике, не остаётся
+        в кэше под новой версией."""
+        version = feed_cache.get_version(feed_cache.POSTS)
+        feed_cache.invalidate_on_commit(feed_cache.POSTS)
+        bumped = feed_cache.get_version(feed_cache.POSTS)
+        self.assertNotEqual(bumped, version)
+        deadline = time.monotonic() + 5
+        while (feed_cache.get_version(feed_cache.POSTS) == bumped
+               and time.monotonic() < deadline):
+            time.sleep(0.01)
+        self.assertNotEqual(feed_cache.get_version(feed_cache.POSTS), bumped)
+
+
+class CopySQLiteTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_replica_gets_primary_state(self):
+        """sync_replicas переносит изменения основной базы в реплику."""
+        source = os.path.join(self.directory, 'primary.sqlite3')
+        target = os.path.join(self.directory, 'replica.sqlite3')
+        primary = sqlite3.connect(source, isolation_level=None)
+        self.addCleanup(primary.close)
+        primary.execute('PRAGMA journal_mode=WAL')
+        primary.execute('CREATE TABLE post (text TEXT)')
+        primary.execute("INSERT INTO post VALUES ('первая')")
+        replicas.copy_sqlite(source, target)
+        primary.execute("INSERT INTO post VALUES ('вторая')")
+        replica = sqlite3.connect(target)
+        self.addCleanup(replica.close)
+        self.assertEqual(replica.execute('SELECT COUNT(*) FROM post')
+                         .fetchone()[0], 1)
+        replicas.copy_sqlite(source, target)
+        self.assertEqual(replica.execute('SELECT COUNT(*) FROM post')
+                         .fetchone()[0], 2)
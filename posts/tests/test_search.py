@@ -0,0 +1,157 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import search
+from posts.models import Group, Post, SearchTerm
+from posts.stemmer import stem
+
+
+class StemmerTests(TestCase):
+    def test_word_forms(self):
+        """Формы одного слова сводятся к общей основе."""
+        self.assertEqual(stem('заметки'), stem('заметка'))
+        self.assertEqual(stem('записей'), stem('Записями'))
+        self.assertEqual(stem('ёлки'), stem('елка'))
+        self.assertEqual(stem('python'), 'python')
+
+
+class SearchTestsMixin:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = get_user_model().objects.create(username='leo')
+        cls.group = Group.objects.create(
+            title='Путешествия', slug='travel', description='Группа'
+        )
+        cls.travel = Post.objects.create(
+            text='Записки о горах', author=cls.author, group=cls.group
+        )
+        cls.notes = Post.objects.create(
+            text='Новые заметки в дневнике. Заметки про море и про лес',
+            author=cls.author,
+        )
+        cls.other = Post.objects.create(
+            text='Совсем другой текст', author=cls.author
+        )
+
+    def setUp(self):
+        self.client = Client()
+
+    def found(self, query, **kwargs):
+        return [post.pk for post in search.search(query, **kwargs)]
+
+    def test_stemmed_match(self):
+        """Запрос находит другие формы слова."""
+        self.assertEqual(self.found('заметка'), [self.notes.pk])
+        self.assertEqual(self.found('морем'), [self.notes.pk])
+        self.assertEqual(self.found('несуществующее'), [])
+        self.assertEqual(self.found('!!!'), [])
+
+    def test_all_terms_required(self):
+        """Запись должна содержать все слова запроса."""
+        self.assertEqual(self.found('заметки море'), [self.notes.pk])
+        self.assertEqual(self.found('заметки горы'), [])
+
+    def test_long_word(self):
+        """Слово длиннее поля SearchTerm находит само себя."""
+        word = 'x' * 100
+        post = Post.objects.create(text=word, author=self.author)
+        self.assertEqual(self.found(word), [post.pk])
+
+    def test_group_and_author_indexed(self):
+        """Ищутся название группы и имя автора."""
+        self.assertEqual(self.found('путешествие'), [self.travel.pk])
+        self.assertEqual(
+            set(self.found('leo')),
+            {self.travel.pk, self.notes.pk, self.other.pk}
+        )
+
+    def test_ranking(self):
+        """Запись с большим числом совпадений идёт выше."""
+        post = Post.objects.create(
+            text='Одна заметка про лес и море в старом дневнике',
+            author=self.author
+        )
+        self.assertEqual(self.found('заметками'), [self.notes.pk, post.pk])
+
+    def test_incremental_updates(self):
+        """Индекс следует за правкой и удалением записей, групп и имён."""
+        post = Post.objects.create(text='Про кошку', author=self.author)
+        self.assertEqual(self.found('кошки'), [post.pk])
+        post.text = 'Про собак'
+        post.save()
+        self.assertEqual(self.found('кошки'), [])
+        self.assertEqual(self.found('собаки'), [post.pk])
+        post.delete()
+        self.assertEqual(self.found('собаки'), [])
+
+        self.group.title = 'Горы'
+        self.group.save()
+        self.assertEqual(self.found('путешествия'), [])
+        self.assertEqual(self.found('горы'), [self.travel.pk])
+        self.author.username = 'tolstoy'
+        self.author.save()
+        self.assertEqual(self.found('leo'), [])
+        self.assertEqual(len(self.found('tolstoy')), 3)
+        self.group.delete()
+        self.assertEqual(self.found('горы'), [self.travel.pk])
+        self.assertEqual(self.found('горы записки'), [self.travel.pk])
+
+    def test_cursor_pagination(self):
+        """Курсор проходит все результаты без повторов в обе стороны."""
+        for number in range(5):
+            Post.objects.create(text=f'Кот {number}', author=self.author)
+        seen = []
+        page = search.search('кот', per_page=2)
+        pages = [page]
+        while True:
+            seen += [post.pk for post in page]
+            if not page.has_next():
+                break
+            page = search.search('кот', page.next_cursor, per_page=2)
+            pages.append(page)
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+        previous = search.search('кот', pages[-1].previous_cursor, per_page=2)
+        self.assertEqual(list(previous), list(pages[-2]))
+        self.assertFalse(pages[0].has_previous())
+
+    def test_search_page(self):
+        """Страница поиска показывает результаты и хранит запрос в ссылках."""
+        for number in range(11):
+            Post.objects.create(text=f'Заметка {number}', author=self.author)
+        response = self.client.get(reverse('search'), {'q': 'заметки'})
+        self.assertEqual(len(response.context['page']), 10)
+        self.assertContains(response, '?q=%D0%B7%D0%B0%D0%BC')
+        response = self.client.get(reverse('search'))
+        self.assertEqual(len(response.context['page']), 0)
+
+    def test_rebuild_command(self):
+        """Команда перестраивает индекс после правок в обход сигналов."""
+        Post.objects.filter(pk=self.other.pk).update(text='Текст про сов')
+        self.assertEqual(self.found('совы'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', batch_size=2, stdout=out)
+        self.assertIn('3', out.getvalue())
+        self.assertEqual(self.found('совы'), [self.other.pk])
+
+
+class FTS5SearchTests(SearchTestsMixin, TestCase):
+    def test_backend(self):
+        """На SQLite с FTS5 используется виртуальная таблица."""
+        self.assertEqual(search.get_backend().name, 'fts5')
+        self.assertFalse(SearchTerm.objects.exists())
+
+
+@override_settings(SEARCH_BACKEND='python')
+class InvertedIndexSearchTests(SearchTestsMixin, TestCase):
+    def test_backend(self):
+        """Запасной бэкенд хранит основы слов в SearchTerm."""
+        self.assertEqual(search.get_backend().name, 'python')
+        self.assertTrue(SearchTerm.objects.filter(
+            post=self.notes, term=stem('заметки')
+        ).exists())
@@ -0,0 +1,63 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import Count, F
+from django.test import TestCase, override_settings
+
+from posts import counters
+from posts.models import Comment, Follow, Group, Post, StoredImage, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, FEED_FANOUT_THRESHOLD=10)
+class GenerateDataTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_generate_data(self):
+        """Генератор создаёт связные данные со степенным законом подписок."""
+        call_command(
+            'generate_data', users=40, groups=3, posts=120,
+            comments_per_post=2, follows_per_user=6, image_share=0.5,
+            stdout=StringIO()
+        )
+        self.assertEqual(User.objects.count(), 40)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 120)
+        self.assertTrue(Comment.objects.exists())
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        self.assertTrue(StoredImage.objects.filter(refcount__gt=0).exists())
+        followers = sorted(
+            User.objects.annotate(
+                total=Count('following')
+            ).values_list('total', flat=True),
+            reverse=True,
+        )
+        self.assertGreater(followers[0], 3 * followers[len(followers) // 2])
+        self.assertFalse(Follow.objects.filter(
+            user_id=F('author_id')
+        ).exists())
+        # Счётчики уже сходятся: пересчёт ничего не исправляет.
+        self.assertEqual(
+            counters.recount_all(),
+            {'profile_stats': 0, 'comment_count': 0},
+        )
+
+    def test_same_seed_same_data(self):
+        """Одинаковый seed даёт одинаковые данные."""
+        texts = []
+        for _ in range(2):
+            Post.objects.all().delete()
+            call_command('generate_data', users=10, posts=20,
+                         image_share=0, seed=7, stdout=StringIO())
+            texts.append(list(
+                Post.objects.order_by('pub_date').values_list(
+                    'text', 'author__username'
+                )
+            ))
+        self.assertEqual(texts[0], texts[1])
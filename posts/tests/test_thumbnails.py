@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import thumbnails
+from posts.models import Post
+
+MEDIA_ROOT = tempfile.mkdtemp()
+SMALL_GIF = (b'\x47\x49\x46\x38\x39\x61\x02\x00'
+             b'\x01\x00\x80\x00\x00\x00\x00\x00'
+             b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+             b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+             b'\x0A\x00\x3B')
+
+
+def uploaded(name='small.gif'):
+    return SimpleUploadedFile(
+        name=name, content=SMALL_GIF, content_type='image/gif'
+    )
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = get_user_model().objects.create(username='Author')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        # Хранилище sorl кэширует миниатюры по имени файла, а имена
+        # картинок одинаковы во всех тестах.
+        cache.clear()
+        self.client = Client()
+        self.post = Post.objects.create(
+            text='Текст', author=self.author, image=uploaded()
+        )
+
+    def test_placeholder_until_ready(self):
+        """Пока миниатюры нет, лента показывает заглушку без sorl."""
+        response = self.client.get(reverse('index'))
+        self.assertEqual(self.post.thumbnail, '')
+        self.assertContains(response, 'padding-top: 35.3%')
+        self.assertNotContains(response, '<img class="card-img"')
+
+    def test_generate(self):
+        """Миниатюра строится и её адрес попадает в ленту."""
+        url = thumbnails.generate(self.post.pk)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.thumbnail, url)
+        self.assertTrue(url.startswith(settings.MEDIA_URL))
+        path = os.path.join(MEDIA_ROOT, url[len(settings.MEDIA_URL):])
+        self.assertTrue(os.path.exists(path))
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, f'src="{url}"')
+
+    def test_new_image_resets_thumbnail(self):
+        """Замена картинки сбрасывает устаревшую миниатюру."""
+        thumbnails.generate(self.post.pk)
+        self.post.refresh_from_db()
+        self.post.text = 'Новый текст'
+        self.post.save()
+        self.assertNotEqual(self.post.thumbnail, '')
+        self.post.image = uploaded('other.gif')
+        self.post.save()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.thumbnail, '')
+
+    def test_post_without_image(self):
+        """Для записи без картинки ничего не строится."""
+        post = Post.objects.create(text='Без картинки', author=self.author)
+        self.assertIsNone(thumbnails.generate(post.pk))
+
+    def test_warm_command(self):
+        """Команда строит недостающие миниатюры."""
+        Post.objects.create(text='Ещё', author=self.author, image=uploaded())
+        out = StringIO()
+        call_command('warm_thumbnails', workers=1, stdout=out)
+        self.assertIn('2 из 2', out.getvalue())
+        self.assertFalse(Post.objects.filter(thumbnail='').exists())
+        call_command('warm_thumbnails', workers=1, stdout=out)
+        self.assertIn('0 из 0', out.getvalue())
@@ -0,0 +1,100 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Post, TimelineEntry
+
+FOLLOW_INDEX_URL = reverse('follow_index')
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = get_user_model().objects.create(username='Author')
+        cls.reader = get_user_model().objects.create(username='Reader')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def feed(self):
+        response = self.reader_client.get(FOLLOW_INDEX_URL)
+        return list(response.context['page'])
+
+    def test_new_post_is_fanned_out(self):
+        """Новая запись попадает в материализованную ленту подписчика."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.author_client.post(reverse('new_post'), {'text': 'Текст'})
+        post = Post.objects.get()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post, pub_date=post.pub_date
+        ).exists())
+        self.assertEqual(self.feed(), [post])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка дополняет ленту старыми записями, отписка их убирает."""
+        post = Post.objects.create(text='Текст', author=self.author)
+        self.reader_client.get(
+            reverse('profile_follow', args=(self.author.username,))
+        )
+        self.assertEqual(self.feed(), [post])
+        self.reader_client.get(
+            reverse('profile_unfollow', args=(self.author.username,))
+        )
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), [])
+
+    @override_settings(FEED_FANOUT_THRESHOLD=0)
+    def test_popular_author_is_merged_on_read(self):
+        """Записи автора выше порога читаются без материализации."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Текст', author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), [post])
+
+    @override_settings(FEED_FANOUT_THRESHOLD=1)
+    def test_demoted_author_is_fanned_out_again(self):
+        """Автор, опустившийся до порога, снова раскладывается по лентам."""
+        other = get_user_model().objects.create(username='Other')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        post = Post.objects.create(text='Текст', author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        other_client = Client()
+        other_client.force_login(other)
+        other_client.get(
+            reverse('profile_unfollow', args=(self.author.username,))
+        )
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post
+        ).exists())
+        self.assertEqual(self.feed(), [post])
+
+    @override_settings(FEED_FANOUT_THRESHOLD=1)
+    def test_deleted_follower_demotes_author(self):
+        """Удаление подписчика вместе с подписками тоже возвращает автора
+        к раскладке по лентам."""
+        other = get_user_model().objects.create(username='Other')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        post = Post.objects.create(text='Текст', author=self.author)
+        other.delete()
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('user_id', 'post_id')),
+            [(self.reader.id, post.id)],
+        )
+
+    @override_settings(FEED_FANOUT_THRESHOLD=1)
+    def test_promoted_author_is_pruned(self):
+        """Автор, поднявшийся выше порога, убирается из таблицы лент."""
+        post = Post.objects.create(text='Текст', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertTrue(TimelineEntry.objects.exists())
+        other = get_user_model().objects.create(username='Other')
+        Follow.objects.create(user=other, author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), [post])
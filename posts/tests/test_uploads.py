@@ -0,0 +1,118 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.models import Post
+from posts.uploads import ImageUploadHandler
+
+MEDIA_ROOT = tempfile.mkdtemp()
+UPLOAD_DIR = tempfile.mkdtemp()
+
+
+def png(size=(50, 50)):
+    content = io.BytesIO()
+    Image.new('RGB', size, color=(0, 128, 255)).save(content, 'PNG')
+    return content.getvalue()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, FILE_UPLOAD_TEMP_DIR=UPLOAD_DIR)
+class ImageUploadHandlerTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = get_user_model().objects.create(username='Author')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(UPLOAD_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def stream(self, content, chunk_size=10, field_name='image'):
+        handler = ImageUploadHandler()
+        handler.new_file(field_name, 'photo.png', 'image/png', len(content))
+        for start in range(0, len(content), chunk_size):
+            chunk = content[start:start + chunk_size]
+            self.assertIsNone(handler.receive_data_chunk(chunk, start))
+        return handler.file_complete(len(content))
+
+    def test_streamed_in_chunks(self):
+        """Заголовок разбирается по кускам, хеш считается на лету."""
+        content = png()
+        upload = self.stream(content)
+        self.assertIsNone(upload.upload_error)
+        self.assertEqual(upload.image_format, 'PNG')
+        self.assertEqual(upload.image_size, (50, 50))
+        self.assertEqual(upload.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(upload.read(), content)
+        self.assertTrue(upload.temporary_file_path().startswith(UPLOAD_DIR))
+        upload.close()
+
+    @override_settings(FILE_UPLOAD_TEMP_DIR=None)
+    def test_not_under_media_root(self):
+        """Недокачанный файл не лежит в раздаваемом MEDIA_ROOT."""
+        upload = self.stream(png())
+        path = upload.temporary_file_path()
+        self.assertFalse(path.startswith(MEDIA_ROOT))
+        self.assertTrue(path.startswith(tempfile.gettempdir()))
+        upload.close()
+
+    def test_other_fields_passed_through(self):
+        handler = ImageUploadHandler()
+        handler.new_file('document', 'a.txt', 'text/plain', 3)
+        self.assertEqual(handler.receive_data_chunk(b'abc', 0), b'abc')
+        self.assertIsNone(handler.file_complete(3))
+
+    def test_invalid_rejected(self):
+        upload = self.stream(b'not an image at all')
+        self.assertEqual(upload.upload_error,
+                         'Загрузите правильное изображение.')
+        self.assertEqual(upload.size, 0)
+        upload.close()
+
+    @override_settings(POST_IMAGE_MAX_BYTES=100)
+    def test_oversize_stops_writing(self):
+        """После превышения лимита данные на диск не пишутся."""
+        upload = self.stream(png((300, 300)))
+        self.assertIn('Файл больше', upload.upload_error)
+        self.assertEqual(os.path.getsize(upload.temporary_file_path()), 0)
+        upload.close()
+
+    def test_upload_through_form(self):
+        """Картинка из формы попадает в хранилище без временных файлов."""
+        content = png()
+        response = self.client.post(reverse('new_post'), {
+            'text': 'Текст',
+            'image': SimpleUploadedFile('photo.png', content, 'image/png'),
+        })
+        self.assertRedirects(response, reverse('index'))
+        post = Post.objects.get()
+        with post.image.open('rb') as file:
+            self.assertEqual(file.read(), content)
+        self.assertEqual(os.listdir(UPLOAD_DIR), [])
+        # nginx читает файлы от имени другого пользователя.
+        self.assertEqual(os.stat(post.image.path).st_mode & 0o777, 0o644)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_form_error(self):
+        """Отказ обработчика показывается как ошибка поля."""
+        response = self.client.post(reverse('new_post'), {
+            'text': 'Текст',
+            'image': SimpleUploadedFile('photo.png', png(), 'image/png'),
+        })
+        self.assertFormError(
+            response, 'form', 'image', 'Слишком большое разрешение: 50x50.'
+        )
+        self.assertFalse(Post.objects.exists())
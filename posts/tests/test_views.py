@@ -4,12 +4,15 @@ import tempfile
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase
-from django.test.utils import override_settings
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.urls import reverse
 
-from posts.models import Follow, Group, Post
+from posts.models import Comment, Follow, Group, Post
+from posts.tests.utils import run_on_commit
 
 USERNAME = 'TestUser'
 SLUG = 'test-slug'
@@ -144,11 +147,58 @@ class PostPagesTests(TestCase):
         """Проверка кэширования главной страницы."""
         response = self.authorized_client.get(INDEX_URL)
         content_first = response.content
-        Post.objects.create(text='Текст', author=self.user)
+        # update() не отправляет сигналов, поэтому кэш не сбрасывается.
+        Post.objects.update(text='Изменённый текст')
         response = self.authorized_client.get(INDEX_URL)
         content_second = response.content
         self.assertEqual(content_first, content_second)
 
+    def test_cache_invalidated_on_new_post(self):
+        """Новая запись сразу появляется на закэшированных страницах."""
+        urls = (INDEX_URL, GROUP_URL, PROFILE_URL)
+        for url in urls:
+            self.authorized_client.get(url)
+        with run_on_commit():
+            Post.objects.create(
+                text='Свежая запись', author=self.user, group=self.group_one
+            )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, 'Свежая запись')
+
+    def test_cache_invalidated_on_group_change(self):
+        """Профиль и страница записи показывают группу в её новом виде."""
+        urls = (PROFILE_URL, self.post_url)
+        for url in urls:
+            self.assertContains(self.authorized_client.get(url), GROUP_URL)
+        group = Group.objects.get(pk=self.group_one.pk)
+        group.title = 'Новое название'
+        with run_on_commit():
+            group.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, 'Новое название')
+        with run_on_commit():
+            group.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertNotContains(response, GROUP_URL)
+
+    def test_cache_keyed_per_page_and_feed(self):
+        """Разные страницы и ленты не делят один фрагмент."""
+        Follow.objects.create(user=self.user_one, author=self.user)
+        first = self.authorized_client.get(INDEX_URL)
+        second = self.authorized_client.get(
+            INDEX_URL, {'cursor': first.context['page'].next_cursor}
+        )
+        self.assertNotContains(second, 'Тестовый текст 12\n')
+        self.assertContains(second, 'Тестовый текст 2\n')
+        response = self.authorized_client.get(FOLLOW_INDEX_URL)
+        self.assertNotContains(response, 'Тестовый текст')
+
     def test_follow(self):
         """Авторизованный пользователь может
         подписываться на других пользователей.
@@ -184,3 +234,60 @@ class PostPagesTests(TestCase):
         response = self.authorized_client.get(FOLLOW_INDEX_URL)
         context = response.context['page'].object_list
         self.assertNotEqual(list(context), list(self.user.posts.all()[:10]))
+
+
+class FeedQueriesTests(TestCase):
+    # Запросы, которые выполняет страница ленты, не считая сессии и
+    # пользователя: они не должны зависеть от числа записей на странице.
+    # Первый запрос group и profile - поиск области для ETag
+    # (posts.conditional).
+    QUERY_BUDGET = {
+        INDEX_URL: 1,
+        GROUP_URL: 3,
+        PROFILE_URL: 4,
+        FOLLOW_INDEX_URL: 2,
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = get_user_model().objects.create(username=USERNAME)
+        cls.reader = get_user_model().objects.create(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            description='Тестовое описание',
+            slug=SLUG,
+        )
+        Post.objects.bulk_create(Post(
+            text=f'Тестовый текст {i}',
+            author=cls.user,
+            group=cls.group,
+            ) for i in range(15)
+        )
+        Comment.objects.bulk_create(
+            Comment(post=post, author=cls.reader, text='Комментарий')
+            for post in Post.objects.all()
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_feed_query_budget(self):
+        """Число запросов на странице ленты не растёт с числом записей."""
+        for url, budget in self.QUERY_BUDGET.items():
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.authorized_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                feed_queries = [
+                    query['sql'] for query in queries
+                    if 'django_session' not in query['sql']
+                    and 'FROM "auth_user" WHERE "auth_user"."id"'
+                    not in query['sql']
+                ]
+                self.assertLessEqual(
+                    len(feed_queries), budget, '\n'.join(feed_queries)
+                )
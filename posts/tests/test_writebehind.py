@@ -0,0 +1,192 @@
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timezone
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import writebehind
+from posts.models import Comment, Follow, Post, ProfileStats, WriteBehindMark
+from posts.tests.utils import run_on_commit
+
+
+class WriteBehindTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = get_user_model().objects.create(username='Author')
+        cls.reader = get_user_model().objects.create(username='Reader')
+        cls.post = Post.objects.create(text='Запись', author=cls.author)
+        cls.post_url = reverse('post', args=(cls.author.username,
+                                             cls.post.id))
+        cls.comment_url = reverse('add_comment', args=(cls.author.username,
+                                                       cls.post.id))
+        cls.profile_url = reverse('profile', args=(cls.author.username,))
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.settings = override_settings(
+            WRITE_BEHIND=True,
+            WRITE_BEHIND_JOURNAL=os.path.join(directory.name, 'journal'),
+        )
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        self.addCleanup(lambda: writebehind._journal()[0].close())
+        # Поток записи не запускается: в тесте пачки пишет flush().
+        start = mock.patch.object(writebehind, 'start')
+        start.start()
+        self.addCleanup(start.stop)
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_comment_is_deferred(self):
+        """Комментарий виден автору сразу, а в базе - после flush."""
+        self.client.post(self.comment_url, {'text': 'Мой комментарий'})
+        self.assertFalse(Comment.objects.exists())
+        response = self.client.get(self.post_url)
+        pending = response.context['pending_comments']
+        self.assertEqual([item.text for item in pending], ['Мой комментарий'])
+        self.assertContains(response, 'отправляется')
+        self.assertEqual(Client().get(self.post_url).context[
+            'pending_comments'
+        ], [])
+
+        self.assertEqual(writebehind.flush(), 1)
+        comment = Comment.objects.get()
+        self.assertEqual(comment.author, self.reader)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).comment_count, 1)
+        response = self.client.get(self.post_url)
+        self.assertEqual(response.context['pending_comments'], [])
+        self.assertEqual(list(response.context['comments']), [comment])
+
+    def test_follow_and_unfollow(self):
+        follow_url = reverse('profile_follow', args=(self.author.username,))
+        unfollow_url = reverse('profile_unfollow',
+                               args=(self.author.username,))
+        self.client.get(follow_url)
+        self.assertFalse(Follow.objects.exists())
+        self.assertTrue(self.client.get(self.profile_url).context['following'])
+        writebehind.flush()
+        self.assertTrue(Follow.objects.filter(
+            user=self.reader, author=self.author
+        ).exists())
+        self.assertEqual(ProfileStats.objects.get(
+            user=self.author
+        ).followers_count, 1)
+
+        self.client.get(unfollow_url)
+        self.assertFalse(
+            self.client.get(self.profile_url).context['following']
+        )
+        self.assertTrue(Follow.objects.exists())
+        writebehind.flush()
+        self.assertFalse(Follow.objects.exists())
+
+    def test_follow_feed(self):
+        """Лента подписок учитывает подписку и отписку из журнала."""
+        follow_index = reverse('follow_index')
+        self.assertNotContains(self.client.get(follow_index), self.post_url)
+        writebehind.follow(self.reader.id, self.author.id)
+        self.assertContains(self.client.get(follow_index), self.post_url)
+        with run_on_commit():
+            writebehind.flush()
+        self.assertContains(self.client.get(follow_index), self.post_url)
+        writebehind.unfollow(self.reader.id, self.author.id)
+        self.assertNotContains(self.client.get(follow_index), self.post_url)
+
+    def test_batch(self):
+        """Одна пачка переносит все накопленные действия по порядку."""
+        for number in range(5):
+            writebehind.comment(self.reader.id, self.post.id, str(number))
+        writebehind.follow(self.reader.id, self.author.id)
+        writebehind.follow(self.reader.id, self.author.id)
+        writebehind.follow(self.reader.id, self.reader.id)
+        self.assertEqual(writebehind.flush(), 8)
+        self.assertEqual(
+            list(Comment.objects.values_list('text', flat=True)),
+            ['0', '1', '2', '3', '4'],
+        )
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(writebehind.flush(), 0)
+
+    def test_recovery_skips_applied_rows(self):
+        """После сбоя до очистки журнала строки не применяются дважды."""
+        applied = writebehind.comment(self.reader.id, self.post.id, 'Было')
+        writebehind.comment(self.reader.id, self.post.id, 'Стало')
+        # Пачка с первой строкой закоммичена, но журнал не очищен.
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Было')
+        WriteBehindMark.objects.create(
+            journal=writebehind._journal()[1], applied_id=applied
+        )
+        self.assertEqual(writebehind.flush(), 2)
+        self.assertEqual(
+            list(Comment.objects.order_by('pk').values_list(
+                'text', flat=True
+            )),
+            ['Было', 'Стало'],
+        )
+
+    def test_journal_open_while_applying(self):
+        """Пока пачка пишется в базу, действия добавляются в журнал."""
+        writebehind.comment(self.reader.id, self.post.id, 'Первый')
+        apply = writebehind._apply
+
+        def enqueue_during_apply(rows):
+            apply(rows)
+            other = sqlite3.connect(settings.WRITE_BEHIND_JOURNAL, timeout=0,
+                                    isolation_level=None)
+            try:
+                other.execute(
+                    'INSERT INTO journal (kind, user_id, target_id, text, '
+                    'created) VALUES (?, ?, ?, ?, ?)',
+                    (writebehind.COMMENT, self.reader.id, self.post.id,
+                     'Второй', time.time())
+                )
+            finally:
+                other.close()
+
+        with mock.patch.object(writebehind, '_apply', enqueue_during_apply):
+            self.assertEqual(writebehind.flush(), 1)
+        self.assertEqual(writebehind.flush(), 1)
+        self.assertEqual(
+            list(Comment.objects.values_list('text', flat=True)),
+            ['Первый', 'Второй'],
+        )
+
+    def test_comment_keeps_journal_time(self):
+        """Время комментария - время действия, а не записи пачки."""
+        writebehind.comment(self.reader.id, self.post.id, 'Давний')
+        writebehind._journal()[0].execute(
+            'UPDATE journal SET created = 86400'
+        )
+        writebehind.flush()
+        self.assertEqual(
+            Comment.objects.get().created,
+            datetime(1970, 1, 2, tzinfo=timezone.utc),
+        )
+
+    def test_deleted_post_is_skipped(self):
+        post = Post.objects.create(text='Удалённая', author=self.author)
+        writebehind.comment(self.reader.id, post.id, 'Опоздал')
+        writebehind.comment(self.reader.id, self.post.id, 'Успел')
+        post.delete()
+        self.assertEqual(writebehind.flush(), 2)
+        self.assertEqual(Comment.objects.get().text, 'Успел')
+
+    def test_pending_action_changes_etag(self):
+        """Повторный GET после действия не получает 304."""
+        response = self.client.get(self.post_url)
+        self.client.post(self.comment_url, {'text': 'Новый'})
+        response = self.client.get(
+            self.post_url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,20 @@
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+@contextmanager
+def run_on_commit(using=DEFAULT_DB_ALIAS):
+    """Выполняет колбэки on_commit, добавленные внутри блока.
+
+    TestCase не коммитит транзакцию теста, и без этого действия после
+    коммита (сброс версий кэша) в тестах не происходят.
+    """
+    connection = connections[using]
+    start = len(connection.run_on_commit)
+    try:
+        yield
+    finally:
+        while len(connection.run_on_commit) > start:
+            _, callback = connection.run_on_commit.pop(start)
+            callback()
@@ -0,0 +1,114 @@
+"""Фоновая подготовка миниатюр для карточек записей.
+
+Раньше includes/post_item.html вызывал {% thumbnail %} при отрисовке, и
+первый показ ленты после загрузки картинки декодировал и масштабировал
+оригинал прямо в потоке запроса. Теперь миниатюра строится после коммита
+в локальном пуле потоков вместе с вариантами для srcset (posts.images),
+а адреса сохраняются в Post.thumbnail и Post.image_variants; пока их
+нет, шаблон показывает заглушку.
+"""
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from sorl.thumbnail import get_thumbnail
+
+from . import feed_cache, images
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+GEOMETRY = '960x339'
+OPTIONS = {'crop': 'center', 'upscale': True}
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails'
+        )
+    return _executor
+
+
+def generate(post_id):
+    """Строит миниатюру записи и сохраняет её адрес.
+
+    Возвращает адрес или None, если картинки нет или её не удалось
+    прочитать.
+    """
+    post = Post.objects.filter(pk=post_id).only(
+        'image', 'author_id', 'group_id'
+    ).first()
+    if post is None or not post.image:
+        return None
+    # Одинаковые картинки хранятся одним файлом (posts.storage), и
+    # готовые миниатюры другой записи с тем же файлом подходят как есть.
+    shared = Post.objects.filter(image=post.image.name).exclude(
+        pk=post_id
+    ).exclude(thumbnail='').values_list('thumbnail', 'image_variants').first()
+    sources = None
+    if shared is not None:
+        url, variants = shared
+    else:
+        try:
+            url = get_thumbnail(post.image, GEOMETRY, **OPTIONS).url
+            sources = images.build_variants(post.image)
+        except Exception:
+            logger.exception(
+                'Не удалось построить миниатюру записи %s', post_id
+            )
+            return None
+        variants = json.dumps(sources)
+    # Пока миниатюра строилась, картинку могли заменить: тогда адрес
+    # не сохраняется, его запишет задача для новой картинки.
+    updated = Post.objects.filter(pk=post_id, image=post.image.name).update(
+        thumbnail=url,
+        image_variants=variants,
+    )
+    if updated:
+        feed_cache.invalidate_on_commit(
+            feed_cache.post_scope(post_id),
+            *feed_cache.post_scopes(post.author_id, post.group_id)
+        )
+    if updated and sources is not None:
+        # Прежние варианты удаляются только теперь, когда страницы
+        # ссылаются на новые.
+        transaction.on_commit(lambda: images.delete_variants(
+            post.image.name, keep=images.srcset_names(sources)
+        ))
+    return url
+
+
+def _generate_in_worker(post_id):
+    try:
+        return generate(post_id)
+    finally:
+        # У каждого потока пула своё соединение с базой.
+        connection.close()
+
+
+def schedule(post_id):
+    """Ставит построение миниатюры в очередь после коммита транзакции."""
+    if settings.THUMBNAIL_WORKERS:
+        def submit():
+            _get_executor().submit(_generate_in_worker, post_id)
+    else:
+        def submit():
+            generate(post_id)
+    transaction.on_commit(submit)
+
+
+def warm(post_ids, workers):
+    """Строит миниатюры для списка записей, возвращает число готовых."""
+    if workers <= 1:
+        results = map(generate, post_ids)
+        return sum(url is not None for url in results)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(_generate_in_worker, post_ids)
+        return sum(url is not None for url in results)
@@ -0,0 +1,162 @@
+"""Материализованная лента подписок.
+
+Записи авторов, у которых не больше settings.FEED_FANOUT_THRESHOLD
+подписчиков, раскладываются по лентам подписчиков в момент публикации
+(fan-out on write). Записи популярных авторов в таблицу не попадают и
+подмешиваются к ленте при чтении (fan-out on read), чтобы одна публикация
+не порождала миллион вставок.
+"""
+from itertools import islice
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import connection
+
+from .models import Follow, Post, ProfileStats, TimelineEntry
+from .paginators import KeysetSource
+
+BATCH_SIZE = 500
+
+
+def is_push_author(author_id):
+    return not ProfileStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.FEED_FANOUT_THRESHOLD
+    ).exists()
+
+
+def _insert(entries):
+    # Пачками, чтобы не собирать в памяти все элементы сразу.
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, BATCH_SIZE))
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    """Раскладывает новую запись по лентам подписчиков автора."""
+    if not is_push_author(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _insert(
+        TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту нового подписчика уже опубликованные записи."""
+    if not is_push_author(author_id):
+        return
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('pk', 'pub_date')
+    _insert(
+        TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+        for pk, pub_date in posts.iterator()
+    )
+
+
+def fan_out_author(author_id):
+    """Заполняет ленты всех подписчиков записями автора.
+
+    Нужен, когда автор опускается до порога и его записи перестают
+    подмешиваться при чтении.
+    """
+    for user_id in Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True).iterator():
+        backfill(user_id, author_id)
+
+
+def rebuild_authors(author_ids):
+    """Раскладывает записи авторов по лентам подписчиков заново.
+
+    Нужен после вставки записей или подписок в обход сигналов; уже
+    существующие элементы лент не дублируются. Каждый автор - один
+    INSERT ... SELECT в базе: популярный автор даёт миллионы строк, и
+    создавать под них объекты в Python слишком долго.
+    """
+    ops = connection.ops
+    sql = (
+        f'{ops.insert_statement(ignore_conflicts=True)} '
+        f'{TimelineEntry._meta.db_table} (user_id, post_id, pub_date) '
+        'SELECT follow.user_id, post.id, post.pub_date '
+        f'FROM {Follow._meta.db_table} follow '
+        f'INNER JOIN {Post._meta.db_table} post '
+        'ON post.author_id = follow.author_id '
+        'WHERE follow.author_id = %s '
+        f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+    )
+    with connection.cursor() as cursor:
+        for author_id in author_ids:
+            if is_push_author(author_id):
+                cursor.execute(sql, [author_id])
+
+
+def refill_if_demoted(author_id):
+    """Возвращает автора к fan-out on write, если он опустился до порога."""
+    if ProfileStats.objects.filter(
+        user_id=author_id,
+        followers_count=settings.FEED_FANOUT_THRESHOLD
+    ).exists():
+        fan_out_author(author_id)
+
+
+def prune_if_promoted(author_id):
+    """Убирает записи автора из лент, когда он поднимается выше порога.
+
+    Дальше они подмешиваются при чтении, и оставленные в таблице строки
+    только дублировали бы их.
+    """
+    if ProfileStats.objects.filter(
+        user_id=author_id,
+        followers_count=settings.FEED_FANOUT_THRESHOLD + 1
+    ).exists():
+        TimelineEntry.objects.filter(post__author_id=author_id).delete()
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты записи автора, от которого пользователь отписался."""
+    TimelineEntry.objects.filter(
+        user_id=user_id,
+        post__author_id=author_id
+    ).delete()
+
+
+def followed_sources(user, followed=(), unfollowed=()):
+    """Источники для follow_index: материализованная лента плюс отдельный
+    источник на каждого популярного автора, которые сливаются при чтении.
+
+    Каждый источник читается по своему индексу в порядке ленты, так что
+    страница не требует сортировки всех записей подписок. followed и
+    unfollowed - подписки и отписки, ещё не записанные в базу
+    (posts.writebehind.pending_follows).
+    """
+    pull_authors = Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gt=settings.FEED_FANOUT_THRESHOLD
+    ).values_list('author_id', flat=True)
+    entries = TimelineEntry.objects.filter(user=user)
+    if unfollowed:
+        pull_authors = pull_authors.exclude(author_id__in=unfollowed)
+        entries = entries.exclude(post__author_id__in=unfollowed)
+    if followed:
+        # Уже записанная подписка дала бы записи автора дважды.
+        followed = set(followed) - set(Follow.objects.filter(
+            user=user, author_id__in=followed
+        ).values_list('author_id', flat=True))
+    sources = [KeysetSource(
+        entries.select_related('post__author', 'post__group'),
+        id_field='post_id',
+        item=attrgetter('post'),
+    )]
+    sources += [
+        KeysetSource(Post.objects.feed().filter(author_id=author_id))
+        for author_id in [*pull_authors, *sorted(followed)]
+    ]
+    return sources
@@ -0,0 +1,143 @@
+"""Потоковый приём картинок записей.
+
+ImageUploadHandler пишет загрузку кусками во временный файл в
+FILE_UPLOAD_TEMP_DIR; если он на одной файловой системе с MEDIA_ROOT,
+сохранение в хранилище - это переименование, а не копирование. По
+пути он разбирает заголовок картинки по первым кускам, считает SHA-256
+содержимого и прекращает запись, как только файл оказывается слишком
+большим или не картинкой: остаток тела запроса дочитывается без
+сохранения. Памяти на загрузку уходит не больше одного
+куска, сколько бы пользователей ни загружали файлы.
+"""
+import hashlib
+import io
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image
+
+# Поля форм, загрузки в которые принимает этот обработчик.
+IMAGE_FIELDS = ('image',)
+
+# Столько байт начала файла достаточно любому формату для заголовка.
+HEADER_LIMIT = 64 * 2 ** 10
+
+
+def upload_dir():
+    # Не внутри MEDIA_ROOT: недокачанные файлы не должны раздаваться.
+    directory = settings.FILE_UPLOAD_TEMP_DIR
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+class StreamedImageFile(UploadedFile):
+    """Загруженная картинка во временном файле.
+
+    Кроме обычных атрибутов несёт image_format, image_size и sha256,
+    а при отказе - upload_error с текстом ошибки для формы.
+    """
+
+    def __init__(self, name, content_type, charset, content_type_extra):
+        _, extension = os.path.splitext(name)
+        file = tempfile.NamedTemporaryFile(
+            suffix='.upload' + extension, dir=upload_dir()
+        )
+        super().__init__(
+            file, name, content_type, 0, charset, content_type_extra
+        )
+        self.image_format = None
+        self.image_size = None
+        self.sha256 = None
+        self.upload_error = None
+
+    def temporary_file_path(self):
+        return self.file.name
+
+    def close(self):
+        try:
+            return self.file.close()
+        except FileNotFoundError:
+            # Файл уже перенесён хранилищем на постоянное место.
+            pass
+
+
+class ImageUploadHandler(FileUploadHandler):
+    chunk_size = 64 * 2 ** 10
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.active = field_name in IMAGE_FIELDS
+        if not self.active:
+            return
+        self.file = StreamedImageFile(
+            self.file_name, self.content_type, self.charset,
+            self.content_type_extra
+        )
+        self.hash = hashlib.sha256()
+        self.head = bytearray()
+        self.received = 0
+
+    def reject(self, message):
+        self.file.upload_error = message
+        self.file.file.truncate(0)
+        self.head = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+        if self.file.upload_error:
+            return None
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_BYTES:
+            self.reject('Файл больше %d МБ.' % (
+                settings.POST_IMAGE_MAX_BYTES // 2 ** 20
+            ))
+            return None
+        if self.head is not None:
+            self.check_header(raw_data)
+            if self.file.upload_error:
+                return None
+        self.hash.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def check_header(self, raw_data):
+        # Image.open читает только заголовок; пока начала файла для него
+        # не хватает, куски копятся в head, но не больше HEADER_LIMIT.
+        self.head += raw_data
+        try:
+            image = Image.open(io.BytesIO(self.head))
+        except Image.DecompressionBombError:
+            self.reject('Слишком большое разрешение.')
+            return
+        except (OSError, SyntaxError, ValueError):
+            if len(self.head) >= HEADER_LIMIT:
+                self.reject('Загрузите правильное изображение.')
+            return
+        width, height = image.size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            self.reject('Слишком большое разрешение: %dx%d.' % (
+                width, height
+            ))
+            return
+        self.file.image_format = image.format
+        self.file.image_size = image.size
+        self.file.content_type = Image.MIME.get(image.format)
+        self.head = None
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        if not self.file.upload_error and self.file.image_format is None:
+            self.reject('Загрузите правильное изображение.')
+        if self.file.upload_error:
+            self.file.size = 0
+        else:
+            self.file.size = file_size
+            self.file.sha256 = self.hash.hexdigest()
+        self.file.seek(0)
+        return self.file
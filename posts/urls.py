@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('404/', views.page_not_found, name='404'),
@@ -9,8 +9,24 @@ urlpatterns = [
     path('new/', views.new_post, name='new_post'),
     path('follow/', views.follow_index, name='follow_index'),
     path('group/<slug:slug>/', views.group_posts, name='group'),
+    path('search/', views.search_posts, name='search'),
+    path('metrics/', views.metrics_view, name='metrics'),
+    path('api/v1/posts/', api.posts, name='api_posts'),
+    path('api/v1/posts/<int:post_id>/', api.post_detail, name='api_post'),
+    path('api/v1/posts/<int:post_id>/comments/',
+         api.post_comments,
+         name='api_post_comments'),
+    path('api/v1/groups/<slug:slug>/posts/',
+         api.group_posts,
+         name='api_group_posts'),
+    path('api/v1/users/<str:username>/posts/',
+         api.profile_posts,
+         name='api_profile_posts'),
     path('<str:username>/', views.profile, name='profile'),
     path('<str:username>/<int:post_id>/', views.post_view, name='post'),
+    path('<str:username>/<int:post_id>/comments/',
+         views.post_comments,
+         name='post_comments'),
     path('<str:username>/<int:post_id>/edit/',
          views.post_edit,
          name='post_edit'),
@@ -1,33 +1,74 @@
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.core.exceptions import PermissionDenied
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import condition
+from django.views.static import serve
 
+from . import (conditional, feed_cache, media, metrics, search, timeline,
+               writebehind)
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User
+from .middleware import tag_response
+from .paginators import CommentPage, CursorPaginator, legacy_page_redirect
+from .replicas import read_from_replica
 
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 50
 
+
+@read_from_replica
+@condition(etag_func=conditional.index_etag)
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    tag_response(request, feed_cache.POSTS)
+    post_list = Post.objects.feed()
+    paginator = CursorPaginator(post_list, POSTS_PER_PAGE)
+    if 'page' in request.GET:
+        return legacy_page_redirect(request, paginator)
+    page = paginator.get_page(request.GET.get('cursor'))
     return render(
         request,
         'index.html',
-        {'page': page, 'paginator': paginator}
+        {
+            'page': page,
+            'paginator': paginator,
+            **feed_cache.context(feed_cache.POSTS),
+        }
     )
 
 
+@read_from_replica
+@condition(etag_func=conditional.group_etag)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    tag_response(request, feed_cache.group_scope(group.id))
+    post_list = Post.objects.feed().filter(group=group)
+    paginator = CursorPaginator(post_list, POSTS_PER_PAGE)
+    if 'page' in request.GET:
+        return legacy_page_redirect(request, paginator)
+    page = paginator.get_page(request.GET.get('cursor'))
     return render(
         request,
         'group.html',
-        {'group': group, 'page': page,  'paginator': paginator}
+        {
+            'group': group,
+            'page': page,
+            'paginator': paginator,
+            **feed_cache.context(feed_cache.group_scope(group.id)),
+        }
+    )
+
+
+def search_posts(request):
+    query = request.GET.get('q', '').strip()
+    page = search.search(
+        query, request.GET.get('cursor'), per_page=POSTS_PER_PAGE
+    )
+    return render(
+        request,
+        'posts/search.html',
+        {'page': page, 'query': query},
     )
 
 
@@ -39,43 +80,80 @@ def new_post(request):
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
-            form.save()
+            with transaction.atomic():
+                form.save()
             return redirect('index')
         return render(request, 'posts/new.html', {'form': form})
     form = PostForm()
     return render(request, 'posts/new.html', {'form': form})
 
 
+@read_from_replica
+@condition(etag_func=conditional.profile_etag)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    author = get_object_or_404(
+        User.objects.select_related('stats'),
+        username=username
+    )
+    tag_response(
+        request,
+        feed_cache.author_scope(author.id),
+        feed_cache.stats_scope(author.id),
+    )
+    post_list = Post.objects.feed().filter(author=author)
+    paginator = CursorPaginator(post_list, POSTS_PER_PAGE)
+    if 'page' in request.GET:
+        return legacy_page_redirect(request, paginator)
+    page = paginator.get_page(request.GET.get('cursor'))
     following = (request.user.is_authenticated and
                  Follow.objects.filter(
                      user=request.user,
                      author=author
                  ).exists())
+    following = writebehind.pending_following(
+        request.user, author.id, following
+    )
     context = {'page': page,
                'author': author,
                'paginator': paginator,
-               'following': following}
+               'following': following,
+               **feed_cache.context(feed_cache.author_scope(author.id))}
     return render(request, 'posts/profile.html', context)
 
 
+@read_from_replica
+@condition(etag_func=conditional.post_etag)
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, id=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.feed().select_related('author__stats'),
+        author__username=username,
+        id=post_id
+    )
+    tag_response(
+        request,
+        feed_cache.post_scope(post.id),
+        feed_cache.author_scope(post.author_id),
+        feed_cache.stats_scope(post.author_id),
+    )
+    comments = CommentPage(
+        post.comments.select_related('author'),
+        COMMENTS_PER_PAGE,
+        request.GET.get('comments'),
+    )
     following = (request.user.is_authenticated and
                  Follow.objects.filter(
                      user=request.user,
                      author=post.author
                  ).exists())
+    following = writebehind.pending_following(
+        request.user, post.author_id, following
+    )
     form = CommentForm(request.POST or None)
     context = {
         'post': post,
-        'comments': comments,
+        'comments': comments.object_list,
+        'comment_page': comments,
+        'pending_comments': writebehind.pending_comments(request.user, post),
         'form': form,
         'following': following
     }
@@ -86,6 +164,47 @@ def post_view(request, username, post_id):
     )
 
 
+@read_from_replica
+@condition(etag_func=conditional.post_etag)
+def post_comments(request, username, post_id):
+    """Следующая порция комментариев: HTML-фрагмент или JSON."""
+    post = get_object_or_404(
+        Post.objects.select_related('author').only(
+            'id', 'author__username'
+        ),
+        author__username=username,
+        id=post_id
+    )
+    tag_response(request, feed_cache.post_scope(post.id))
+    comments = CommentPage(
+        post.comments.select_related('author'),
+        COMMENTS_PER_PAGE,
+        request.GET.get('cursor'),
+    )
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.id,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created,
+                }
+                for comment in comments
+            ],
+            'next_cursor': comments.next_cursor,
+        })
+    return render(
+        request,
+        'includes/comment_list.html',
+        {
+            'post': post,
+            'comments': comments.object_list,
+            'comment_page': comments,
+        },
+    )
+
+
 @login_required
 def post_edit(request, username, post_id):
     post = get_object_or_404(Post, id=post_id, author__username=username)
@@ -98,7 +217,12 @@ def post_edit(request, username, post_id):
         instance=post
     )
     if request.method == 'POST' and form.is_valid():
-        post = form.save()
+        post = form.save(commit=False)
+        # comment_count меняется сигналами через F(): полный UPDATE
+        # вернул бы значение, прочитанное в начале запроса.
+        post.save(update_fields=(
+            *PostForm.Meta.fields, 'thumbnail', 'image_variants'
+        ))
         return redirect('post', username=username, post_id=post_id)
 
     return render(
@@ -114,10 +238,16 @@ def add_comment(request, username, post_id):
     form = CommentForm(request.POST or None)
     if not form.is_valid():
         return redirect('post', username=username, post_id=post_id)
+    if writebehind.enabled():
+        writebehind.comment(
+            request.user.id, post.id, form.cleaned_data['text']
+        )
+        return redirect('post', username=username, post_id=post_id)
     comment = form.save(commit=False)
     comment.author = request.user
     comment.post = post
-    form.save()
+    with transaction.atomic():
+        form.save()
     return redirect('post', username=username, post_id=post_id)
 
 
@@ -134,31 +264,68 @@ def server_error(request):
     return render(request, "misc/500.html", status=500)
 
 
+def serve_media(request, path, document_root=None):
+    response = serve(request, path, document_root)
+    if media.is_immutable(path):
+        response['Cache-Control'] = media.IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def metrics_view(request):
+    if not request.user.is_staff:
+        raise PermissionDenied
+    return HttpResponse(
+        metrics.render(), content_type='text/plain; version=0.0.4'
+    )
+
+
+@read_from_replica
 @login_required
 def follow_index(request):
-    post_list = Post.objects.select_related('group').filter(
-        author__following__user=request.user
+    followed, unfollowed = writebehind.pending_follows(request.user)
+    post_list = timeline.followed_sources(
+        request.user, followed, unfollowed
     )
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    paginator = CursorPaginator(post_list, POSTS_PER_PAGE)
+    if 'page' in request.GET:
+        return legacy_page_redirect(request, paginator)
+    page = paginator.get_page(request.GET.get('cursor'))
     return render(
         request,
         "follow.html",
-        {'page': page, 'paginator': paginator}
+        {
+            'page': page,
+            'paginator': paginator,
+            'pending': writebehind.pending_marker(request.user),
+            **feed_cache.context(
+                feed_cache.POSTS,
+                feed_cache.follow_scope(request.user.id)
+            ),
+        }
     )
 
 
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if author != request.user:
-        Follow.objects.get_or_create(user=request.user, author=author)
+    if author != request.user and writebehind.enabled():
+        writebehind.follow(request.user.id, author.id)
+    elif author != request.user:
+        # Повторная подписка упирается в уникальный индекс, поэтому
+        # проверять её заранее отдельным запросом не нужно.
+        try:
+            with transaction.atomic():
+                Follow.objects.create(user=request.user, author=author)
+        except IntegrityError:
+            pass
     return redirect('profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
+    if writebehind.enabled():
+        writebehind.unfollow(request.user.id, author.id)
+        return redirect('profile', username=username)
     Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('profile', username=username)
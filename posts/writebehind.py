@@ -0,0 +1,275 @@
+"""Отложенная запись комментариев и подписок пачками.
+
+При settings.WRITE_BEHIND add_comment, profile_follow и
+profile_unfollow не пишут в базу сами: действие добавляется в журнал -
+отдельный файл SQLite settings.WRITE_BEHIND_JOURNAL, общий для воркеров
+машины, - и ответ уходит сразу. Фоновый поток раз в
+settings.WRITE_BEHIND_INTERVAL секунд переносит до
+settings.WRITE_BEHIND_BATCH строк журнала в базу одной транзакцией,
+так что запросы не ждут друг друга на блокировке записи SQLite. Обычные
+save и delete вызывают сигналы posts.signals, поэтому счётчики, ленты и
+кэш обновляются как при прямой записи.
+
+Журнал переживает падение процесса: оставшиеся строки применяет
+следующий запущенный поток или команда flush_write_behind. Номер
+последней применённой строки хранится в WriteBehindMark в той же
+транзакции, что и пачка, и строки не применяются дважды. Пока действие
+в журнале, страницы его автора показывают его так, будто оно уже
+записано (pending_comments, pending_following, pending_follows для
+/follow/). Исключение - comment_count в лентах: фрагменты лент общие
+для всех посетителей, и счётчик догоняет комментарий после записи пачки.
+"""
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from . import replicas
+from .models import Comment, Follow, Post, User, WriteBehindMark
+
+logger = logging.getLogger(__name__)
+
+COMMENT = 'comment'
+FOLLOW = 'follow'
+UNFOLLOW = 'unfollow'
+
+_local = threading.local()
+_lock = threading.Lock()
+_thread = None
+
+
+def enabled():
+    return settings.WRITE_BEHIND
+
+
+def _journal():
+    """Соединение потока с журналом и его идентификатор."""
+    path = settings.WRITE_BEHIND_JOURNAL
+    journals = getattr(_local, 'journals', {})
+    if path not in journals:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Добавление в журнал - это и есть подтверждение записи, поэтому
+        # каждая строка синхронизируется на диск.
+        journal = sqlite3.connect(path, timeout=30, isolation_level=None)
+        journal.execute('PRAGMA journal_mode=WAL')
+        journal.execute('PRAGMA synchronous=FULL')
+        journal.execute(
+            'CREATE TABLE IF NOT EXISTS journal ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, '
+            'user_id INTEGER NOT NULL, target_id INTEGER NOT NULL, '
+            "text TEXT NOT NULL DEFAULT '', created REAL NOT NULL)"
+        )
+        journal.execute(
+            'CREATE INDEX IF NOT EXISTS journal_user ON journal (user_id)'
+        )
+        journal.execute(
+            'CREATE TABLE IF NOT EXISTS meta ('
+            'key TEXT PRIMARY KEY, value TEXT)'
+        )
+        # Новый файл журнала нумерует строки заново, и отметка в базе
+        # привязана к конкретному файлу.
+        journal.execute(
+            "INSERT OR IGNORE INTO meta VALUES ('epoch', ?)",
+            (uuid.uuid4().hex,)
+        )
+        epoch = journal.execute(
+            "SELECT value FROM meta WHERE key = 'epoch'"
+        ).fetchone()[0]
+        journals[path] = (journal, epoch)
+        _local.journals = journals
+    return journals[path]
+
+
+def _enqueue(kind, user_id, target_id, text=''):
+    journal, _ = _journal()
+    cursor = journal.execute(
+        'INSERT INTO journal (kind, user_id, target_id, text, created) '
+        'VALUES (?, ?, ?, ?, ?)',
+        (kind, user_id, target_id, text, time.time())
+    )
+    # Следующие страницы автора читают с default, а не с реплики, которая
+    # может ещё не получить пачку.
+    replicas.pin()
+    start()
+    return cursor.lastrowid
+
+
+def comment(user_id, post_id, text):
+    return _enqueue(COMMENT, user_id, post_id, text)
+
+
+def follow(user_id, author_id):
+    return _enqueue(FOLLOW, user_id, author_id)
+
+
+def unfollow(user_id, author_id):
+    return _enqueue(UNFOLLOW, user_id, author_id)
+
+
+def _apply(rows):
+    post_ids = {row[3] for row in rows if row[1] == COMMENT}
+    user_ids = {row[2] for row in rows}
+    user_ids |= {row[3] for row in rows if row[1] != COMMENT}
+    # Внешние ключи SQLite проверяются при коммите: строка с удалённой
+    # записью или пользователем сорвала бы всю пачку.
+    posts = set(Post.objects.filter(
+        pk__in=post_ids
+    ).values_list('pk', flat=True))
+    users = set(User.objects.filter(
+        pk__in=user_ids
+    ).values_list('pk', flat=True))
+    for _, kind, user_id, target_id, text, created in rows:
+        if user_id not in users:
+            continue
+        if kind == COMMENT:
+            if target_id in posts:
+                comment = Comment.objects.create(
+                    post_id=target_id, author_id=user_id, text=text
+                )
+                # auto_now_add ставит время записи пачки, а комментарий
+                # написан, когда попал в журнал.
+                Comment.objects.filter(pk=comment.pk).update(
+                    created=datetime.fromtimestamp(created, timezone.utc)
+                )
+        elif target_id not in users or target_id == user_id:
+            continue
+        elif kind == FOLLOW:
+            try:
+                with transaction.atomic():
+                    Follow.objects.create(user_id=user_id, author_id=target_id)
+            except IntegrityError:
+                pass
+        else:
+            Follow.objects.filter(
+                user_id=user_id, author_id=target_id
+            ).delete()
+
+
+def flush(limit=None):
+    """Переносит пачку строк журнала в базу, возвращает их число."""
+    journal, epoch = _journal()
+    # Журнал не блокируется, пока пачка пишется в базу: новые действия
+    # добавляются без ожидания. Строки, которые другой поток уже
+    # применил, отсекает отметка, взятая в транзакции базы.
+    rows = journal.execute(
+        'SELECT id, kind, user_id, target_id, text, created FROM journal '
+        'ORDER BY id LIMIT ?',
+        (limit or settings.WRITE_BEHIND_BATCH,)
+    ).fetchall()
+    if not rows:
+        return 0
+    with transaction.atomic():
+        mark, _ = WriteBehindMark.objects.select_for_update(
+        ).get_or_create(journal=epoch)
+        _apply([row for row in rows if row[0] > mark.applied_id])
+        mark.applied_id = max(mark.applied_id, rows[-1][0])
+        mark.save()
+    # Если процесс упадёт здесь, строки удалит следующий flush.
+    journal.execute('DELETE FROM journal WHERE id <= ?', (rows[-1][0],))
+    return len(rows)
+
+
+def flush_all():
+    total = 0
+    while True:
+        count = flush()
+        total += count
+        if count < settings.WRITE_BEHIND_BATCH:
+            return total
+
+
+def _run():
+    while True:
+        time.sleep(settings.WRITE_BEHIND_INTERVAL)
+        try:
+            flush_all()
+        except Exception:
+            logger.exception('Не удалось записать пачку из журнала')
+        finally:
+            # Соединение потока не должно пережить CONN_MAX_AGE.
+            connection.close_if_unusable_or_obsolete()
+
+
+def _flush_at_exit():
+    try:
+        flush_all()
+    except Exception:
+        logger.exception('Журнал не записан при остановке процесса')
+
+
+def start():
+    """Запускает фоновый поток записи, если он ещё не работает."""
+    global _thread
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        if _thread is None:
+            atexit.register(_flush_at_exit)
+        _thread = threading.Thread(
+            target=_run, name='write-behind', daemon=True
+        )
+        _thread.start()
+
+
+def _pending(user):
+    if not (enabled() and user.is_authenticated):
+        return []
+    journal, _ = _journal()
+    rows = journal.execute(
+        'SELECT id, kind, target_id, text, created FROM journal '
+        'WHERE user_id = ? ORDER BY id',
+        (user.pk,)
+    ).fetchall()
+    if rows:
+        # Строки могли остаться от упавшего процесса.
+        start()
+    return rows
+
+
+def pending_marker(user):
+    """Последнее неприменённое действие пользователя, для ETag."""
+    rows = _pending(user)
+    return str(rows[-1][0]) if rows else ''
+
+
+def pending_comments(user, post):
+    """Комментарии пользователя к записи, которые ещё в журнале."""
+    return [
+        Comment(
+            post=post, author=user, text=text,
+            created=datetime.fromtimestamp(created, timezone.utc),
+        )
+        for _, kind, target_id, text, created in _pending(user)
+        if kind == COMMENT and target_id == post.pk
+    ]
+
+
+def pending_follows(user):
+    """Авторы, подписка на которых и отписка от которых ещё в журнале."""
+    followed, unfollowed = set(), set()
+    for _, kind, target_id, _, _ in _pending(user):
+        if kind == FOLLOW:
+            followed.add(target_id)
+            unfollowed.discard(target_id)
+        elif kind == UNFOLLOW:
+            unfollowed.add(target_id)
+            followed.discard(target_id)
+    return followed, unfollowed
+
+
+def pending_following(user, author_id, following):
+    """Подписка на автора с учётом действий, ещё не записанных в базу."""
+    followed, unfollowed = pending_follows(user)
+    if author_id in followed:
+        return True
+    if author_id in unfollowed:
+        return False
+    return following
@@ -1,4 +1,18 @@
+import pytest
+from django.core.cache import cache
+
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
+    'tests.fixtures.fixture_queries',
 ]
+
+
+@pytest.fixture(autouse=True)
+def isolate_background_state(settings):
+    """Кэш страниц переживает очистку базы между тестами, а фоновые
+    миниатюры могли бы писать в базу уже следующего теста.
+    """
+    cache.clear()
+    settings.THUMBNAIL_WORKERS = 0
+    yield
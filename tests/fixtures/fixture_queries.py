@@ -0,0 +1,130 @@
+"""Сторож числа SQL-запросов и времени отрисовки страниц.
+
+Фикстура query_guard открывает страницу, считает её запросы, повторы
+(один и тот же SQL с теми же параметрами) и однотипные запросы (один и
+тот же SQL с разными параметрами - так выглядит N+1) и сравнивает их с
+tests/query_baseline.json. Тест падает, если страница стала делать
+больше запросов, чем записано. Время отрисовки слишком зависит от
+машины, поэтому его заметный рост только выводится предупреждением
+RenderTimeWarning.
+
+Базовая линия обновляется намеренно:
+
+    pytest tests/test_query_budget.py --update-query-baseline
+"""
+import json
+import re
+import time
+import warnings
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+BASELINE_PATH = Path(__file__).resolve().parent.parent / 'query_baseline.json'
+
+# Время сильно зависит от машины: предупреждение только о кратном росте.
+RENDER_FACTOR = 5
+RENDER_SLACK_MS = 50
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+class RenderTimeWarning(UserWarning):
+    """Страница отрисовывается заметно дольше базовой линии."""
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        '--update-query-baseline', action='store_true',
+        help='Перезаписать tests/query_baseline.json по текущему прогону.'
+    )
+
+
+def pytest_configure(config):
+    config._query_observed = {}
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    if not config.getoption('--update-query-baseline'):
+        return
+    observed = config._query_observed
+    if not observed or exitstatus:
+        return
+    baseline = load_baseline()
+    baseline.update(observed)
+    BASELINE_PATH.write_text(
+        json.dumps(baseline, indent=2, sort_keys=True, ensure_ascii=False)
+        + '\n', encoding='utf-8'
+    )
+
+
+def load_baseline():
+    if not BASELINE_PATH.exists():
+        return {}
+    return json.loads(BASELINE_PATH.read_text(encoding='utf-8'))
+
+
+def template(sql):
+    """SQL без литералов: запросы N+1 дают один и тот же шаблон."""
+    return LITERALS.sub('?', sql)
+
+
+def measure(queries):
+    statements = [query['sql'] for query in queries]
+    exact = Counter(statements)
+    similar = Counter(map(template, statements))
+    return {
+        'queries': len(statements),
+        'duplicates': sum(count - 1 for count in exact.values()),
+        'similar': sum(count - 1 for count in similar.values()),
+    }
+
+
+class QueryGuard:
+    def __init__(self, baseline, observed, update):
+        self.baseline = baseline
+        self.observed = observed
+        self.update = update
+
+    def check(self, name, client, url, method='get', **kwargs):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = getattr(client, method)(url, **kwargs)
+            render_ms = (time.perf_counter() - started) * 1000
+        result = measure(captured.captured_queries)
+        listing = '\n'.join(query['sql'] for query in captured)
+        if self.update:
+            result['render_ms'] = round(render_ms, 1)
+            self.observed[name] = result
+            return response
+        expected = self.baseline.get(name)
+        assert expected is not None, (
+            f'Нет базовой линии для {name}: запустите pytest с '
+            f'--update-query-baseline'
+        )
+        for field in ('queries', 'duplicates', 'similar'):
+            assert result[field] <= expected[field], (
+                f'{name}: {field} {result[field]} > {expected[field]} '
+                f'по базовой линии. Запросы страницы:\n{listing}'
+            )
+        limit = expected['render_ms'] * RENDER_FACTOR + RENDER_SLACK_MS
+        if render_ms > limit:
+            warnings.warn(RenderTimeWarning(
+                f'{name}: отрисовка {render_ms:.0f} мс, предел {limit:.0f} мс'
+            ))
+        return response
+
+
+@pytest.fixture
+def query_guard(request):
+    config = request.config
+    return QueryGuard(
+        load_baseline(),
+        config._query_observed,
+        config.getoption('--update-query-baseline'),
+    )
@@ -0,0 +1,74 @@
+import pytest
+from django.urls import reverse
+
+AUTHORS = ('author-one', 'author-two', 'author-three')
+
+
+@pytest.fixture
+def budget_data(user, group):
+    """Страницы с несколькими записями, авторами и комментаторами, чтобы
+    N+1 в шаблоне карточки или профиля увеличил число запросов.
+    """
+    from django.contrib.auth import get_user_model
+    from posts.models import Comment, Follow, Post
+    User = get_user_model()
+    authors = [User.objects.create(username=name) for name in AUTHORS]
+    posts = [
+        Post.objects.create(
+            text=f'Заметка номер {i}', author=authors[i % len(authors)],
+            group=group if i % 2 else None
+        )
+        for i in range(12)
+    ]
+    for post in posts[-3:]:
+        for author in authors:
+            Comment.objects.create(post=post, author=author, text='Ответ')
+    for author in authors:
+        Follow.objects.create(user=user, author=author)
+    return posts[-1]
+
+
+PAGES = {
+    'index': lambda post: reverse('index'),
+    'group': lambda post: reverse('group', args=(post.group.slug,)),
+    'profile': lambda post: reverse('profile', args=(
+        post.author.username,
+    )),
+    'post': lambda post: reverse('post', args=(
+        post.author.username, post.id
+    )),
+    'post_comments': lambda post: reverse('post_comments', args=(
+        post.author.username, post.id
+    )),
+    'follow_index': lambda post: reverse('follow_index'),
+    'search': lambda post: reverse('search') + '?q=заметка',
+    'api_posts': lambda post: reverse('api_posts'),
+    'api_post_comments': lambda post: reverse(
+        'api_post_comments', args=(post.id,)
+    ),
+}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('page', PAGES)
+def test_page_queries(page, budget_data, user_client, query_guard):
+    response = query_guard.check(page, user_client, PAGES[page](budget_data))
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('page', ('index', 'post'))
+def test_anonymous_page_queries(page, budget_data, client, query_guard):
+    response = query_guard.check(
+        f'{page}:anonymous', client, PAGES[page](budget_data)
+    )
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_new_post_queries(budget_data, user_client, query_guard):
+    response = query_guard.check(
+        'new_post', user_client, reverse('new_post'), method='post',
+        data={'text': 'Новая запись', 'group': budget_data.group_id},
+    )
+    assert response.status_code == 302
@@ -1,10 +1,36 @@
+import re
+
+from django import forms
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm
+from django.urls import get_resolver
 
 User = get_user_model()
 
+SEGMENT = re.compile(r'[\w.@+-]+')
+
+
+def reserved_usernames(patterns=None):
+    """Первые части адресов сайта, которые перекрыли бы профиль /<имя>/."""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    names = set()
+    for pattern in patterns:
+        head = str(pattern.pattern).lstrip('^').split('/')[0]
+        if not head:
+            names |= reserved_usernames(getattr(pattern, 'url_patterns', []))
+        elif SEGMENT.fullmatch(head):
+            names.add(head)
+    return names
+
 
 class CreationForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
         model = User
         fields = ("first_name", "last_name", "username", "email")
+
+    def clean_username(self):
+        username = self.cleaned_data['username']
+        if username in reserved_usernames():
+            raise forms.ValidationError('Это имя занято адресом сайта.')
+        return username
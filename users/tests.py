@@ -1,3 +1,38 @@
 from django.test import TestCase
+from django.urls import resolve, reverse
 
-# Create your tests here.
+from .forms import CreationForm, reserved_usernames
+
+
+class SignUpTests(TestCase):
+    def form(self, username):
+        return CreationForm(data={
+            'username': username,
+            'password1': 'Sup3r-secret-pass',
+            'password2': 'Sup3r-secret-pass',
+        })
+
+    def test_site_paths_are_reserved(self):
+        """Имя, совпадающее с адресом сайта, перекрыло бы профиль."""
+        for username in ('search', 'metrics', 'new', 'admin'):
+            with self.subTest(username=username):
+                form = self.form(username)
+                self.assertFalse(form.is_valid())
+                self.assertIn('username', form.errors)
+        self.assertTrue(self.form('leo').is_valid())
+
+    def test_metrics_path_is_not_a_profile(self):
+        """/metrics/ ведёт на метрики, поэтому такое имя не выдаётся."""
+        self.assertEqual(resolve('/metrics/').url_name, 'metrics')
+        self.assertIn('metrics', reserved_usernames())
+
+    def test_signup_rejects_reserved(self):
+        response = self.client.post(reverse('signup'), {
+            'username': 'search',
+            'password1': 'Sup3r-secret-pass',
+            'password2': 'Sup3r-secret-pass',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(
+            response, 'form', 'username', 'Это имя занято адресом сайта.'
+        )
@@ -0,0 +1,201 @@
+"""Кэши, общие для всех процессов на машине.
+
+Замена Redis/Memcached для одного сервера и для работы без сети: все
+воркеры gunicorn видят одни и те же фрагменты, а add() и incr() атомарны,
+что важно для версий в posts.feed_cache.
+"""
+import fcntl
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+
+
+class SQLiteCache(BaseCache):
+    CULL_EVERY = 100
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = os.path.abspath(location)
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            directory = os.path.dirname(self._path)
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)'
+            )
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _dumps(value):
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        row = self._connection().execute(
+            'SELECT value FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._key(key, version), time.time())
+        ).fetchone()
+        return default if row is None else pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        placeholders = ','.join('?' * len(keys))
+        rows = self._connection().execute(
+            f'SELECT key, value FROM cache WHERE key IN ({placeholders}) '
+            'AND (expires IS NULL OR expires > ?)',
+            (*keys, time.time())
+        )
+        return {keys[key]: pickle.loads(value) for key, value in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._connection().execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            (self._key(key, version), self._dumps(value),
+             self.get_backend_timeout(timeout))
+        )
+        self._maybe_cull()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        connection = self._connection()
+        key = self._key(key, version)
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, time.time())
+            )
+            added = connection.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                (key, self._dumps(value), self.get_backend_timeout(timeout))
+            ).rowcount
+        finally:
+            connection.execute('COMMIT')
+        return bool(added)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return bool(self._connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), self._key(key, version),
+             time.time())
+        ).rowcount)
+
+    def incr(self, key, delta=1, version=None):
+        connection = self._connection()
+        key = self._key(key, version)
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, time.time())
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (self._dumps(value), key)
+            )
+        finally:
+            connection.execute('COMMIT')
+        return value
+
+    def delete(self, key, version=None):
+        self._connection().execute(
+            'DELETE FROM cache WHERE key = ?', (self._key(key, version),)
+        )
+
+    def has_key(self, key, version=None):
+        return self._connection().execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._key(key, version), time.time())
+        ).fetchone() is not None
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живёт в потоке воркера и переиспользуется между
+        # запросами, как и у остальных бэкендов кэша.
+        pass
+
+    def _maybe_cull(self):
+        # Чистка требует полного подсчёта строк, поэтому выполняется не на
+        # каждой записи, а раз в CULL_EVERY записей этого процесса.
+        with self._writes_lock:
+            self._writes += 1
+            if self._writes % self.CULL_EVERY:
+                return
+        connection = self._connection()
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+        )
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (max(count // self._cull_frequency, 1),)
+            )
+
+
+class FileCache(FileBasedCache):
+    """Файловый кэш Django с атомарными add() и incr().
+
+    В FileBasedCache они читают и записывают файл отдельно, и два воркера,
+    одновременно увеличившие версию, дали бы одно и то же число. Здесь
+    обе операции идут под flock на файл блокировки. Файлов блокировки
+    LOCK_STRIPES на весь кэш, ключ выбирает свой по хешу: отдельный файл
+    на каждый ключ копился бы без предела, clear() и чистка их не видят.
+    """
+    LOCK_STRIPES = 64
+
+    @contextmanager
+    def _locked(self, key, version):
+        os.makedirs(self._dir, exist_ok=True)
+        name = os.path.basename(self._key_to_file(key, version))
+        stripe = int(name[:8], 16) % self.LOCK_STRIPES
+        path = os.path.join(self._dir, f'{stripe:02d}.lock')
+        with open(path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._locked(key, version):
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        with self._locked(key, version):
+            return super().incr(key, delta, version)
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -19,18 +21,30 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
 
+# YATUBE_ENV selects the settings profile: development (default) or
+# production. Production turns DEBUG off (DEBUG keeps every executed query
+# in memory), keeps database connections open between requests, tunes
+# SQLite and caches compiled templates. Every value can still be
+# overridden by its own environment variable.
+ENVIRONMENT = os.environ.get('YATUBE_ENV', 'development')
+PRODUCTION = ENVIRONMENT == 'production'
+
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'p_3&fp2$&jlqfq=tsn)@6kd5*)328p)u0@+j$7*7lhu1id+wc&'
+SECRET_KEY = os.environ.get('YATUBE_SECRET_KEY')
+if SECRET_KEY is None:
+    if PRODUCTION:
+        raise ImproperlyConfigured('Set YATUBE_SECRET_KEY in production.')
+    SECRET_KEY = 'p_3&fp2$&jlqfq=tsn)@6kd5*)328p)u0@+j$7*7lhu1id+wc&'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('YATUBE_DEBUG', '0' if PRODUCTION else '1') == '1'
 
 ALLOWED_HOSTS = [
     "localhost",
     "127.0.0.1",
     "[::1]",
     "testserver",
-]
+] + list(filter(None, os.environ.get('YATUBE_ALLOWED_HOSTS', '').split(',')))
 
 
 # Application definition
@@ -49,20 +63,25 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'posts.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'posts.profiling.ProfilerMiddleware',
+    'posts.replicas.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
+    'posts.middleware.AnonymousPageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'posts.metrics.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -76,19 +95,92 @@ TEMPLATES = [
     },
 ]
 
+if PRODUCTION:
+    # Templates are compiled once per process instead of on every render.
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# YATUBE_DATABASE selects sqlite (default, yatube.sqlite_backend) or
+# postgresql (needs psycopg2). YATUBE_DB_* override the connection.
+# Connections are kept open for CONN_MAX_AGE seconds; 0 closes them at the
+# end of every request.
+
+DATABASE = os.environ.get('YATUBE_DATABASE', 'sqlite')
+
+CONN_MAX_AGE = int(os.environ.get(
+    'YATUBE_CONN_MAX_AGE', 600 if PRODUCTION else 0
+))
+
+# Applied on every new SQLite connection. WAL lets readers run while one
+# writer commits; synchronous=NORMAL syncs only at checkpoints (safe in
+# WAL mode, a power loss may only drop the last transactions); cache_size
+# is in KiB when negative; mmap_size lets reads bypass the page cache copy.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,
+    'mmap_size': 256 * 2 ** 20,
+    'temp_store': 'MEMORY',
+} if PRODUCTION else {}
+
+DATABASE_BACKENDS = {
+    'sqlite': {
+        'ENGINE': 'yatube.sqlite_backend',
+        'NAME': os.environ.get(
+            'YATUBE_DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')
+        ),
+        # Seconds a writer waits for the lock before "database is locked".
+        'OPTIONS': {'timeout': 20, 'pragmas': SQLITE_PRAGMAS},
+    },
+    'postgresql': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('YATUBE_DB_NAME', 'yatube'),
+        'USER': os.environ.get('YATUBE_DB_USER', 'yatube'),
+        'PASSWORD': os.environ.get('YATUBE_DB_PASSWORD', ''),
+        'HOST': os.environ.get('YATUBE_DB_HOST', 'localhost'),
+        'PORT': os.environ.get('YATUBE_DB_PORT', '5432'),
+    },
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        **DATABASE_BACKENDS[DATABASE],
+        'CONN_MAX_AGE': CONN_MAX_AGE,
     }
 }
 
+# Read replicas (see posts.replicas): YATUBE_DB_REPLICAS is a comma
+# separated list of SQLite files (kept in sync by manage.py sync_replicas)
+# or PostgreSQL hosts. Feed and profile pages read from a random replica;
+# a visitor who wrote something reads from default for
+# REPLICA_PIN_SECONDS, which must exceed the replication lag.
+DATABASE_REPLICAS = []
+for number, location in enumerate(filter(
+    None, os.environ.get('YATUBE_DB_REPLICAS', '').split(',')
+)):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME' if DATABASE == 'sqlite' else 'HOST': location,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['posts.replicas.ReplicaRouter']
+
+REPLICA_PIN_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -126,9 +218,35 @@ EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
+# Cache
+# YATUBE_CACHE_BACKEND selects the cache shared by feed fragments:
+# locmem (per process, default), sqlite or file (shared between processes
+# on one host, no server needed), memcached or redis (needs django-redis).
+# Keys are prefixed with the deploy version so a release never reads
+# fragments rendered by the previous templates.
+
+DEPLOY_VERSION = os.environ.get('YATUBE_DEPLOY_VERSION', 'dev')
+
+CACHE_BACKEND = os.environ.get('YATUBE_CACHE_BACKEND', 'locmem')
+
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', ''),
+    'sqlite': ('yatube.cache_backends.SQLiteCache',
+               os.path.join(BASE_DIR, 'cache', 'cache.sqlite3')),
+    'file': ('yatube.cache_backends.FileCache',
+             os.path.join(BASE_DIR, 'cache', 'files')),
+    'memcached': ('django.core.cache.backends.memcached.MemcachedCache',
+                  '127.0.0.1:11211'),
+    'redis': ('django_redis.cache.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_LOCATION', CACHE_BACKENDS[CACHE_BACKEND][1]
+        ),
+        'KEY_PREFIX': f'yatube-{DEPLOY_VERSION}',
     }
 }
 
@@ -138,9 +256,106 @@ CACHES = {
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
+# Outside DEBUG media is served by nginx; `manage.py media_nginx_config`
+# prints its location blocks with the same immutable Cache-Control rule
+# that posts.views.serve_media applies in development.
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Feeds
+
+# Authors with more followers than this are not fanned out into follower
+# timelines on publish; their posts are merged into the follow feed on read.
+FEED_FANOUT_THRESHOLD = 1000
+
+# Feed fragments are invalidated explicitly on writes (see posts.feed_cache),
+# so the TTL only bounds memory use.
+FEED_CACHE_TIMEOUT = 600
+
+# Whole pages for anonymous visitors (see posts.middleware): fresh for
+# RESPONSE_CACHE_TIMEOUT, then served stale for up to RESPONSE_CACHE_STALE
+# more seconds while one request holding the lock rebuilds them.
+RESPONSE_CACHE_TIMEOUT = 600
+RESPONSE_CACHE_STALE = 60
+RESPONSE_CACHE_LOCK_TIMEOUT = 30
+
+# Thumbnails
+
+# Post thumbnails are rendered after commit by a local thread pool
+# (see posts.thumbnails); 0 renders them synchronously in the request.
+THUMBNAIL_WORKERS = int(os.environ.get('YATUBE_THUMBNAIL_WORKERS', 2))
+
+# Upload limits for post images (see posts.images). Larger images are
+# downscaled to POST_IMAGE_MAX_SIDE on upload.
+POST_IMAGE_MAX_BYTES = 10 * 2 ** 20
+POST_IMAGE_MAX_PIXELS = 40_000_000
+POST_IMAGE_MAX_SIDE = 2560
+
+# Post images are stored by content hash and shared between posts
+# (see posts.storage); collect_media deletes files nobody has referenced
+# for this many seconds.
+MEDIA_GC_GRACE = 3600
+
+# Post images are streamed to disk and checked while they arrive (see
+# posts.uploads); other uploads use Django's handlers. Point
+# YATUBE_UPLOAD_TEMP_DIR at a directory on the same filesystem as
+# MEDIA_ROOT, but outside it, so saving an upload is a rename; by default
+# the system temp directory is used.
+FILE_UPLOAD_TEMP_DIR = os.environ.get('YATUBE_UPLOAD_TEMP_DIR')
+
+# Streamed uploads are moved from a NamedTemporaryFile (mode 0600); nginx
+# serving MEDIA_ROOT may run as another user and has to read them.
+FILE_UPLOAD_PERMISSIONS = 0o644
+FILE_UPLOAD_DIRECTORY_PERMISSIONS = 0o755
+
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.ImageUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Search
+
+# 'fts5' uses the SQLite FTS5 table created by the posts migrations,
+# 'python' the SearchTerm inverted index that works on any database,
+# 'auto' picks FTS5 when the table exists.
+SEARCH_BACKEND = os.environ.get('YATUBE_SEARCH_BACKEND', 'auto')
+
+# Metrics
+
+# Per-request timings (see posts.metrics) are kept per process and added to
+# the shared SQLite file METRICS_DB every METRICS_FLUSH_INTERVAL seconds;
+# staff can read the totals of all workers at /metrics/.
+METRICS_DB = os.environ.get(
+    'YATUBE_METRICS_DB', os.path.join(BASE_DIR, 'cache', 'metrics.sqlite3')
+)
+METRICS_FLUSH_INTERVAL = 10
+
+# Sampling profiler (see posts.profiling): when enabled, requests slower
+# than PROFILER_THRESHOLD seconds leave collapsed stacks and their SQL in
+# PROFILER_DIR; staff can profile any request with an X-Profile header.
+# Only the newest PROFILER_KEEP captures are kept.
+PROFILER_ENABLED = os.environ.get('YATUBE_PROFILER', '') == '1'
+PROFILER_THRESHOLD = float(os.environ.get('YATUBE_PROFILER_THRESHOLD', 1.0))
+PROFILER_INTERVAL = 0.005
+PROFILER_DIR = os.path.join(BASE_DIR, 'cache', 'profiles')
+PROFILER_KEEP = 200
+
+# Write-behind (see posts.writebehind): comments and follows are appended
+# to the local journal WRITE_BEHIND_JOURNAL and a background thread commits
+# up to WRITE_BEHIND_BATCH of them in one transaction every
+# WRITE_BEHIND_INTERVAL seconds. Off by default: writes go straight to the
+# database in the request.
+WRITE_BEHIND = os.environ.get('YATUBE_WRITE_BEHIND', '') == '1'
+WRITE_BEHIND_JOURNAL = os.environ.get(
+    'YATUBE_WRITE_BEHIND_JOURNAL',
+    os.path.join(BASE_DIR, 'cache', 'write-behind.sqlite3')
+)
+WRITE_BEHIND_INTERVAL = float(
+    os.environ.get('YATUBE_WRITE_BEHIND_INTERVAL', 0.2)
+)
+WRITE_BEHIND_BATCH = 500
+
 # Login
 
 LOGIN_URL = "/auth/login/"
@@ -0,0 +1,22 @@
+"""SQLite с настройками PRAGMA, которые выполняются на каждом соединении.
+
+Список задаётся в DATABASES['default']['OPTIONS']['pragmas'] (см.
+settings.SQLITE_PRAGMAS), остальные OPTIONS уходят в sqlite3.connect,
+как у стандартного бэкенда. journal_mode=WAL сохраняется в самом файле
+базы, остальные настройки живут, пока открыто соединение, поэтому с
+CONN_MAX_AGE они выполняются один раз на поток, а не на запрос.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = params.pop('pragmas', {})
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
@@ -0,0 +1,148 @@
+import os
+import runpy
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+
+from yatube import settings
+from yatube.cache_backends import FileCache, SQLiteCache
+from yatube.sqlite_backend.base import DatabaseWrapper
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.location, {})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_values_shared_between_instances(self):
+        """Значение видно другому экземпляру, как другому воркеру."""
+        self.cache.set('key', {'fragment': 'html'})
+        other = SQLiteCache(self.location, {})
+        self.assertEqual(other.get('key'), {'fragment': 'html'})
+        self.assertEqual(other.get_many(['key', 'missing']),
+                         {'key': {'fragment': 'html'}})
+
+    def test_add_and_incr(self):
+        """add() не перезаписывает значение, incr() его увеличивает."""
+        self.assertTrue(self.cache.add('version', 1, None))
+        self.assertFalse(self.cache.add('version', 5, None))
+        self.assertEqual(self.cache.incr('version'), 2)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_expired_value_is_missing(self):
+        """Просроченное значение не возвращается и может быть добавлено."""
+        self.cache.set('key', 'old', 0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+
+class FileCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.cache = FileCache(self.directory, {})
+
+    def test_concurrent_incr(self):
+        """Одновременные incr() из разных потоков не теряют увеличений."""
+        self.cache.add('version', 0, None)
+
+        def bump():
+            cache = FileCache(self.directory, {})
+            for _ in range(25):
+                cache.incr('version')
+
+        threads = [threading.Thread(target=bump) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.cache.get('version'), 100)
+        self.assertFalse(self.cache.add('version', 0, None))
+
+    def test_lock_files_bounded(self):
+        """Файлов блокировки не больше LOCK_STRIPES, сколько бы ни было
+        ключей."""
+        for number in range(200):
+            self.cache.add(f'key-{number}', number)
+        locks = [name for name in os.listdir(self.directory)
+                 if name.endswith('.lock')]
+        self.assertLessEqual(len(locks), FileCache.LOCK_STRIPES)
+
+
+def load_settings(**environ):
+    with mock.patch.dict(os.environ, environ):
+        return runpy.run_path(settings.__file__)
+
+
+class SettingsProfileTests(SimpleTestCase):
+    def test_production(self):
+        """Профиль production: без DEBUG, постоянные соединения, WAL."""
+        values = load_settings(YATUBE_ENV='production', YATUBE_SECRET_KEY='x')
+        self.assertFalse(values['DEBUG'])
+        database = values['DATABASES']['default']
+        self.assertEqual(database['CONN_MAX_AGE'], 600)
+        self.assertEqual(database['OPTIONS']['pragmas']['journal_mode'],
+                         'WAL')
+        template = values['TEMPLATES'][0]
+        self.assertFalse(template['APP_DIRS'])
+        self.assertEqual(template['OPTIONS']['loaders'][0][0],
+                         'django.template.loaders.cached.Loader')
+
+    def test_production_needs_secret_key(self):
+        environ = {key: value for key, value in os.environ.items()
+                   if key != 'YATUBE_SECRET_KEY'}
+        with mock.patch.dict(os.environ, environ, clear=True):
+            with self.assertRaises(ImproperlyConfigured):
+                load_settings(YATUBE_ENV='production')
+
+    def test_postgresql(self):
+        values = load_settings(YATUBE_DATABASE='postgresql',
+                               YATUBE_DB_HOST='db')
+        database = values['DATABASES']['default']
+        self.assertEqual(database['ENGINE'],
+                         'django.db.backends.postgresql')
+        self.assertEqual(database['HOST'], 'db')
+
+
+class SQLiteBackendTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_pragmas_on_connect(self):
+        """PRAGMA из OPTIONS выполняются на новом соединении."""
+        wrapper = DatabaseWrapper({
+            **settings.DATABASE_BACKENDS['sqlite'],
+            'NAME': os.path.join(self.directory, 'db.sqlite3'),
+            'OPTIONS': {'timeout': 5, 'pragmas': {
+                'journal_mode': 'WAL', 'synchronous': 'NORMAL',
+                'cache_size': -2000,
+            }},
+            'ATOMIC_REQUESTS': False, 'AUTOCOMMIT': True,
+            'CONN_MAX_AGE': 0, 'TIME_ZONE': None, 'TEST': {},
+        })
+        # Соединение создаётся в обход ensure_connection: его закрывает
+        # блокировщик pytest-django, а тестовая база этому тесту не нужна.
+        connection = wrapper.get_new_connection(
+            wrapper.get_connection_params()
+        )
+        try:
+            for pragma, expected in (('journal_mode', 'wal'),
+                                     ('synchronous', 1),
+                                     ('cache_size', -2000)):
+                value = connection.execute(f'PRAGMA {pragma}').fetchone()[0]
+                self.assertEqual(value, expected)
+        finally:
+            connection.close()